@@ -2,11 +2,28 @@
 import json
 import os
 import sys
+import threading
 from argparse import ArgumentParser, RawTextHelpFormatter
-from subprocess import PIPE, Popen, check_call
+from contextlib import ExitStack
+from queue import Queue
+from subprocess import PIPE, CalledProcessError, Popen, check_call, check_output
 from tempfile import NamedTemporaryFile
 from tabulate import tabulate
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'util'))
+from mongodb_perfstats import (add_latency_summaries, add_server_status_summaries,
+                               add_timeline_summaries, add_warmup_summaries, detrend_results)
+from mongodb_procstats import ProcessSampler, is_proc_available
+from mongodb_cpuaffinity import (PLACEMENTS, get_process_affinity, plan_placement,
+                                 set_process_affinity)
+
+
+RESULT_PREFIX = "@@@RESULT@@@"
+# Seconds between the samples of the resource usage of the mongo shells.
+CLIENT_SAMPLE_INTERVAL = 1.0
+# Fraction of its cores above which a mongo shell is considered saturated.
+CLIENT_SATURATION = 0.9
+
 
 class MongoShellCommandError(Exception):
     """ Raised when the mongo shell comes back with an unexpected error
@@ -34,6 +51,15 @@ def parse_arguments():
     parser.add_argument('--trialCount', dest='trials',
                         help='Specify how many trials to run',
                         type=int, default=1)
+    parser.add_argument('--targetCI', dest='targetCI',
+                        help='Keep running trials until the 95%% confidence interval of the mean ops/sec\n'
+                        'is within this fraction of the mean (e.g. 0.02 for +/-2%%), or until\n'
+                        '--maxTrialCount trials have run. --trialCount becomes the minimum number of\n'
+                        'trials. The trials run and the confidence interval reached are recorded.',
+                        type=float, default=None)
+    parser.add_argument('--maxTrialCount', dest='maxTrials',
+                        help='Specify the maximum number of trials to run with --targetCI',
+                        type=int, default=10)
     parser.add_argument('--host', dest='hostname',
                         help='hostname of the mongod/mongos under test',
                         default='localhost')
@@ -92,6 +118,12 @@ def parse_arguments():
                         default=[])
     parser.add_argument('--out', dest='outfile',
                         help='write the results as json to the specified file')
+    parser.add_argument('--outFormat', dest='outFormat',
+                        choices=['json', 'ndjson'], default='json',
+                        help='Format of the --out file. "json" writes a single document once the run is over.\n'
+                        '"ndjson" appends one line per test as soon as it finishes, followed by a\n'
+                        'last line holding the run-level fields (start, end, errors, ...), so that\n'
+                        'partial runs are usable.')
     parser.add_argument('--exclude-testbed', dest='excludeTestbed', nargs='?', const='true',
                         choices=['true','false'], default='false',
                         help='Exclude testbed information from results file')
@@ -103,43 +135,490 @@ def parse_arguments():
                         'equivalent to the operations performed in the list of specified JS test\n'
                         'files without actually running the test cases. A mongod process must\n'
                         'still be running while the JSON config files are being generated.')
+    parser.add_argument('--driver', dest='driver', choices=['shell', 'python'], default='shell',
+                        help='Run the tests with the benchRun() of the mongo shell, or with PyMongo.\n'
+                        'The Python driver runs the JSON config files of --driverConfigs, generated\n'
+                        'with --generateMongoeBenchConfigFiles and --driver python (which records the\n'
+                        'names and tags of the tests for --includeFilter and --excludeFilter). The\n'
+                        '-m, -c and --shard options are applied when the config files are generated.')
+    parser.add_argument('--driverConfigs', dest='driverConfigs',
+                        help='Directory of the JSON config files run by --driver python')
+    parser.add_argument('--driverProcesses', dest='driverProcesses',
+                        help='Number of processes running the threads of --driver python, each with its\n'
+                        'own connection pool',
+                        type=int, default=os.cpu_count() or 1)
     parser.add_argument('--shareDataset', dest='shareDataset', nargs='?', const='true',
                         choices=['true','false'], default='false',
                         help='Share the dataset, created by the first test with all following tests/trials.')
+    parser.add_argument('--datasetCache', dest='datasetCache', nargs='?', const='true',
+                        choices=['true','false'], default='false',
+                        help='Snapshot the datasets generated by the collectionPopulator based tests into\n'
+                        'the mongoperf_dataset_cache database of the server under test, and restore\n'
+                        'them with a server-side copy in the following trials and runs instead of\n'
+                        'generating them again. Only the tests that describe every value their\n'
+                        'document generator captures (their datasetSpec) are cached.')
+    parser.add_argument('--datasetCacheMB', dest='datasetCacheMB',
+                        help='Maximum total size of the cached datasets, the least recently used ones\n'
+                        'are evicted first.',
+                        type=int, default=4096)
     parser.add_argument('--variantName', dest='variantName', nargs="?",
                         help='The variant name defined in mongod',
                         type=str, default=None)
     parser.add_argument('--variants', dest='variants', nargs="+",
                         help='Compare perf for different variants',
                         type=int, default=[])
+    parser.add_argument('--autoThreads', dest='autoThreads', nargs='?', const='true',
+                        choices=['true','false'], default='false',
+                        help='Instead of running the --threads thread counts, search the thread count\n'
+                        'where the throughput of each test stops improving (its knee): the thread\n'
+                        'count is doubled from 1 while it improves the throughput by more than\n'
+                        '--autoThreadsTolerance, then the knee is bisected. The knee and the peak\n'
+                        'throughput are reported in the auto_threads field of every test.')
+    parser.add_argument('--autoThreadsMax', dest='autoThreadsMax',
+                        help='Maximum thread count of --autoThreads',
+                        type=int, default=256)
+    parser.add_argument('--autoThreadsTolerance', dest='autoThreadsTolerance',
+                        help='Relative throughput improvement under which --autoThreads stops doubling\n'
+                        'the thread count',
+                        type=float, default=0.05)
+    parser.add_argument('--autoThreadsMaxLatencyMs', dest='autoThreadsMaxLatencyMs',
+                        help='Also stop doubling the --autoThreads thread count once the mean latency of\n'
+                        'the ops (threads / throughput) is over this many milliseconds',
+                        type=float, default=None)
+    parser.add_argument('--schedule', dest='schedule',
+                        choices=['sequential', 'abab', 'random'], default='sequential',
+                        help='Order of the trials of each test. "sequential" runs all the trials of a\n'
+                        'variant and thread count back to back. "abab" interleaves them, running one\n'
+                        'trial of every thread count and variant in turn, and "random" shuffles the\n'
+                        'order of every such block of trials with --scheduleSeed, so that the drift of\n'
+                        'the machine over time does not bias the variants run last. Every trial is\n'
+                        'tagged with its position in the run (trial_positions), see --detrend.')
+    parser.add_argument('--scheduleSeed', dest='scheduleSeed',
+                        help='Seed of the --schedule random order of the trials',
+                        type=int, default=0)
+    parser.add_argument('--parallelSuites', dest='parallelSuites',
+                        help='Split the selected tests across this many mongo shells running at the same\n'
+                        'time, each one using its own set of test<N>_* databases. Meant for exploratory\n'
+                        'runs where wall-clock time matters more than isolation between tests.',
+                        type=int, default=1)
+    parser.add_argument('--latency', dest='latency', nargs='?', const='true',
+                        choices=['true','false'], default='false',
+                        help='Record latency histograms (p50/p90/p99/p99.9/max) of the ops of every\n'
+                        'trial, by category (reads, writes, commands). benchRun only reports average\n'
+                        'latencies, so the latency of every op is read from the serverStatus\n'
+                        'opLatencies histograms of the server before and after the trial: it is the\n'
+                        'time spent in the server, rounded to the server buckets (powers of 2, and 1.5\n'
+                        'times powers of 2 over 2ms). The other clients of the server, e.g. the other\n'
+                        'shells of --parallelSuites, are counted too.')
+    parser.add_argument('--latencySliceSeconds', dest='latencySliceSeconds',
+                        help='Length of the benchRun slices of the throttled trials, see --targetOpsPerSec',
+                        type=int, default=1)
+    parser.add_argument('--serverStatus', dest='serverStatus', nargs='?', const='true',
+                        choices=['true','false'], default='false',
+                        help='Record the changes of the serverStatus opcounters, WiredTiger cache,\n'
+                        'lock wait and page fault counters over every trial, and the range of the\n'
+                        'cache, ticket and queue gauges, next to the ops/sec of each thread count.')
+    parser.add_argument('--serverStatusInterval', dest='serverStatusInterval',
+                        help='Also sample serverStatus every this many seconds during the trials\n'
+                        '(0 to only sample it before and after them). Not available with\n'
+                        '--targetOpsPerSec.',
+                        type=int, default=0)
+    parser.add_argument('--targetOpsPerSec', dest='targetOpsPerSec',
+                        help='Throttle every trial to this total throughput (an open-model load) instead\n'
+                        'of running the ops back to back: every benchRun thread sleeps after each op\n'
+                        '(the op "delay", in whole milliseconds) for the rest of its period at the\n'
+                        'target rate. The trials are run in slices of --latencySliceSeconds to adjust\n'
+                        'the delay, and their latency histograms are recorded, including an\n'
+                        '"intended" one that counts the time the run is behind the target rate.',
+                        type=float, default=None)
+    parser.add_argument('--targetRateFractions', dest='targetRateFractions', nargs='+',
+                        help='After the trials of every thread count, run them again throttled to each\n'
+                        'of these fractions of their throughput (see --targetOpsPerSec), e.g.\n'
+                        '0.25 0.5 0.75 0.9, for latency-vs-load curves. The results of every fraction\n'
+                        'are in the rate_limited list of the thread count.',
+                        type=float, default=None)
+    parser.add_argument('--timelineInterval', dest='timelineInterval',
+                        help='Record the throughput of every trial over time, from the serverStatus\n'
+                        'opcounters sampled every this many seconds (0 to disable). With\n'
+                        '--targetOpsPerSec, the throughput of the --latencySliceSeconds slices is\n'
+                        'recorded instead. The timeline of the median trial is stored in\n'
+                        'ops_per_sec_timeline, and shown as a sparkline in the results tables of the GUI.',
+                        type=int, default=0)
+    parser.add_argument('--warmup', dest='warmup', nargs='?', const='true',
+                        choices=['true','false'], default='false',
+                        help='Warm every trial up before measuring it: benchRun is run in slices of\n'
+                        '--warmupSliceSeconds until the coefficient of variation of the ops/sec of\n'
+                        'the last --warmupWindow slices is at most --warmupMaxCV, or for at most\n'
+                        '--warmupMaxSeconds, then the trial is measured for --trialTime as usual.\n'
+                        'The warmup duration and the ops/sec of the discarded slices are recorded.')
+    parser.add_argument('--warmupSliceSeconds', dest='warmupSliceSeconds',
+                        help='Length of the benchRun slices of --warmup',
+                        type=int, default=1)
+    parser.add_argument('--warmupWindow', dest='warmupWindow',
+                        help='Number of the last --warmup slices whose ops/sec must be steady',
+                        type=int, default=5)
+    parser.add_argument('--warmupMaxCV', dest='warmupMaxCV',
+                        help='Maximum coefficient of variation (stdev / mean) of the ops/sec of a steady\n'
+                        '--warmup window',
+                        type=float, default=0.05)
+    parser.add_argument('--warmupMaxSeconds', dest='warmupMaxSeconds',
+                        help='Maximum duration of the --warmup of a trial',
+                        type=int, default=60)
+    parser.add_argument('--pinning', dest='pinning', nargs='+', choices=PLACEMENTS,
+                        default=['none'],
+                        help='Pin the mongo shell and the server under test (which must run on this\n'
+                        'machine) to disjoint cpus: "split" gives them each half of the cores of the\n'
+                        'first NUMA node, "numa" puts the shell on the first NUMA node and the server\n'
+                        'on the others. The placement is recorded in the results. Given several\n'
+                        'placements, all the tests are run with each of them in turn.')
     parser.add_argument('--tsvSummary', dest='tsvSummary', nargs="?",
                         help='Print a TSV format summary at the end',
                         choices=[True, False], type=bool, default=False)
+    parser.add_argument('--compare', dest='compare', nargs='+', metavar='RESULTS_FILE',
+                        help='Compare the results of previous runs instead of running tests: either\n'
+                        'two --out files (json or ndjson), the first one being the baseline, or a\n'
+                        'single file with the two --compareVariants to compare. Prints the change of\n'
+                        'ops/sec of every test and thread count, its bootstrap confidence interval,\n'
+                        'effect size (Hedges\' g) and Mann-Whitney p-value, from the largest win to\n'
+                        'the largest loss. --out writes the comparison as json.',
+                        default=None)
+    parser.add_argument('--compareVariants', dest='compareVariants', nargs=2,
+                        metavar=('BASELINE', 'CONTENDER'),
+                        help='The baseline and contender variants to compare in a single --compare file',
+                        default=None)
+    parser.add_argument('--alpha', dest='alpha',
+                        help='Significance level of the --compare tests, the confidence intervals are\n'
+                        'at 1 - alpha',
+                        type=float, default=0.05)
+    parser.add_argument('--bootstrapSamples', dest='bootstrapSamples',
+                        help='Number of bootstrap resamples of the --compare confidence intervals',
+                        type=int, default=10000)
+    parser.add_argument('--detrend', dest='detrend', nargs='?', const='true',
+                        choices=['true','false'], default='false',
+                        help='Remove the linear drift of each test and thread count over the run from\n'
+                        'the --compare values, estimated from the trial positions of all the\n'
+                        'variants. Meant for runs with an interleaved --schedule.')
+    parser.add_argument('--significantOnly', dest='significantOnly', nargs='?', const='true',
+                        choices=['true','false'], default='false',
+                        help='Only print the significant wins and losses of --compare')
     return parser
 
-def print_summary(results_parsed):
-    table =[]
-    for result in results_parsed["results"]:
-        name = result["name"]
-        variant = result.get("variant", "")
-        for thread, values in result["results"].items():
-            if isinstance(values, dict):
-                table.append([name, variant, thread, values['ops_per_sec'],
-                              values['ops_per_sec_median'], len(values['ops_per_sec_values']),
-                              values['ops_per_sec_stdev']])
+def summary_rows(result):
+    """ Returns the summary table rows of a single test result
+    """
+    rows = []
+    name = result["name"]
+    variant = str(result.get("variant", ""))
+    if "pinning" in result:
+        variant = (variant + " " if variant else "") + result["pinning"]["placement"]
+    for thread, values in result["results"].items():
+        if thread.isdigit():
+            rows.append([name, variant, thread, values['ops_per_sec'],
+                         values['ops_per_sec_median'], len(values['ops_per_sec_values']),
+                         values['ops_per_sec_stdev']])
+            for rate_limited in values.get('rate_limited', []):
+                rows.append([name, variant, "%s @ %.0f%%" % (thread, rate_limited['fraction'] * 100),
+                             rate_limited['ops_per_sec'], rate_limited['ops_per_sec_median'],
+                             len(rate_limited['ops_per_sec_values']),
+                             rate_limited['ops_per_sec_stdev']])
+    return rows
+
+def print_summary(table):
     print(tabulate(table, headers=["name", "variant", "thread_count", "ops_per_sec(mean)",
                                    "ops_per_sec(median)", "count", "stdev"], floatfmt=".4f"))
 
+def compare(args):
+    """ Compares the results files of --compare, prints the comparison table and writes it to
+    --out if set.
+    """
+    # numpy is only needed to compare results.
+    from mongodb_perfstats.compare import (COMPARISON_HEADERS, compare_samples, comparison_rows,
+                                           get_samples, load_results)
+    field = 'ops_per_sec_values'
+    results = [load_results(path) for path in args.compare]
+    if args.detrend == 'true':
+        field = 'ops_per_sec_detrended_values'
+        for records in results:
+            detrend_results(records)
+    try:
+        if len(results) == 2:
+            baseline = get_samples(results[0], field=field)
+            contender = get_samples(results[1], field=field)
+        elif len(results) == 1 and args.compareVariants:
+            baseline = get_samples(results[0], args.compareVariants[0], field)
+            contender = get_samples(results[0], args.compareVariants[1], field)
+        else:
+            print("--compare takes either two results files, or one and --compareVariants."
+                  " Run with --help for details.")
+            sys.exit(1)
+    except ValueError as error:
+        print("Cannot compare the results: %s." % error)
+        sys.exit(1)
+
+    comparisons = compare_samples(baseline, contender, args.alpha, args.bootstrapSamples)
+    if not comparisons:
+        print("The results have no test and thread count in common.")
+        sys.exit(1)
+    print(tabulate(comparison_rows(comparisons, args.significantOnly == 'true'),
+                   headers=COMPARISON_HEADERS, floatfmt=".4f"))
+    wins = sum(1 for comparison in comparisons if comparison['verdict'] == 'win')
+    losses = sum(1 for comparison in comparisons if comparison['verdict'] == 'loss')
+    print("%d significant wins, %d significant losses out of %d comparisons (alpha %s)"
+          % (wins, losses, len(comparisons), args.alpha))
+    if args.outfile:
+        with open(args.outfile, 'w') as out:
+            json.dump(comparisons, out, indent=4, separators=(',', ': '))
+
+def read_shell_output(stream, prefix=''):
+    """ Parses the output of the mongo shell as it arrives.
+
+    The test output between @@@START@@@ and @@@END@@@ is echoed, preceded by prefix. Yields a
+    ('result', record) tuple for every test as soon as it finishes, and a ('summary', document)
+    tuple with the run-level fields once the shell is done running tests.
+    """
+    readout = False
+    getting_summary = False
+    summary = ""
+    for line in iter(stream.readline, ''):
+        line = line.strip()
+        if line.startswith(RESULT_PREFIX):
+            yield 'result', json.loads(line[len(RESULT_PREFIX):])
+        elif line == "@@@START@@@":
+            readout = True
+        elif line == "@@@END@@@":
+            readout = False
+        elif line == "@@@RESULTS_START@@@":
+            readout = False
+            getting_summary = True
+        elif line == "@@@RESULTS_END@@@":
+            getting_summary = False
+            yield 'summary', json.loads(summary)
+        elif readout:
+            print(prefix + line)
+        elif getting_summary:
+            summary += line
+
+def merge_summaries(summaries):
+    """ Merges the run-level fields reported by several mongo shells
+    """
+    merged = dict(summaries[0])
+    merged['errors'] = [error for summary in summaries for error in summary['errors']]
+    merged['start'] = min(summary['start'] for summary in summaries)
+    merged['end'] = max(summary['end'] for summary in summaries)
+    return merged
+
+def _pump_shell_output(mongo_proc, prefix, output):
+    sampler = None
+    if is_proc_available(mongo_proc.pid):
+        sampler = ProcessSampler(mongo_proc.pid, CLIENT_SAMPLE_INTERVAL)
+    try:
+        for kind, record in read_shell_output(mongo_proc.stdout, prefix):
+            if kind == 'result' and sampler is not None:
+                # The usage of the shell since the end of its previous test.
+                record['client_usage'] = sampler.take_usage()
+            output.put((kind, record))
+    finally:
+        if sampler is not None:
+            sampler.stop()
+        mongo_proc.wait()
+        output.put((None, mongo_proc.returncode))
+
+def check_client_usage(result):
+    """ Warns when the mongo shell used (almost) all of its cores while running a test: the
+    benchRun threads were then limited by the client, not the server, and the measurement of the
+    test is not valid.
+    """
+    usage = result.get('client_usage')
+    if usage and usage['peak_utilization'] >= CLIENT_SATURATION * usage['cores']:
+        sys.stderr.write("Warning: the mongo shell used %.1f of its %d cores while running %s,"
+                         " its throughput may be bounded by the client.\n"
+                         % (usage['peak_utilization'], usage['cores'], result['name']))
+
+def run_shells(args, commands, auth, shell_options, client_cpus=None):
+    """ Runs the test commands in one mongo shell per entry of shell_options, at the same time,
+    pinned to client_cpus if set.
+
+    The last command is the opening of the mongoPerfRunTests() call, which gets completed with the
+    shell's entry of shell_options as its runOptions argument. Yields ('result', record) for every
+    test as soon as any shell finishes it, and once all the shells are done, a ('summary', document)
+    tuple with their merged run-level fields.
+    """
+    output = Queue()
+    summaries = []
+    with ExitStack() as stack:
+        for index, run_options in enumerate(shell_options):
+            js_file = stack.enter_context(NamedTemporaryFile('w', suffix='.js'))
+            js_file.write('\n'.join(commands) + json.dumps(run_options) + ");")
+            js_file.flush()
+
+            # Open a mongo shell subprocess and load necessary files.
+            preexec_fn = None
+            if client_cpus and hasattr(os, 'sched_setaffinity'):
+                # Pinned before it starts, so that all its threads inherit the affinity.
+                preexec_fn = lambda: os.sched_setaffinity(0, client_cpus)
+            mongo_proc = Popen([args.shellpath, "--norc", "--quiet", js_file.name,
+                               "--host", args.hostname, "--port", args.port] + auth,
+                               stdout=PIPE, text=True, preexec_fn=preexec_fn)
+            if client_cpus and preexec_fn is None:
+                set_process_affinity(mongo_proc.pid, client_cpus)
+            prefix = "[shell %d] " % index if len(shell_options) > 1 else ""
+            threading.Thread(target=_pump_shell_output, args=(mongo_proc, prefix, output),
+                             daemon=True).start()
+
+        running = len(shell_options)
+        while running:
+            kind, record = output.get()
+            if kind is None:
+                running -= 1
+            elif kind == 'summary':
+                summaries.append(record)
+            else:
+                yield kind, record
+
+    if len(summaries) == len(shell_options):
+        yield 'summary', merge_summaries(summaries)
+
+def get_server_pid(args, auth):
+    """ Returns the pid of the server under test if it runs on this machine, or None
+    """
+    try:
+        output = check_output([args.shellpath, "--norc", "--quiet",
+                               "--host", args.hostname, "--port", args.port,
+                               "--eval", "print('pid: ' + String(db.serverStatus().pid)"
+                               ".replace(/[^0-9]/g, ''));"] + auth, text=True)
+    except CalledProcessError:
+        return None
+    pids = [line[len('pid: '):] for line in output.splitlines() if line.startswith('pid: ')]
+    if not pids or not pids[0]:
+        return None
+    pid = int(pids[0])
+    # The pid is only meaningful if it is a local mongod or mongos.
+    try:
+        with open('/proc/%d/comm' % pid) as comm:
+            if not comm.read().strip().startswith('mongo'):
+                return None
+    except (IOError, OSError):
+        return None
+    return pid
+
+def run_placements(args, commands, auth, shell_options):
+    """ Runs the test commands with every --pinning placement in turn, see run_shells().
+
+    The shells are pinned to the client cpus of the placement and the server to its server cpus,
+    then the server is given back its cpus. The results are tagged with their placement when the
+    shell or server is pinned. Once all the placements are done, yields a ('summary', document)
+    tuple with the merged run-level fields of all of them.
+    """
+    pinned = [placement for placement in args.pinning if placement != 'none']
+    server_pid = None
+    server_affinity = None
+    if pinned:
+        server_pid = get_server_pid(args, auth)
+        if server_pid is None:
+            sys.stderr.write("Warning: the server under test does not run on this machine,"
+                             " only the mongo shell is pinned.\n")
+        else:
+            server_affinity = get_process_affinity(server_pid)
+
+    # Fail before running anything if a placement is not possible on this machine.
+    plans = [(placement,) + plan_placement(placement) for placement in args.pinning]
+    summaries = []
+    for placement, client_cpus, server_cpus in plans:
+        pinning = None
+        if placement != 'none' or len(args.pinning) > 1:
+            pinning = {"placement": placement, "client_cpus": client_cpus,
+                       "server_cpus": server_cpus if server_pid is not None else None}
+            print("Pinning %s: shell on cpus %s, server on cpus %s"
+                  % (placement, client_cpus, pinning["server_cpus"]))
+        if server_pid is not None:
+            set_process_affinity(server_pid, server_cpus or server_affinity)
+        try:
+            for kind, record in run_shells(args, commands, auth, shell_options, client_cpus):
+                if kind == 'summary':
+                    summaries.append(record)
+                    continue
+                if pinning is not None:
+                    record['pinning'] = pinning
+                yield kind, record
+        finally:
+            if server_pid is not None:
+                set_process_affinity(server_pid, server_affinity)
+
+    if len(summaries) == len(args.pinning):
+        summary = merge_summaries(summaries)
+        if pinned:
+            summary['pinning'] = args.pinning
+        yield 'summary', summary
+
+def check_driver_options(args):
+    """ Exits if options that the Python driver does not support are set
+    """
+    if args.driverConfigs is None or not os.path.isdir(args.driverConfigs):
+        print("--driver python needs the --driverConfigs directory of the JSON config files.")
+        sys.exit(1)
+    if args.driverProcesses < 1:
+        print("driverProcesses option must be greater than zero. Will be set to 1.")
+        args.driverProcesses = 1
+    unsupported = [option for option, is_set in [
+        ('--autoThreads', args.autoThreads == 'true'),
+        ('--schedule', args.schedule != 'sequential'),
+        ('--serverStatus', args.serverStatus == 'true'),
+        ('--timelineInterval', bool(args.timelineInterval)),
+        ('--warmup', args.warmup == 'true'),
+        ('--targetOpsPerSec', args.targetOpsPerSec is not None),
+        ('--targetRateFractions', bool(args.targetRateFractions)),
+        ('--parallelSuites', args.parallelSuites > 1),
+        ('--datasetCache', args.datasetCache == 'true'),
+        ('--shareDataset', args.shareDataset == 'true'),
+        ('--pinning', args.pinning != ['none'])] if is_set]
+    if unsupported:
+        print("%s cannot be used with --driver python." % ", ".join(unsupported))
+        sys.exit(1)
+
+def run_driver(args, crud_options):
+    """ Runs the tests of the --driverConfigs files with the Python driver, yielding the same
+    records as run_placements()
+    """
+    # pymongo is only needed to run the tests without the mongo shell.
+    from mongodb_benchdriver import ConfigError, load_tests, run_tests
+    try:
+        tests = load_tests(args.driverConfigs)
+    except ConfigError as error:
+        print(error)
+        sys.exit(1)
+    client_options = {"host": args.hostname, "port": int(args.port)}
+    if args.username:
+        client_options.update(username=args.username, password=args.password,
+                              authSource="admin")
+    if args.replica_set:
+        client_options["replicaSet"] = args.replica_set
+    options = {"trials": args.trials, "seconds": args.seconds,
+               "latency": args.latency == 'true',
+               "target_ci": args.targetCI, "max_trials": args.maxTrials,
+               "write_concern": crud_options["writeConcern"]}
+    return run_tests(tests, args.threads, client_options, args.driverProcesses, options,
+                     include_filter=args.includeFilter, exclude_filter=args.excludeFilter,
+                     variant_name=args.variantName, variants=args.variants,
+                     crud_options=crud_options, exclude_testbed=args.excludeTestbed == 'true')
+
 def main():
     parser = parse_arguments()
     args = parser.parse_args()
 
-    if not args.testfiles:
+    if args.compare:
+        compare(args)
+        return
+
+    # The Python driver runs traced config files, the test files are only needed to trace them.
+    python_driver = args.driver == 'python' and args.mongoebench_config_dir is None
+    if python_driver:
+        check_driver_options(args)
+    elif not args.testfiles:
         print("Must provide at least one test file."
               " Run with --help for details.")
         sys.exit(1)
 
-    for testfile in args.testfiles:
+    for testfile in args.testfiles or []:
         if not os.path.exists(testfile):
             print(("A test file that was passed in does not exist: %s"
                   % testfile))
@@ -186,16 +665,41 @@ def main():
         print("Variants nums are not specified.")
         sys.exit(1)
 
-    check_call([args.shellpath, "--norc",
-          "--host", args.hostname, "--port", args.port,
-          "--eval", "print('db version: ' + db.version());"
-          " db.serverBuildInfo().gitVersion;"] + auth)
-    print("")
+    if args.parallelSuites < 1:
+        print("parallelSuites option must be greater than zero. Will be set to 1.")
+        args.parallelSuites = 1
+    elif args.parallelSuites > 1 and args.variantName is not None:
+        # The variants are set with a server-wide setParameter.
+        print("Variants cannot be compared with parallel suites.")
+        sys.exit(1)
+
+    if args.autoThreads == 'true' and args.schedule != 'sequential':
+        # The thread counts of a test depend on the results of the previous ones.
+        print("--autoThreads cannot be used with an interleaved --schedule.")
+        sys.exit(1)
+
+    if args.targetOpsPerSec is not None and args.targetRateFractions:
+        print("Only one of --targetOpsPerSec and --targetRateFractions can be specified.")
+        sys.exit(1)
+    elif args.targetOpsPerSec is not None and args.autoThreads == 'true':
+        print("--targetOpsPerSec cannot be used with --autoThreads.")
+        sys.exit(1)
+    elif args.targetRateFractions and (args.autoThreads == 'true' or
+                                       args.schedule != 'sequential'):
+        print("--targetRateFractions cannot be used with --autoThreads or an interleaved --schedule.")
+        sys.exit(1)
+
+    if not python_driver:
+        check_call([args.shellpath, "--norc",
+              "--host", args.hostname, "--port", args.port,
+              "--eval", "print('db version: ' + db.version());"
+              " db.serverBuildInfo().gitVersion;"] + auth)
+        print("")
 
     commands = []
 
     # load test files
-    for testfile in ['util/utils.js', 'util/docGenerators.js'] + args.testfiles:
+    for testfile in ['util/utils.js', 'util/docGenerators.js'] + (args.testfiles or []):
         if not os.path.exists(testfile):
             raise MongoShellCommandError("test file %s doesn't exist" % testfile)
         commands.append("load('%s');" % testfile)
@@ -214,6 +718,8 @@ def main():
     if args.mongoebench_config_dir is not None:
         mongoebench_options["directory"] = os.path.abspath(args.mongoebench_config_dir)
         mongoebench_options["traceOnly"] = True
+        if args.driver == 'python':
+            mongoebench_options["testInfo"] = True
 
         try:
             os.makedirs(args.mongoebench_config_dir)
@@ -221,14 +727,15 @@ def main():
             # The directory already exists.
             pass
 
-    authstr = ""
+    authstr = "null, null"
     if using_auth:
-        authstr = ", '" + args.username + "', '" + args.password + "'"
+        authstr = "'" + args.username + "', '" + args.password + "'"
 
     variant_name_str = "null"
     if args.variantName:
         variant_name_str = "'" + args.variantName + "'"
 
+    # The runOptions argument is added by run_shells().
     commands.append("mongoPerfRunTests(" +
               str(args.threads) + ", " +
               str(args.multidb) + ", " +
@@ -244,57 +751,97 @@ def main():
               str(args.shareDataset) + ", " +
               variant_name_str + ", " +
               str(args.variants) + ", " +
-              str(json.dumps(mongoebench_options)) +
-              authstr +
-              ");")
-
-    commands = '\n'.join(commands)
-    print(commands)
-
-    with NamedTemporaryFile('w', suffix='.js') as js_file:
-        js_file.write(commands)
-        js_file.flush()
-
-        # Open a mongo shell subprocess and load necessary files.
-        mongo_proc = Popen([args.shellpath, "--norc", "--quiet", js_file.name,
-                           "--host", args.hostname, "--port", args.port] + auth,
-                           stdout=PIPE, text=True)
-
-        # Read test output.
-        readout = False
-        getting_results = False
-        got_results = False
-        line_results = ""
-        for line in iter(mongo_proc.stdout.readline, ''):
-            line = line.strip()
-            if line == "@@@START@@@":
-                readout = True
-                getting_results = False
-            elif line == "@@@END@@@":
-                readout = False
-                getting_results = False
-            elif line == "@@@RESULTS_START@@@":
-                readout = False
-                getting_results = True
-            elif line == "@@@RESULTS_END@@@":
-                readout = False
-                got_results = True
-                getting_results = False
-            elif readout:
-                print(line)
-            elif not got_results and getting_results:
-                line_results += line
+              str(json.dumps(mongoebench_options)) + ", " +
+              authstr + ", ")
+
+    run_options = {}
+    if args.targetCI is not None:
+        run_options["targetCI"] = args.targetCI
+        run_options["maxTrials"] = args.maxTrials
+    if args.autoThreads == 'true':
+        run_options["autoThreads"] = {"max": args.autoThreadsMax,
+                                      "tolerance": args.autoThreadsTolerance}
+        if args.autoThreadsMaxLatencyMs is not None:
+            run_options["autoThreads"]["maxLatencyMicros"] = args.autoThreadsMaxLatencyMs * 1000
+    if args.serverStatus == 'true':
+        run_options["serverStatus"] = True
+        run_options["serverStatusIntervalSeconds"] = args.serverStatusInterval
+    if args.targetOpsPerSec is not None:
+        run_options["targetOpsPerSec"] = args.targetOpsPerSec
+    if args.targetRateFractions:
+        run_options["targetRateFractions"] = args.targetRateFractions
+    if args.targetOpsPerSec is not None or args.targetRateFractions:
+        run_options["latencySliceSeconds"] = args.latencySliceSeconds
+    if args.timelineInterval:
+        run_options["timelineIntervalSeconds"] = args.timelineInterval
+    if args.warmup == 'true':
+        run_options["warmup"] = {"sliceSeconds": args.warmupSliceSeconds,
+                                 "windowSlices": args.warmupWindow,
+                                 "maxCV": args.warmupMaxCV,
+                                 "maxSeconds": args.warmupMaxSeconds}
+    if args.schedule != 'sequential':
+        run_options["schedule"] = args.schedule
+        run_options["scheduleSeed"] = args.scheduleSeed
+    if args.datasetCache == 'true':
+        run_options["datasetCacheMaxBytes"] = args.datasetCacheMB * 1024 * 1024
+    if args.latency == 'true':
+        run_options["latency"] = True
+
+    # Each parallel shell runs its own share of the tests against its own databases.
+    shell_options = [run_options]
+    if args.parallelSuites > 1:
+        shell_options = [dict(run_options, suiteIndex=index, suiteCount=args.parallelSuites,
+                              dbPrefix="test%d_" % index)
+                         for index in range(args.parallelSuites)]
+
+    if python_driver:
+        records = run_driver(args, crud_options)
+    else:
+        print('\n'.join(commands) + json.dumps(shell_options[0]) + ");")
+        records = run_placements(args, commands, auth, shell_options)
 
-    print("Finished Testing.")
-    results_parsed = json.loads(line_results)
-    if args.outfile:
+    out = None
+    if args.outfile and args.outFormat == 'ndjson':
         out = open(args.outfile, 'w')
-        json.dump(results_parsed, out, indent=4, separators=(',', ': '))
+
+    # Read test output, handling each test's results as soon as they arrive.
+    results = []
+    summary = None
+    table = []
+    for kind, record in records:
+        if kind == 'summary':
+            summary = record
+            continue
+        add_latency_summaries(record)
+        add_server_status_summaries(record)
+        add_warmup_summaries(record)
+        add_timeline_summaries(record)
+        check_client_usage(record)
+        table.extend(summary_rows(record))
+        if out:
+            out.write(json.dumps(record) + '\n')
+            out.flush()
+        else:
+            results.append(record)
+
+    print("Finished Testing.")
+    if summary is None:
+        sys.stderr.write("Warning: a mongo shell exited before reporting the end of the run,"
+                         " the results are incomplete.\n")
+        summary = {}
+    if out:
+        out.write(json.dumps(summary) + '\n')
         out.close()
     else:
-        print(json.dumps(results_parsed, indent=4, separators=(',', ': ')))
+        results_parsed = dict(results=results, **summary)
+        if args.outfile:
+            out = open(args.outfile, 'w')
+            json.dump(results_parsed, out, indent=4, separators=(',', ': '))
+            out.close()
+        else:
+            print(json.dumps(results_parsed, indent=4, separators=(',', ': ')))
     if args.tsvSummary:
-        print_summary(results_parsed)
+        print_summary(table)
 
 if __name__ == '__main__':
     try:
@@ -22,6 +22,7 @@
     <script type="text/javascript" src="static/js/main.js"></script>
     <script>
         var data = {{!table_data}};
+        var nextPage = {{!next_page}};
     </script>
 </head>
 <body>
@@ -41,6 +42,7 @@
                 <div class="navbar-collapse collapse">
                     <ul class="nav navbar-nav">
                         <li><a href="/">Home</a></li>
+                        <li><a href="/regressions">Regressions</a></li>
                     </ul>
                 </div>
                 <!--/.nav-collapse -->
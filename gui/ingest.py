@@ -0,0 +1,396 @@
+#!/usr/bin/env python
+# Copyright 2013 10gen, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Normalizes the runs stored in the raw collection for the mongo-perf web app.
+
+Every run document of the raw collection embeds the results of all of its
+tests. ingest_run() flattens a run into one document per (run, test, thread
+count) in the 'points' time-series collection, and maintains the per-test
+history rollups of the 'test_history' collection, so that the web app can
+answer with indexed queries instead of reshaping whole runs in Python. It
+also adds the values of the filters of the main page of the run to the
+facets document of the 'facets' collection, which the web app completes with
+the runs inserted since its last update.
+
+Ingestion is idempotent: a run is claimed in the 'ingested_runs'
+collection before its points are inserted, and marked done after its
+rollups are updated. The claim of a process that died is taken over once it
+expires, and the points it may have inserted are deleted first. Every
+rollup counts a run once, whatever the number of attempts.
+
+The 'points' time-series collection needs MongoDB 5.0. Its run_id index
+(a secondary index on a measurement field) is only created on 6.0 and
+newer, and taking over an interrupted ingestion that left points behind
+needs 7.0, which deletes from time-series collections by any field.
+
+Run this module to ingest the runs that are not ingested yet, and with
+--watch to keep ingesting the runs as they are inserted.
+"""
+
+import argparse
+import datetime
+
+import bson
+import pymongo
+from pymongo.errors import DuplicateKeyError
+
+DEFAULT_STORAGE_ENGINE = 'mmapv0'
+DEFAULT_TOPOLOGY = 'single_node'
+# The fields of the raw collection holding the results of the tests.
+DB_MODES = ('singledb', 'multidb', 'multidb-multicoll')
+# The _id of the document of the facets collection
+FACETS_ID = 'filters'
+# The filters of the main page, and the run field holding their values.
+FACET_FIELDS = (('versions', 'version'),
+                ('topologies', 'topology'),
+                ('storage_engines', 'server_storage_engine'),
+                ('platforms', 'platform'))
+# The fields of the raw collection needed by the facets.
+FACETS_PROJECTION = dict([(field, 1) for _, field in FACET_FIELDS] +
+                         [('singledb.name', 1), ('multidb.name', 1)])
+# How much earlier than the last run of the facets document the runs inserted
+# after it may have been generated, by clients with a late clock.
+FACETS_CLOCK_SKEW = datetime.timedelta(minutes=5)
+# The states of the runs in the ingested_runs collection. The runs ingested
+# before the states were recorded have none, and are done.
+INGESTING = 'ingesting'
+DONE = 'done'
+# Seconds after which the claim of a run by a process is considered
+# abandoned.
+CLAIM_TIMEOUT = 600
+# Number of the most recent run ids kept by each rollup, so that a retried
+# ingestion does not count a run twice. A run is retried within minutes of
+# its first attempt, long before this many runs of the same series follow.
+ROLLUP_RUN_IDS = 100
+
+
+class IngestionError(Exception):
+    """Raised when a run cannot be ingested again"""
+
+
+def server_version(db):
+    """Returns the (major, minor) version of the server of db"""
+    return tuple(db.client.server_info()['versionArray'][:2])
+
+
+def setup_collections(db):
+    """Creates the collections and indexes of the normalized results"""
+    if 'points' not in db.list_collection_names():
+        db.command('create', 'points',
+                   timeseries={'timeField': 'commit_date',
+                               'metaField': 'meta',
+                               'granularity': 'hours'})
+    # Secondary indexes on the measurements of time-series collections need
+    # 6.0.
+    if server_version(db) >= (6, 0):
+        db.points.create_index([('run_id', pymongo.ASCENDING)])
+    db.points.create_index([('meta.test', pymongo.ASCENDING),
+                            ('commit_date', pymongo.ASCENDING)])
+    db.test_history.create_index([('meta.test', pymongo.ASCENDING)])
+
+
+def normalize_run(run):
+    """Returns the points of a run document of the raw collection.
+
+    Legacy runs have no commit_date, their points are dated with their
+    run_time and flagged with legacy_date. Runs with neither are skipped.
+    """
+    date = run.get('commit_date', run.get('run_time'))
+    if date is None:
+        return []
+
+    points = []
+    for db_mode in DB_MODES:
+        for test in run.get(db_mode, []):
+            for thread, result in test['results'].items():
+                if not thread.isdigit():
+                    continue
+                points.append({
+                    'commit_date': date,
+                    'meta': {
+                        'test': test['name'],
+                        'thread': int(thread),
+                        'db_mode': db_mode,
+                        'platform': run.get('platform'),
+                        'server_storage_engine': run.get(
+                            'server_storage_engine', DEFAULT_STORAGE_ENGINE),
+                        'topology': run.get('topology', DEFAULT_TOPOLOGY)
+                    },
+                    'run_id': run['_id'],
+                    'commit': run['commit'],
+                    'label': run['label'],
+                    'version': run.get('version'),
+                    'legacy_date': 'commit_date' not in run,
+                    'ops_per_sec': result.get('ops_per_sec'),
+                    'result': result
+                })
+    return points
+
+
+def rollup_id(meta):
+    """Returns the _id of the test_history rollup of a series of points"""
+    return '|'.join(str(meta[field]) for field in
+                    ('test', 'thread', 'db_mode', 'platform',
+                     'server_storage_engine', 'topology'))
+
+
+def _rollup_updates(point):
+    key = rollup_id(point['meta'])
+    ops_per_sec = point['ops_per_sec']
+    updates = [pymongo.UpdateOne({'_id': key},
+                                 {'$setOnInsert': {'meta': point['meta'],
+                                                   'runs': 0,
+                                                   'run_ids': []}},
+                                 upsert=True)]
+    # The most recent run ids counted by the rollup make a retried ingestion
+    # count the run once; the older ones are ingested for good (see
+    # _claim_run()).
+    update = {'$inc': {'runs': 1},
+              '$push': {'run_ids': {'$each': [point['run_id']],
+                                    '$slice': -ROLLUP_RUN_IDS}},
+              '$min': {'first_date': point['commit_date']}}
+    if ops_per_sec is not None:
+        update['$inc']['sum_ops_per_sec'] = ops_per_sec
+        update['$min']['min_ops_per_sec'] = ops_per_sec
+        update['$max'] = {'max_ops_per_sec': ops_per_sec}
+    updates.append(pymongo.UpdateOne(
+        {'_id': key, 'run_ids': {'$ne': point['run_id']}}, update))
+    # Only keep the most recent result, whatever the ingestion order.
+    updates.append(pymongo.UpdateOne(
+        {'_id': key, '$or': [{'last_date': {'$lte': point['commit_date']}},
+                             {'last_date': {'$exists': False}}]},
+        {'$set': {'last_date': point['commit_date'],
+                  'last_ops_per_sec': ops_per_sec,
+                  'last_run_id': point['run_id'],
+                  'last_commit': point['commit']}}))
+    return updates
+
+
+def _facet_values(runs):
+    """Returns the sets of the filter values and test names of runs"""
+    facets = dict((facet, set()) for facet, _ in FACET_FIELDS)
+    facets['tests'] = set()
+    for run in runs:
+        for facet, field in FACET_FIELDS:
+            if run.get(field) is not None:
+                facets[facet].add(run[field])
+        for db_mode in ('singledb', 'multidb'):
+            for test in run.get(db_mode, []):
+                facets['tests'].add(test['name'])
+    return facets
+
+
+def update_facets(db, runs):
+    """Adds the filter values and test names of runs to the facets document
+    """
+    add_to_set = dict((facet, {'$each': sorted(values)})
+                      for facet, values in _facet_values(runs).items()
+                      if values)
+    update = {'$set': {'last_updated': datetime.datetime.utcnow()}}
+    if add_to_set:
+        update['$addToSet'] = add_to_set
+    if runs:
+        update['$max'] = {'last_run_id': max(run['_id'] for run in runs)}
+    db.facets.update_one({'_id': FACETS_ID}, update, upsert=True)
+
+
+def rebuild_facets(db):
+    """Recomputes the facets document from all the runs of the raw collection
+    """
+    db.facets.delete_one({'_id': FACETS_ID})
+    runs = []
+    for run in db.raw.find({}, FACETS_PROJECTION):
+        runs.append(run)
+        if len(runs) == 1000:
+            update_facets(db, runs)
+            runs = []
+    update_facets(db, runs)
+
+
+def refresh_facets(db, facets):
+    """Adds the runs inserted in the raw collection since the facets document
+    was last updated to it, for the runs that are not ingested yet.
+
+    :returns: the up to date facets document
+    """
+    last_run_id = facets.get('last_run_id')
+    if last_run_id is None:
+        # a document from before the last run ids were recorded
+        rebuild_facets(db)
+        return db.facets.find_one({'_id': FACETS_ID})
+    # The ids of the runs are generated by the clients, the runs inserted
+    # just before the last one may have come later.
+    since = bson.ObjectId.from_datetime(last_run_id.generation_time -
+                                        FACETS_CLOCK_SKEW)
+    runs = list(db.raw.find({'_id': {'$gt': since}}, FACETS_PROJECTION))
+    values = _facet_values(runs)
+    if (any(run['_id'] > last_run_id for run in runs) or
+            any(values[facet] - set(facets.get(facet, []))
+                for facet in values)):
+        update_facets(db, runs)
+        facets = db.facets.find_one({'_id': FACETS_ID})
+    return facets
+
+
+def get_facets(db):
+    """Returns the values of the filters of the main page, sorted, as lists of
+    {field: value} documents like the ones of a $group on the field, and the
+    sorted list of the test names.
+
+    The facets document is built from the whole raw collection the first
+    time, and is then kept up to date by ingest_run() and by adding the runs
+    inserted since its last update.
+    """
+    facets = db.facets.find_one({'_id': FACETS_ID})
+    if facets is None:
+        rebuild_facets(db)
+        facets = db.facets.find_one({'_id': FACETS_ID})
+    else:
+        facets = refresh_facets(db, facets)
+    result = {}
+    for facet, field in FACET_FIELDS:
+        result[facet] = [{field: value}
+                         for value in sorted(facets.get(facet, []))]
+    # the most recent versions first
+    result['versions'].reverse()
+    result['tests'] = sorted(facets.get('tests', []))
+    return result
+
+
+def _claim_run(db, run_id):
+    """Claims a run for ingestion in the ingested_runs collection.
+
+    :returns: True if the run was claimed, False if it is already ingested,
+    or being ingested by another process
+    """
+    now = datetime.datetime.utcnow()
+    try:
+        db.ingested_runs.insert_one({'_id': run_id, 'state': INGESTING,
+                                     'claimed_at': now})
+        return True
+    except DuplicateKeyError:
+        pass
+    # Take the claim of a process that died over.
+    expired = now - datetime.timedelta(seconds=CLAIM_TIMEOUT)
+    claimed = db.ingested_runs.find_one_and_update(
+        {'_id': run_id, 'state': INGESTING, 'claimed_at': {'$lt': expired}},
+        {'$set': {'claimed_at': now}})
+    if claimed is None:
+        return False
+    if db.points.find_one({'run_id': run_id}, {'_id': 1}) is not None:
+        if server_version(db) < (7, 0):
+            raise IngestionError(
+                'The ingestion of run %s was interrupted, deleting its points '
+                'needs MongoDB 7.0' % run_id)
+        db.points.delete_many({'run_id': run_id})
+    return True
+
+
+def ingest_run(db, run):
+    """Normalizes a run of the raw collection, unless it was already.
+
+    :returns: the number of points of the run, or None if it was already
+    ingested (or is being ingested by another process)
+    """
+    if not _claim_run(db, run['_id']):
+        return None
+
+    update_facets(db, [run])
+    points = normalize_run(run)
+    if points:
+        db.points.insert_many(points, ordered=False)
+        updates = []
+        for point in points:
+            updates.extend(_rollup_updates(point))
+        db.test_history.bulk_write(updates, ordered=True)
+    db.ingested_runs.update_one(
+        {'_id': run['_id']},
+        {'$set': {'state': DONE, 'points': len(points),
+                  'ingested_at': datetime.datetime.utcnow()},
+         '$unset': {'claimed_at': ''}})
+    return len(points)
+
+
+def ingest_new_runs(db):
+    """Ingests all the runs of the raw collection that are not ingested yet
+
+    :returns: the number of runs ingested
+    """
+    # The runs being ingested are retried, in case their claim expired.
+    ingested = set(db.ingested_runs.distinct(
+        '_id', {'state': {'$ne': INGESTING}}))
+    count = 0
+    for run_id in db.raw.find({}, {'_id': 1}).sort('_id', pymongo.ASCENDING):
+        if run_id['_id'] in ingested:
+            continue
+        run = db.raw.find_one({'_id': run_id['_id']})
+        if run is not None and ingest_run(db, run) is not None:
+            count += 1
+    return count
+
+
+def watch_runs(db, on_ingested=None):
+    """Ingests the runs as they are inserted in the raw collection, calling
+    on_ingested with every run once it is ingested.
+
+    Runs until interrupted. Change streams need a replica set or a sharded
+    cluster.
+    """
+    pipeline = [{'$match': {'operationType': 'insert'}}]
+    with db.raw.watch(pipeline) as stream:
+        # the runs inserted before the stream was opened
+        ingest_new_runs(db)
+        for change in stream:
+            run = change['fullDocument']
+            if ingest_run(db, run) is not None and on_ingested is not None:
+                on_ingested(run)
+
+
+def is_ingested(db, run_ids):
+    """Returns True if all the runs with the given ids are ingested"""
+    return (db.ingested_runs.count_documents({'_id': {'$in': run_ids},
+                                              'state': {'$ne': INGESTING}})
+            == len(set(run_ids)))
+
+
+if __name__ == '__main__':
+    argument_parser = argparse.ArgumentParser(
+        description='Ingest the new mongo-perf runs into the normalized '
+                    'results collections.')
+    argument_parser.add_argument('--host', dest='host', default='localhost',
+                                 help='Hostname of the results database')
+    argument_parser.add_argument('--port', dest='port', type=int,
+                                 default=27017,
+                                 help='Port of the results database')
+    argument_parser.add_argument('--database', dest='database',
+                                 default='bench_results',
+                                 help='Name of the results database')
+    argument_parser.add_argument('--watch', dest='watch',
+                                 action='store_true',
+                                 help='Keep ingesting the runs as they are '
+                                      'inserted')
+    argument_parser.add_argument('--rebuildFacets', dest='rebuild_facets',
+                                 action='store_true',
+                                 help='Recompute the values of the filters of '
+                                      'the main page from all the runs')
+    args = argument_parser.parse_args()
+
+    db = pymongo.MongoClient(host=args.host, port=args.port)[args.database]
+    setup_collections(db)
+    if args.rebuild_facets:
+        rebuild_facets(db)
+    print('Ingested %d runs' % ingest_new_runs(db))
+    if args.watch:
+        watch_runs(db)
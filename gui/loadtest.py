@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# Copyright 2013 10gen, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Load test of the mongo-perf web app.
+
+Requests the main page, the catalog and the results of the most recent runs
+from a number of concurrent clients, and reports the throughput and latency
+of each route. Run it against the web app started with the different
+--server options of server.py to compare them, e.g.
+
+    python server.py --server auto &
+    python loadtest.py --clients 1 2 4 8 16
+    python server.py --server gevent &
+    python loadtest.py --clients 1 2 4 8 16
+"""
+
+import argparse
+import threading
+import time
+
+import requests
+
+
+def percentile(values, percent):
+    """Returns the value at percent (0-100) of the sorted list values"""
+    if not values:
+        return None
+    index = min(len(values) - 1, int(len(values) * percent / 100.0))
+    return values[index]
+
+
+def get_routes(url):
+    """Returns the urls of the routes to load: the main page, the catalog and
+    the results of the 10 most recent runs of the catalog.
+    """
+    catalog = requests.get(url + '/catalog').json()['data']
+    ids = '&'.join('id=' + row['_id'] for row in catalog[-10:])
+    return [('/', url + '/'),
+            ('/catalog', url + '/catalog'),
+            ('/results', url + '/results?' + ids),
+            ('/results?nohtml', url + '/results?nohtml=1&' + ids)]
+
+
+def run_client(session, routes, deadline, latencies, errors):
+    """Requests the routes in turn until deadline, recording the latency of
+    every request per route.
+    """
+    while time.time() < deadline:
+        for name, url in routes:
+            start = time.time()
+            try:
+                reply = session.get(url)
+                reply.raise_for_status()
+            except requests.RequestException:
+                errors[name] = errors.get(name, 0) + 1
+                continue
+            latencies.setdefault(name, []).append(time.time() - start)
+
+
+def load(routes, clients, seconds):
+    """Runs clients concurrent clients for seconds.
+
+    :returns: the latencies of the requests of each route, and the number of
+    failed requests of each route
+    """
+    deadline = time.time() + seconds
+    results = [({}, {}) for _ in range(clients)]
+    threads = []
+    for latencies, errors in results:
+        session = requests.Session()
+        session.headers['Accept-Encoding'] = 'gzip'
+        thread = threading.Thread(target=run_client,
+                                  args=(session, routes, deadline,
+                                        latencies, errors))
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+
+    all_latencies = {}
+    all_errors = {}
+    for latencies, errors in results:
+        for name, values in latencies.items():
+            all_latencies.setdefault(name, []).extend(values)
+        for name, count in errors.items():
+            all_errors[name] = all_errors.get(name, 0) + count
+    return all_latencies, all_errors
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Load test of the mongo-perf web app.')
+    parser.add_argument('--url', dest='url', default='http://localhost:8080',
+                        help='URL of the web app')
+    parser.add_argument('--clients', dest='clients', type=int, nargs='+',
+                        default=[1, 4, 16],
+                        help='Numbers of concurrent clients to load with')
+    parser.add_argument('--seconds', dest='seconds', type=int, default=30,
+                        help='Duration of the load of each number of clients')
+    args = parser.parse_args()
+
+    routes = get_routes(args.url.rstrip('/'))
+    for clients in args.clients:
+        latencies, errors = load(routes, clients, args.seconds)
+        total = sum(len(values) for values in latencies.values())
+        print('%d clients: %.1f requests/sec' %
+              (clients, total / float(args.seconds)))
+        for name, _ in routes:
+            values = sorted(latencies.get(name, []))
+            if not values:
+                print('    %-16s no successful request, %d errors' %
+                      (name, errors.get(name, 0)))
+                continue
+            print('    %-16s %6d requests  p50 %7.1fms  p99 %7.1fms  '
+                  '%d errors' % (name, len(values),
+                                 percentile(values, 50) * 1000,
+                                 percentile(values, 99) * 1000,
+                                 errors.get(name, 0)))
+
+
+if __name__ == '__main__':
+    main()
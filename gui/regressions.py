@@ -0,0 +1,296 @@
+#!/usr/bin/env python
+# Copyright 2013 10gen, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Detects the changes of performance in the history of the mongo-perf results.
+
+Every series of points (one per test, thread count, db mode, platform,
+storage engine and topology, see ingest.py) is monitored by a two-sided
+CUSUM of its ops_per_sec, standardized by the mean and standard deviation of
+the series since its last change, which are frozen while a sum is above 0.
+When one of the sums crosses its threshold, a change point is stored in the
+'change_points' collection with its magnitude and the range of commits it was
+introduced in: between the last run before the sum started to grow and the
+first run after.
+
+The state of the CUSUM of every series is kept in the 'regression_state'
+collection, so that only the points added since the last detection are
+read: the points dated after the last point processed for their series, and
+the points of other runs at the same date (e.g. a re-run of the same
+commit), tracked by their run ids. Points dated before the last point
+processed for their series are ignored.
+
+Run this module to process the points ingested since the last run, and with
+--watch to ingest the runs and process their points as they are inserted.
+"""
+
+import argparse
+import datetime
+import math
+
+import pymongo
+
+import ingest
+
+# Number of points in a series before the detection starts.
+BASELINE_POINTS = 5
+# Allowance and threshold of the CUSUM, in standard deviations.
+CUSUM_ALLOWANCE = 0.5
+CUSUM_THRESHOLD = 5.0
+# Lower bound of the standard deviation, relative to the mean, so that very
+# stable series do not report changes of a fraction of a percent.
+MIN_RELATIVE_STDDEV = 0.02
+
+
+def setup_collections(db):
+    """Creates the indexes of the change points"""
+    db.change_points.create_index([('meta.test', pymongo.ASCENDING),
+                                   ('first_changed.date',
+                                    pymongo.DESCENDING)])
+    db.change_points.create_index([('first_changed.date',
+                                    pymongo.DESCENDING)])
+
+
+def new_state(series_id, meta):
+    """Returns the state of the CUSUM of a series without any point"""
+    return {'_id': series_id, 'meta': meta, 'last_date': None,
+            'last_run_ids': [], 'last_point': None, 'count': 0, 'mean': 0.0,
+            'm2': 0.0, 'up': None, 'down': None, 'pending': None}
+
+
+def _last_run_ids(state):
+    """Returns the ids of the runs processed at the last date of a state"""
+    if 'last_run_ids' in state:
+        return state['last_run_ids']
+    # states from before the run ids were tracked
+    return [state['last_point']['run_id']] if state['last_point'] else []
+
+
+def _point_ref(point):
+    return {'commit': point['commit'], 'date': point['commit_date'],
+            'run_id': point['run_id'], 'label': point['label']}
+
+
+def _stddev(state):
+    stddev = 0.0
+    if state['count'] > 1:
+        stddev = math.sqrt(state['m2'] / (state['count'] - 1))
+    return max(stddev, abs(state['mean']) * MIN_RELATIVE_STDDEV)
+
+
+def _add_point(stats, value):
+    """Returns the count, mean and m2 of stats (None when empty) with
+    value added, with Welford's update"""
+    count, mean, m2 = ((stats['count'], stats['mean'], stats['m2'])
+                       if stats else (0, 0.0, 0.0))
+    count += 1
+    delta = value - mean
+    mean += delta / count
+    m2 += delta * (value - mean)
+    return {'count': count, 'mean': mean, 'm2': m2}
+
+
+def _merge_pending(state):
+    """Adds the points held back during the excursions of the CUSUM to the
+    mean and variance of the series, with Chan's parallel update"""
+    pending = state['pending']
+    count = state['count'] + pending['count']
+    delta = pending['mean'] - state['mean']
+    state['mean'] += delta * pending['count'] / count
+    state['m2'] += (pending['m2'] +
+                    delta * delta * state['count'] * pending['count'] / count)
+    state['count'] = count
+    state['pending'] = None
+
+
+def _add_to_excursion(excursion, deviation, state, point):
+    """Adds the standardized deviation of a point to the sum of an
+    excursion of the CUSUM, starting it if needed.
+
+    :returns: the excursion, or None when the sum went back to 0
+    """
+    ops_per_sec = point['ops_per_sec']
+    total = (excursion['sum'] if excursion else 0.0) + deviation - \
+        CUSUM_ALLOWANCE
+    if total <= 0:
+        return None
+    if excursion is None:
+        excursion = {'last_unchanged': state['last_point'],
+                     'first_changed': _point_ref(point),
+                     'count': 0, 'total': 0.0, 'total_squares': 0.0}
+    excursion['sum'] = total
+    excursion['count'] += 1
+    excursion['total'] += ops_per_sec
+    excursion['total_squares'] += ops_per_sec * ops_per_sec
+    return excursion
+
+
+def update_state(state, point):
+    """Adds a point to the CUSUM of its series.
+
+    :returns: the change point detected with the point, or None
+    """
+    ops_per_sec = point['ops_per_sec']
+    change_point = None
+    if state['count'] >= BASELINE_POINTS:
+        deviation = (ops_per_sec - state['mean']) / _stddev(state)
+        state['up'] = _add_to_excursion(state['up'], deviation, state,
+                                        point)
+        state['down'] = _add_to_excursion(state['down'], -deviation, state,
+                                          point)
+        for direction in ('up', 'down'):
+            excursion = state[direction]
+            if excursion is None or excursion['sum'] <= CUSUM_THRESHOLD:
+                continue
+            new_mean = excursion['total'] / excursion['count']
+            change_point = {
+                'series': state['_id'],
+                'meta': state['meta'],
+                'direction': ('improvement' if direction == 'up'
+                              else 'regression'),
+                'baseline_ops_per_sec': state['mean'],
+                'ops_per_sec': new_mean,
+                'magnitude': ((new_mean - state['mean']) / state['mean']
+                              if state['mean'] else None),
+                'last_unchanged': excursion['last_unchanged'],
+                'first_changed': excursion['first_changed'],
+                'detected_with': _point_ref(point),
+                'detected_at': datetime.datetime.now(datetime.timezone.utc)
+            }
+            # the points since the change are the new baseline
+            state['count'] = excursion['count']
+            state['mean'] = new_mean
+            state['m2'] = max(0.0, excursion['total_squares'] -
+                              excursion['count'] * new_mean * new_mean)
+            state['up'] = state['down'] = state['pending'] = None
+            break
+
+    if change_point is None:
+        # The mean and variance are frozen while a sum is above 0, so that
+        # a change does not drag them along before it is detected; the
+        # points of an excursion that ends without a change are added to
+        # them afterwards.
+        state['pending'] = _add_point(state.get('pending'), ops_per_sec)
+        if state['up'] is None and state['down'] is None:
+            _merge_pending(state)
+    if point['commit_date'] != state['last_date']:
+        state['last_run_ids'] = []
+    state['last_run_ids'] = _last_run_ids(state) + [point['run_id']]
+    state['last_point'] = _point_ref(point)
+    state['last_date'] = point['commit_date']
+    return change_point
+
+
+def process_series(db, series_id, meta, state=None):
+    """Runs the CUSUM of a series over its points newer than its state.
+
+    :returns: the number of change points detected
+    """
+    if state is None:
+        state = (db.regression_state.find_one({'_id': series_id}) or
+                 new_state(series_id, meta))
+    query = dict(('meta.' + field, value) for field, value in meta.items())
+    query['ops_per_sec'] = {'$ne': None}
+    processed = set()
+    if state['last_date'] is not None:
+        # The runs of the last date that are not processed yet are too.
+        query['commit_date'] = {'$gte': state['last_date']}
+        processed = set(_last_run_ids(state))
+    fields = {'commit_date': 1, 'commit': 1, 'run_id': 1, 'label': 1,
+              'ops_per_sec': 1}
+
+    change_points = []
+    cursor = db.points.find(query, fields).sort(
+        [('commit_date', pymongo.ASCENDING), ('run_id', pymongo.ASCENDING)])
+    for point in cursor:
+        if (point['commit_date'] == state['last_date'] and
+                point['run_id'] in processed):
+            continue
+        change_point = update_state(state, point)
+        if change_point is not None:
+            change_points.append(change_point)
+    if change_points:
+        db.change_points.insert_many(change_points)
+    db.regression_state.replace_one({'_id': series_id}, state, upsert=True)
+    return len(change_points)
+
+
+def detect_change_points(db, series_ids=None):
+    """Processes the new points of the series with the given ids, or of all
+    the series with points newer than their state.
+
+    :returns: the number of change points detected
+    """
+    query = {}
+    if series_ids is not None:
+        query['_id'] = {'$in': list(series_ids)}
+    states = dict((state['_id'], state)
+                  for state in db.regression_state.find(query))
+    count = 0
+    fields = {'meta': 1, 'last_date': 1, 'last_run_id': 1}
+    for history in db.test_history.find(query, fields):
+        state = states.get(history['_id'])
+        if (state is not None and state['last_date'] is not None and
+                (history['last_date'] < state['last_date'] or
+                 (history['last_date'] == state['last_date'] and
+                  history.get('last_run_id') in _last_run_ids(state)))):
+            continue
+        count += process_series(db, history['_id'], history['meta'], state)
+    return count
+
+
+def detect_run_change_points(db, run):
+    """Processes the new points of the series of an ingested run"""
+    series_ids = set(ingest.rollup_id(point['meta'])
+                     for point in ingest.normalize_run(run))
+    if series_ids:
+        detect_change_points(db, series_ids)
+
+
+def get_change_points(db, test_regex=None, direction=None, limit=100):
+    """Returns the most recent change points, newest first"""
+    query = {}
+    if test_regex:
+        query['meta.test'] = {'$regex': test_regex}
+    if direction:
+        query['direction'] = direction
+    return list(db.change_points.find(query, {'_id': 0}).sort(
+        'first_changed.date', pymongo.DESCENDING).limit(limit))
+
+
+if __name__ == '__main__':
+    argument_parser = argparse.ArgumentParser(
+        description='Detect the changes of performance in the mongo-perf '
+                    'results.')
+    argument_parser.add_argument('--host', dest='host', default='localhost',
+                                 help='Hostname of the results database')
+    argument_parser.add_argument('--port', dest='port', type=int,
+                                 default=27017,
+                                 help='Port of the results database')
+    argument_parser.add_argument('--database', dest='database',
+                                 default='bench_results',
+                                 help='Name of the results database')
+    argument_parser.add_argument('--watch', dest='watch',
+                                 action='store_true',
+                                 help='Keep ingesting the runs as they are '
+                                      'inserted, and processing their points')
+    args = argument_parser.parse_args()
+
+    db = pymongo.MongoClient(host=args.host, port=args.port)[args.database]
+    ingest.setup_collections(db)
+    setup_collections(db)
+    print('Detected %d change points' % detect_change_points(db))
+    if args.watch:
+        ingest.watch_runs(
+            db, on_ingested=lambda run: detect_run_change_points(db, run))
@@ -0,0 +1,109 @@
+<!doctype html>
+<html lang="us">
+    <head>
+        <meta charset="utf-8">
+        <title>MongoDB Performance Benchmarks</title>
+        <link href="static/DataTables-1.10.4/media/css/jquery.dataTables.min.css" rel="stylesheet">
+        <link href="static/bootstrap-3.3.0-dist/css/bootstrap.min.css" rel="stylesheet">
+        <link href="static/font-awesome-4.2.0/css/font-awesome.min.css" rel="stylesheet">
+        <link href="static/css/main.css" rel="stylesheet">
+        <script type="text/javascript" src="static/js/jquery-1.9.1.min.js"></script>
+        <script type="text/javascript" src="static/bootstrap-3.3.0-dist/js/bootstrap.min.js"></script>
+        <script type="text/javascript" src="static/DataTables-1.10.4/media/js/jquery.dataTables.min.js"></script>
+        <script>
+            $(document).ready(function () {
+                $('#changePointsTable').DataTable({
+                    "bPaginate": false,
+                    "bInfo": false,
+                    "order": [[6, "desc"]]
+                });
+            });
+        </script>
+    </head>
+    <body>
+        <div id="wrapper">
+            <div class="container-fluid">
+                <div class="row">
+                    <div class="navbar navbar-default navbar-fixed-top col-xs-12" role="navigation">
+                            <div class="navbar-header">
+                                <button type="button" class="navbar-toggle" data-toggle="collapse" data-target=".navbar-collapse">
+                                    <span class="sr-only">Toggle navigation</span>
+                                    <span class="icon-bar"></span>
+                                    <span class="icon-bar"></span>
+                                    <span class="icon-bar"></span>
+                                </button>
+                                <a class="navbar-brand" href="#">MongoDB: mongo-perf benchmark results</a>
+                            </div>
+                            <div class="navbar-collapse collapse">
+                                <ul class="nav navbar-nav">
+                                    <li><a href="/">Home</a></li>
+                                    <li class="active"><a href="/regressions">Regressions</a></li>
+                                </ul>
+                            </div>
+
+                    </div>
+                </div>
+                <div class="mainbody row">
+                    <div class="col-md-2">
+                        <div class="sidebar affix" data-spy="affix" data-offset-top="60">
+                            <form method="get" action="/regressions">
+                                <label for="test">Test:</label>
+                                <input type="search" id="test" name="test" class="form-control input-sm" value="{{test}}"/>
+                                <label for="direction">Direction:</label>
+                                <select id="direction" name="direction" class="form-control input-sm">
+                                    %for value, name in [('', 'All'), ('regression', 'Regressions'), ('improvement', 'Improvements')]:
+                                    <option value="{{value}}" {{'selected' if value == direction else ''}}>{{name}}</option>
+                                    %end
+                                </select>
+                                <br/>
+                                <button type="submit" class="btn btn-default">Filter</button>
+                            </form>
+                        </div>
+                    </div>
+                    <div class="col-md-10" role="main">
+                        <table id="changePointsTable" class="table table-striped table-condensed">
+                            <thead>
+                                <tr>
+                                    <th>Test</th>
+                                    <th>Threads</th>
+                                    <th>Platform / Engine / Topology</th>
+                                    <th>Change</th>
+                                    <th>ops/sec</th>
+                                    <th>Commits</th>
+                                    <th>Date</th>
+                                </tr>
+                            </thead>
+                            <tbody>
+                                %for change_point in change_points:
+                                %meta = change_point['meta']
+                                %last_unchanged = change_point['last_unchanged']
+                                %first_changed = change_point['first_changed']
+                                <tr class="{{'danger' if change_point['direction'] == 'regression' else 'success'}}">
+                                    <td>{{meta['test']}}</td>
+                                    <td>{{meta['thread']}}</td>
+                                    <td>{{meta['platform']}} / {{meta['server_storage_engine']}} / {{meta['topology']}}</td>
+                                    <td>
+                                        %if change_point['magnitude'] is not None:
+                                        {{'%+.1f%%' % (change_point['magnitude'] * 100)}}
+                                        %end
+                                    </td>
+                                    <td>{{'%.0f' % change_point['baseline_ops_per_sec']}} &rarr; {{'%.0f' % change_point['ops_per_sec']}}</td>
+                                    <td>
+                                        %if last_unchanged:
+                                        <a href="https://github.com/mongodb/mongo/compare/{{last_unchanged['commit']}}...{{first_changed['commit']}}" target="_blank">{{last_unchanged['commit'][:7]}}...{{first_changed['commit'][:7]}}</a>
+                                        %else:
+                                        <a href="https://github.com/mongodb/mongo/commit/{{first_changed['commit']}}" target="_blank">{{first_changed['commit'][:7]}}</a>
+                                        %end
+                                    </td>
+                                    <td>{{first_changed['date'].strftime("%Y-%m-%d %H:%M")}}</td>
+                                </tr>
+                                %end
+                            </tbody>
+                        </table>
+                    </div>
+                </div>
+            </div>
+        </div>
+    </body>
+</html>
+%# vim: set ft=html:
@@ -118,7 +118,16 @@
                                                 %if str(thread) in result:
                                                 <td>{{"{0:.2f}".format(result[str(thread)]["ops_per_sec"])}} <br/>
                                                     &sigma; =
-                                                    {{"{0:.2f}".format(result[str(thread)]["standardDeviation"])}}</td>
+                                                    {{"{0:.2f}".format(result[str(thread)]["standardDeviation"])}}
+                                                    %timeline = result[str(thread)].get("ops_per_sec_timeline")
+                                                    %if timeline and timeline["ops_per_sec"]:
+                                                    <br/>
+                                                    <svg class="sparkline" width="120" height="24">
+                                                        <title>ops/sec every {{timeline["interval_seconds"]}}s ({{timeline["source"]}}): min {{"{0:.0f}".format(min(timeline["ops_per_sec"]))}}, max {{"{0:.0f}".format(max(timeline["ops_per_sec"]))}}</title>
+                                                        <polyline points="{{sparkline_points(timeline['ops_per_sec'], 120, 24)}}"/>
+                                                    </svg>
+                                                    %end
+                                                    </td>
                                                 %else:
                                                 <td></td>
                                                 %end
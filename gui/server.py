@@ -15,15 +15,31 @@
 
 """Web app for mongo-perf"""
 
+import sys
+# the gevent server needs the standard library to be patched before anything
+# else imports it
+if ('--server=gevent' in sys.argv or
+        '--server gevent' in ' '.join(sys.argv[1:])):
+    from gevent import monkey
+    monkey.patch_all()
+
 import argparse
 import bson
+import calendar
 import json
 import pymongo
+import threading
 import time
+import zlib
 
+import ingest
+import regressions
 from bottle import *
-from collections import defaultdict
-from ConfigParser import SafeConfigParser
+from bson.son import SON
+from collections import defaultdict, OrderedDict
+from configparser import ConfigParser
+from datetime import datetime, timedelta
+from ingest import DEFAULT_STORAGE_ENGINE, DEFAULT_TOPOLOGY
 
 
 DEFAULT_OPTIONS = {
@@ -32,14 +48,15 @@ DEFAULT_OPTIONS = {
     'database_replica_set': 'none',
     'database_name': 'bench_results',
     'server_port': 8080,
-    'server_bindip': '0.0.0.0'
+    'server_bindip': '0.0.0.0',
+    'database_pool_size': 100
 }
-DEFAULT_STORAGE_ENGINE = 'mmapv0'
-DEFAULT_TOPOLOGY = 'single_node'
 CONFIG_INI_FILE_PRODUCTION = 'mongo-perf-prod.ini'
 CONFIG_INI_FILE_DEVELOPMENT = 'mongo-perf-devel.ini'
 RUN_MODE_PRODUCTION = 'prod'
 RUN_MODE_DEVELOPMENT = 'devel'
+# the servers the web app can run on, see the bottle server adapters
+SERVERS = ['auto', 'gevent', 'paste', 'cherrypy', 'wsgiref']
 
 # setup command line arguments
 argument_parser = argparse.ArgumentParser(
@@ -48,9 +65,18 @@ argument_parser.add_argument('--mode', dest='mode', action='store',
                              default='prod', choices=[RUN_MODE_PRODUCTION,
                                                       RUN_MODE_DEVELOPMENT],
                              help='The mode to run the mongo-perf server in')
+argument_parser.add_argument('--server', dest='server', action='store',
+                             default='auto', choices=SERVERS,
+                             help='The server to run the mongo-perf web app '
+                                  'on. gevent handles the requests '
+                                  'concurrently in greenlets, paste and '
+                                  'cherrypy in a pool of threads. auto picks '
+                                  'the first one installed.')
+argument_parser.add_argument('--reload', dest='reload', action='store_true',
+                             help='Reload the web app when its files change')
 args = argument_parser.parse_args()
 
-config = SafeConfigParser(defaults=DEFAULT_OPTIONS)
+config = ConfigParser(defaults=DEFAULT_OPTIONS)
 if args.mode == 'prod':
     config_files = [CONFIG_INI_FILE_PRODUCTION]
 else:
@@ -67,42 +93,102 @@ DATABASE_HOST = config.get(section='mongo-perf', option='database_hostname')
 DATABASE_PORT = config.get(section='mongo-perf', option='database_port',
                            raw=True)
 DATABASE_NAME = config.get(section='mongo-perf', option='database_name')
+DATABASE_POOL_SIZE = config.getint(section='mongo-perf',
+                                   option='database_pool_size')
 
 # web server settings
 SERVER_BIND_IP = config.get(section='mongo-perf', option='server_bindip')
 SERVER_PORT = config.get(section='mongo-perf', option='server_port', raw=True)
 
-# connect to our standalone, or replica set database
+# connect to our standalone, or replica set database. The client is shared by
+# all the requests, which are served from its pool of connections.
 if DATABASE_REPLICA_SET == 'none':
-    db = pymongo.Connection(host=DATABASE_HOST, port=DATABASE_PORT)[
-        DATABASE_NAME]
+    client = pymongo.MongoClient(host=DATABASE_HOST, port=int(DATABASE_PORT),
+                                 maxPoolSize=DATABASE_POOL_SIZE)
 else:
-    db = pymongo.Connection(host=DATABASE_HOST, port=DATABASE_PORT,
-                            replicaSet=DATABASE_REPLICA_SET)[DATABASE_NAME]
-
-
-global filter_cache
-filter_cache = {}
-filter_cache_timeout = 300
+    client = pymongo.MongoClient(host=DATABASE_HOST, port=int(DATABASE_PORT),
+                                 maxPoolSize=DATABASE_POOL_SIZE,
+                                 replicaSet=DATABASE_REPLICA_SET)
+db = client[DATABASE_NAME]
+
+
+# the fields of the raw collection needed by process_cursor
+RESULTS_PROJECTION = dict.fromkeys(['commit', 'platform', 'version', 'label',
+                                    'server_storage_engine', 'topology',
+                                    'commit_date', 'singledb', 'multidb'], 1)
+# size of the chunks of the streamed json responses
+JSON_CHUNK_SIZE = 64 * 1024
+# number of runs per page of the catalog
+CATALOG_PAGE_SIZE = 500
+# json responses smaller than this are not compressed
+GZIP_MIN_SIZE = 1024
+# number of comparisons kept in the results cache, and how long (in seconds)
+results_cache = OrderedDict()
+results_cache_lock = threading.Lock()
+results_cache_size = 64
+results_cache_timeout = 300
 
 # make sure the indexes needed for the gui are created
 
 # primary main page index
-db.raw.ensure_index([('commit_date', pymongo.ASCENDING),
+db.raw.create_index([('commit_date', pymongo.ASCENDING),
                      ('platform', pymongo.ASCENDING),
                      ('label', pymongo.ASCENDING),
                      ('server_storage_engine', pymongo.ASCENDING)])
 # # main page filters
-db.raw.ensure_index([('commit_date', pymongo.ASCENDING)])
-db.raw.ensure_index([('server_storage_engine', pymongo.ASCENDING)])
-db.raw.ensure_index([('label', pymongo.ASCENDING)], unique=True)
-db.raw.ensure_index([('platform', pymongo.ASCENDING)])
-db.raw.ensure_index([('version', pymongo.ASCENDING)])
-db.raw.ensure_index([('singledb.name', pymongo.ASCENDING)])
-db.raw.ensure_index([('multidb.name', pymongo.ASCENDING)])
-db.raw.ensure_index([('run_date', pymongo.ASCENDING)])
-db.raw.ensure_index([('run_time', pymongo.ASCENDING)])
-
+db.raw.create_index([('commit_date', pymongo.ASCENDING)])
+# catalog pages
+db.raw.create_index([('commit_date', pymongo.ASCENDING),
+                     ('_id', pymongo.ASCENDING)])
+db.raw.create_index([('server_storage_engine', pymongo.ASCENDING)])
+db.raw.create_index([('label', pymongo.ASCENDING)], unique=True)
+db.raw.create_index([('platform', pymongo.ASCENDING)])
+db.raw.create_index([('version', pymongo.ASCENDING)])
+db.raw.create_index([('singledb.name', pymongo.ASCENDING)])
+db.raw.create_index([('multidb.name', pymongo.ASCENDING)])
+db.raw.create_index([('run_date', pymongo.ASCENDING)])
+db.raw.create_index([('run_time', pymongo.ASCENDING)])
+# The collections of the normalized results and of the detected changes of
+# performance are created by ingest.py and regressions.py. Until the runs are
+# ingested, their results are read from the raw collection.
+
+
+
+def gzip_chunks(chunks):
+    """Returns the gzip compression of an iterable of chunks, chunk by chunk
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        if not isinstance(chunk, bytes):
+            chunk = chunk.encode('utf-8')
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def gzip_json(callback):
+    """Bottle plugin compressing the json responses for the clients accepting
+    gzip. The streamed responses are compressed as they are generated.
+    """
+    def wrapper(*args, **kwargs):
+        body = callback(*args, **kwargs)
+        if (not response.content_type.startswith('application/json') or
+                'gzip' not in request.headers.get('Accept-Encoding', '')):
+            return body
+        if isinstance(body, (bytes, type(u''))):
+            if len(body) < GZIP_MIN_SIZE:
+                return body
+            body = [body]
+        response.set_header('Content-Encoding', 'gzip')
+        response.add_header('Vary', 'Accept-Encoding')
+        if 'Content-Length' in response.headers:
+            del response.headers['Content-Length']
+        return gzip_chunks(body)
+    return wrapper
+
+
+install(gzip_json)
 
 
 @route('/static/:filename#.*#')
@@ -182,11 +268,11 @@ def gen_query(labels, dates, versions, start, end, limit, ids, commits,
     query = {
         "$and": [label_query, date_query, version_query, start_query, end_query,
                  id_query, commit_query, engines_query]}
-    cursor = db.raw.find(query).sort([('commit_date', pymongo.ASCENDING),
-                                      ('platform', pymongo.ASCENDING),
-                                      ('label', pymongo.ASCENDING),
-                                      ('server_storage_engine',
-                                       pymongo.ASCENDING)])
+    cursor = db.raw.find(query, RESULTS_PROJECTION).sort(
+        [('commit_date', pymongo.ASCENDING),
+         ('platform', pymongo.ASCENDING),
+         ('label', pymongo.ASCENDING),
+         ('server_storage_engine', pymongo.ASCENDING)])
 
     if limit:
         cursor.limit(limit)
@@ -195,50 +281,104 @@ def gen_query(labels, dates, versions, start, end, limit, ids, commits,
 
 
 def process_cursor(cursor, multidb):
-    aggregate = defaultdict(list)
-    result_size = cursor.count(with_limit_and_skip=True)
-
-    for index in xrange(0, result_size):
-        entry = cursor[index]
-        for mdb in multidb.split(' '):
-            mdbstr = 'singledb' if mdb == '0' else 'multidb'
-            if mdbstr in entry:
-                results = entry[mdbstr]
-
-                for result in results:
-                    row = dict(commit=entry['commit'],
-                               platform=entry['platform'],
-                               version=entry['version'],
-                               label=entry['label'],
-                               server_storage_engine=entry[
-                                   'server_storage_engine']
-                               )
+    """Groups the results of the runs of the cursor by test.
 
-                    row['topology'] = (entry['topology']
-                                       if 'topology' in entry.keys()
-                                       else DEFAULT_TOPOLOGY)
+    The cursor is iterated only once, each run being added to the per test
+    results as it comes.
+    """
+    aggregate = defaultdict(list)
+    mdbstrs = []
+    for mdb in multidb.split(' '):
+        mdbstr = 'singledb' if mdb == '0' else 'multidb'
+        if mdbstr not in mdbstrs:
+            mdbstrs.append(mdbstr)
+
+    for entry in cursor:
+        run_row = dict(commit=entry['commit'],
+                       platform=entry['platform'],
+                       version=entry['version'],
+                       label=entry['label'],
+                       server_storage_engine=entry['server_storage_engine'],
+                       topology=entry.get('topology', DEFAULT_TOPOLOGY))
+        if 'commit_date' in entry:
+            run_row['date'] = entry['commit_date'].strftime("%b %d %I:%M%p")
+        else:
+            # legacy data before we had commit_date in the schema
+            run_row['date'] = 'legacy'
 
-                    if 'commit_date' in entry.keys():
-                        row['date'] = entry['commit_date'].strftime(
-                            "%b %d %I:%M%p")
-                    else:
-                        # legacy data before we had commit_date in the schema
-                        row['date'] = 'legacy'
+        for mdbstr in mdbstrs:
+            for result in entry.get(mdbstr, []):
+                row = dict(run_row)
+                row.update(result['results'])
+                aggregate[result['name']].append(row)
 
-                    for (n, res) in result['results'].iteritems():
-                        row[n] = res
-                    aggregate[result['name']].append(row)
+    return [{'name': name, 'results': aggregate[name]}
+            for name in sorted(aggregate)]
 
-    aggregate = sorted(aggregate.iteritems(), key=lambda (k, v): k)
-    out = []
 
-    for item in aggregate:
-        out.append({'name': item[0], 'results': item[1]})
+def iter_json(results):
+    """Serializes a list of results as a json array, in chunks of about
+    JSON_CHUNK_SIZE bytes.
+    """
+    chunk = ['[']
+    chunk_size = 1
+    for i, result in enumerate(results):
+        encoded = (',' if i else '') + json.dumps(result, default=str)
+        chunk.append(encoded)
+        chunk_size += len(encoded)
+        if chunk_size >= JSON_CHUNK_SIZE:
+            yield ''.join(chunk)
+            chunk = []
+            chunk_size = 0
+    chunk.append(']')
+    yield ''.join(chunk)
+
+
+def process_points(ids, multidb):
+    """Returns the same results as process_cursor() for the runs with the
+    given ids, from their normalized points (see ingest.py).
+    """
+    db_modes = ['singledb' if mdb == '0' else 'multidb'
+                for mdb in multidb.split(' ')]
+    cursor = db.points.find(
+        {'run_id': {'$in': ids}, 'meta.db_mode': {'$in': db_modes}},
+        {'_id': 0, 'run_id': 1, 'meta': 1, 'commit': 1, 'label': 1,
+         'version': 1, 'commit_date': 1, 'legacy_date': 1, 'result': 1})
+    cursor.sort([('commit_date', pymongo.ASCENDING),
+                 ('meta.platform', pymongo.ASCENDING),
+                 ('label', pymongo.ASCENDING),
+                 ('meta.server_storage_engine', pymongo.ASCENDING)])
 
-    return out
+    aggregate = defaultdict(list)
+    rows = {}
+    for point in cursor:
+        meta = point['meta']
+        key = (meta['test'], point['run_id'], meta['db_mode'])
+        if key not in rows:
+            row = dict(commit=point['commit'],
+                       platform=meta['platform'],
+                       version=point['version'],
+                       label=point['label'],
+                       server_storage_engine=meta['server_storage_engine'],
+                       topology=meta['topology'])
+            if point['legacy_date']:
+                row['date'] = 'legacy'
+            else:
+                row['date'] = point['commit_date'].strftime("%b %d %I:%M%p")
+            rows[key] = row
+            aggregate[meta['test']].append(row)
+        rows[key][str(meta['thread'])] = point['result']
+
+    return [{'name': name, 'results': aggregate[name]}
+            for name in sorted(aggregate)]
 
 
 def raw_data(labels, multidb, dates, start, end, limit, ids, commits, engines):
+    if (ids and not (labels or dates or start or end or limit or commits or
+                     engines)):
+        objids = [bson.objectid.ObjectId(id) for id in ids]
+        if ingest.is_ingested(db, objids):
+            return process_points(objids, multidb)
     cursor = gen_query(labels, dates, None, start, end, limit, ids, commits,
                        engines)
     result = process_cursor(cursor, multidb)
@@ -248,17 +388,17 @@ def raw_data(labels, multidb, dates, start, end, limit, ids, commits, engines):
 def getDefaultIDs():
     prere = re.compile('pre')
     # most recent baseline id
-    baselineid = db['raw'].find({'version': {'$not': prere}}, {'_id': 1}).sort(
-        'commit_date', pymongo.DESCENDING).limit(
-        1)
+    baselineid = list(db['raw'].find({'version': {'$not': prere}},
+                                     {'_id': 1}).sort(
+        'commit_date', pymongo.DESCENDING).limit(1))
     # 6 newer ids
     newids = db['raw'].find({}, {'_id': 1}).sort('commit_date',
                                                  pymongo.DESCENDING).limit(6)
     outlist = []
-    if baselineid.count(True) > 0:
+    if baselineid:
         outlist.append(str(baselineid[0]['_id']))
-    for i in range(newids.count(True)):
-        outlist.append(str(newids[i]['_id']))
+    for newid in newids:
+        outlist.append(str(newid['_id']))
 
     return outlist
 
@@ -273,135 +413,235 @@ def results_page():
     multidb = request.GET.get('multidb', '0 1')
     # x-axis-type 0 == time, 1 == threads
     xaxis = request.GET.get('xaxis', '0')
-    spread_dates = True
+    nohtml = request.GET.get('nohtml')
 
     if len(ids) == 0:
         ids = getDefaultIDs()
 
-    results = raw_data(None, multidb, None,
-                       None, None, None, ids, None, None)
-
-    # check to see if we want the x-axis as time
-    if xaxis == '0':
-        new_results = []
-        dates = set()
-        threads = []
-        for outer_result in results:
-            # goal here is to create "data" and "labels"
-            dy_map = {}
-            results_section = []
-            for result in outer_result['results']:
-                # if we need to construct threads
-                if len(threads) == 0:
-                    threadset = set()
-                    for k in result.keys():
-                        if k.isdigit():
-                            threadset.add(k)
-                    threads = list(threadset)
-                    threads.sort(key=int)
-                result_entry = []
-                result_entry.append(result['date'])
-                for thread in threads:
-                    if thread in result:
-                        result_entry.append([result[thread]['ops_per_sec'],
-                                             result[thread][
-                                                 'standardDeviation']])
-                    else:
-                        result_entry.append([None, None])
-                # here we have [<date>, ops1, ops2...]
-                results_section.append(result_entry)
-
-            # construct final object
-            labels = ['Commit Date']
-            labels.extend(threads)
-            new_results.append({'data': json.dumps(results_section),
+    if nohtml:
+        results = get_results(ids, multidb)
+        response.content_type = 'application/json'
+        return iter_json(results)
+
+    results, dygraph_results, threads = get_comparison(ids, multidb, xaxis)
+    use_dates = xaxis == '0'
+    return template('results.tpl', results=results, request=request,
+                    dygraph_results=dygraph_results, threads=threads,
+                    use_dates=use_dates, spread_dates=use_dates,
+                    sparkline_points=sparkline_points)
+
+
+def sparkline_points(values, width, height):
+    """Returns the points of the svg polyline of a sparkline of values, from
+    0 (at the bottom) to their maximum (at the top).
+    """
+    values = [value or 0 for value in values]
+    highest = max(values) or 1
+    step = float(width) / max(len(values) - 1, 1)
+    return ' '.join('%.1f,%.1f' % (i * step,
+                                   height - float(value) / highest * height)
+                    for i, value in enumerate(values))
+
+
+def cached(key, compute):
+    """Returns the value of key in the results cache, calling compute to
+    (re)compute it when it is missing or out of date.
+    """
+    now = time.time()
+    with results_cache_lock:
+        if key in results_cache:
+            value, last_updated = results_cache.pop(key)
+            if now <= last_updated + results_cache_timeout:
+                # most recently used last
+                results_cache[key] = value, last_updated
+                return value
+    value = compute()
+    with results_cache_lock:
+        results_cache[key] = value, now
+        while len(results_cache) > results_cache_size:
+            results_cache.popitem(last=False)
+    return value
+
+
+def get_results(ids, multidb):
+    """Returns the results of the runs with the given ids, from the cache"""
+    return cached(('results', frozenset(ids), multidb),
+                  lambda: raw_data(None, multidb, None, None, None, None,
+                                   ids, None, None))
+
+
+def get_comparison(ids, multidb, xaxis):
+    """Returns the results of the runs with the given ids, the dygraphs data
+    of each test and the thread counts, from the cache.
+
+    xaxis is '0' to graph the results by commit date, '1' by thread count.
+    """
+    def compute():
+        results = get_results(ids, multidb)
+        if xaxis == '0':
+            dygraph_results, threads = to_date_graphs(results)
+        else:
+            dygraph_results, threads = to_thread_graphs(results)
+        return results, dygraph_results, threads
+    return cached(('comparison', frozenset(ids), multidb, xaxis), compute)
+
+
+def to_date_graphs(results):
+    """Returns the dygraphs data of the results of each test by commit date,
+    with a series per thread count, and the thread counts.
+    """
+    dygraph_results = []
+    threads = []
+    for outer_result in results:
+        # the thread counts are the ones of the first run
+        if not threads and outer_result['results']:
+            threads = sorted((k for k in outer_result['results'][0]
+                              if k.isdigit()), key=int)
+        # here we have [<date>, ops1, ops2...]
+        results_section = [
+            [result['date']] +
+            [[result[thread]['ops_per_sec'],
+              result[thread]['standardDeviation']]
+             if thread in result else [None, None]
+             for thread in threads]
+            for result in outer_result['results']]
+
+        labels = ['Commit Date']
+        labels.extend(threads)
+        dygraph_results.append({'data': json.dumps(results_section),
                                 'labels_json': json.dumps(labels),
                                 'labels_list': labels})
-        return template('results.tpl', results=results, request=request,
-                        dygraph_results=new_results, threads=threads,
-                        use_dates=True, spread_dates=spread_dates)
-    elif xaxis == '1':
-        # xaxis is threads
-        threads = set()
-        dygraph_results = []
-        for outer_result in results:
-            out = []
-            for i, result in enumerate(outer_result['results']):
-                out.append(
-                    {'label': ' / '.join((result['label'], result['version'],
-                                          result['date'],
-                                          result['server_storage_engine'])),
-                     'data': sorted(
-                         [int(k), [v['ops_per_sec'], v['standardDeviation']]]
-                         for (k, v) in result.iteritems() if k.isdigit())})
-                threads.update(int(k) for k in result if k.isdigit())
-            dygraph_data, dygraph_labels = to_dygraphs_data_format(out)
-            dygraph_results.append({'data': json.dumps(dygraph_data),
-                                    'labels_json': json.dumps(dygraph_labels),
-                                    'labels_list': dygraph_labels})
-        return template('results.tpl', results=results, request=request,
-                        dygraph_results=dygraph_results,
-                        threads=sorted(threads),
-                        use_dates=False, spread_dates=False)
+    return dygraph_results, threads
+
+
+def to_thread_graphs(results):
+    """Returns the dygraphs data of the results of each test by thread count,
+    with a series per run, and the thread counts.
+    """
+    threads = set()
+    dygraph_results = []
+    for outer_result in results:
+        out = []
+        for result in outer_result['results']:
+            out.append(
+                {'label': ' / '.join((result['label'], result['version'],
+                                      result['date'],
+                                      result['server_storage_engine'])),
+                 'data': dict(
+                     (int(k), [v['ops_per_sec'], v['standardDeviation']])
+                     for (k, v) in result.items() if k.isdigit())})
+            threads.update(int(k) for k in result if k.isdigit())
+        dygraph_data, dygraph_labels = to_dygraphs_data_format(out)
+        dygraph_results.append({'data': dygraph_data,
+                                'labels_json': json.dumps(dygraph_labels),
+                                'labels_list': dygraph_labels})
+    return dygraph_results, sorted(threads)
 
 
 def to_dygraphs_data_format(in_data):
     """returns js string containing the dygraphs data
-    representation of the input and a js string containing
+    representation of the input and a list containing
     dygraphs representation of labels
-    """
 
+    The data of every series of the input is a dict of its values by thread
+    count, the rows of the series are joined on the thread counts.
+    """
     thread_counts = set()
-    ## get all thread counts
-    for data_set in in_data:
-        for thread_entry in data_set['data']:
-            thread_counts.add(thread_entry[0])
+    for series in in_data:
+        thread_counts.update(series['data'])
 
-    # start by initializing our two new arrays
-    graph_data = []
     labels = ["# of Threads"]
+    labels.extend(series['label'] for series in in_data)
+
+    missing = [None, None]
+    graph_data = [[thread_count] +
+                  [series['data'].get(thread_count, missing)
+                   for series in in_data]
+                  for thread_count in sorted(thread_counts)]
+    return json.dumps(graph_data), labels
+
+def catalog_match(commit_regex, start_date, end_date, label_regex,
+                  version_regex, engine_regex):
+    """Returns the query on the raw collection for the catalog filters"""
+    query = {}
+    if commit_regex:
+        query['commit'] = {'$regex': commit_regex}
+    if label_regex:
+        query['label'] = {'$regex': label_regex, '$options': 'i'}
+    if version_regex:
+        query['version'] = {'$regex': version_regex, '$options': 'i'}
+    if engine_regex:
+        query['server_storage_engine'] = {'$regex': engine_regex,
+                                          '$options': 'i'}
+    if start_date or end_date:
+        query['commit_date'] = {}
+        if start_date:
+            query['commit_date']['$gte'] = start_date
+        if end_date:
+            query['commit_date']['$lte'] = end_date
+    return query
+
+
+def catalog_page_token(record):
+    """Returns the keyset cursor of the catalog page following record"""
+    if 'commit_date' in record:
+        date = str(calendar.timegm(record['commit_date'].utctimetuple()) *
+                   1000 + record['commit_date'].microsecond // 1000)
+    else:
+        date = ''
+    return '%s_%s' % (date, record['_id'])
+
+
+def catalog_after(token):
+    """Returns the query matching the catalog rows following a page token"""
+    date, _, record_id = token.partition('_')
+    record_id = bson.objectid.ObjectId(record_id)
+    if not date:
+        # legacy runs without a commit_date come first
+        return {'$or': [{'commit_date': None, '_id': {'$gt': record_id}},
+                        {'commit_date': {'$ne': None}}]}
+    # rebuilt in whole milliseconds, as stored by the server, so that the
+    # equality on the commit_date of the token matches it exactly
+    date = datetime(1970, 1, 1) + timedelta(milliseconds=int(date))
+    return {'$or': [{'commit_date': date, '_id': {'$gt': record_id}},
+                    {'commit_date': {'$gt': date}}]}
 
-    # setup the labels
-    for series in in_data:
-        labels.append(series['label'])
-
-    # append data for each point
-    for thread_count in sorted(thread_counts):
-        graph_data.append([])
-        point = len(graph_data) - 1
-        graph_data[point].append(thread_count)
-        for series in in_data:
-            thread_count_entry = [None, None]
-            for entry in series['data']:
-                if (entry[0] == thread_count):
-                    thread_count_entry = entry[1]
-                    break
-            graph_data[point].append(thread_count_entry)
-
-    return graph_data, labels
 
 def get_rows(commit_regex, start_date, end_date, label_regex, version_regex,
-             engine_regex):
-    if commit_regex is not None:
-        commit_regex = '/' + commit_regex + '/'
-    if label_regex is not None:
-        label_regex = '/' + label_regex + '/'
-    if version_regex is not None:
-        version_regex = '/' + version_regex + '/'
-    if engine_regex is not None:
-        engine_regex = '/' + engine_regex + '/'
-
-    csr = db.raw.find({}, {'singledb.results': 0, 'multidb.results': 0,
-                           'multidb-multicoll.results': 0})
-    csr.sort([('commit_date', pymongo.ASCENDING),
-              ('platform', pymongo.ASCENDING),
-              ('label', pymongo.ASCENDING),
-              ('server_storage_engine',
-              pymongo.ASCENDING)])
+             engine_regex, after=None, limit=None):
+    """Returns the rows of the catalog matching the filters, and the token of
+    the next page (None on the last page).
+
+    The filtering, sorting, paging and extraction of the test names of the
+    runs are done by the server; only the display formatting is left to do
+    here. Pages are sorted by commit date and follow the run of the token
+    given in after.
+    """
+    match = catalog_match(commit_regex, start_date, end_date, label_regex,
+                          version_regex, engine_regex)
+    if after:
+        match = {'$and': [match, catalog_after(after)]}
+
+    # the test names of the first of singledb, multidb-multicoll and multidb
+    test_names = {'$ifNull': ['$singledb.name',
+                              {'$ifNull': ['$multidb-multicoll.name',
+                                           {'$ifNull': ['$multidb.name',
+                                                        []]}]}]}
+    pipeline = [{'$match': match},
+                {'$sort': SON([('commit_date', pymongo.ASCENDING),
+                               ('_id', pymongo.ASCENDING)])}]
+    if limit:
+        pipeline.append({'$limit': limit})
+    pipeline.append({'$project': {
+        'commit': 1, 'label': 1, 'version': 1, 'commit_date': 1,
+        'run_time': 1, 'end_time': 1, 'platform': 1, 'crudOptions': 1,
+        'server_storage_engine': 1, 'topology': 1,
+        'tests': {'$setUnion': [test_names, []]}}})
 
     rows = []
-    for record in csr:
-        if 'commit_date' in record.keys():
+    record = None
+    for record in db.raw.aggregate(pipeline):
+        if 'commit_date' in record:
             commit_date = record["commit_date"].strftime("%b %d  %I:%M %p")
             commit_date_timestamp = time.mktime(
                 record["commit_date"].timetuple())
@@ -409,7 +649,7 @@ def get_rows(commit_regex, start_date, end_date, label_regex, version_regex,
             commit_date = 'legacy'
             commit_date_timestamp = 0
 
-        if 'run_time' in record.keys():
+        if 'run_time' in record:
             run_date = record['run_time'].strftime("%Y-%m-%d %H:%M")
             run_date_timestamp = time.mktime(
                 record["run_time"].timetuple())
@@ -417,47 +657,8 @@ def get_rows(commit_regex, start_date, end_date, label_regex, version_regex,
             run_date = 'legacy'
             run_date_timestamp = 0
 
-        if 'version' in record.keys():
-            server_version = record['version']
-        else:
-            server_version = 'pending'
-
-        test_holder = None
-        if 'singledb' in record.keys():
-            test_holder = 'singledb'
-        elif 'multidb-multicoll' in record.keys():
-            test_holder = 'multidb-multicoll'
-        elif 'multidb' in record.keys():
-            test_holder = 'multidb'
-
-
-
-        if 'server_storage_engine' in record:
-            server_storage_engine = record['server_storage_engine']
-        else:
-            server_storage_engine = DEFAULT_STORAGE_ENGINE
-
-        if 'topology' in record:
-            topology = record['topology']
-        else:
-            topology = DEFAULT_TOPOLOGY
-
-        # Get the threads and the test suites run
-        tests = set()
-        test_suites = set()
-        # thread_count_set = set()
-
-        if test_holder is not None:
-            for test in record[test_holder]:
-                tests.add(test['name'])
-                test_suites.add(test['name'].split(".", 1)[0])
-                # for thread_count in test['results']:
-                #     if thread_count.isdigit():
-                #         thread_count_set.add(thread_count)
-
-
         # Calculate the runtime
-        if 'end_time' in record.keys() and 'run_time' in record.keys():
+        if 'end_time' in record and 'run_time' in record:
             run_time = (record['end_time'] - record['run_time'])
             run_time = '{0:02}:{1:02}:{2:02}'.format(run_time.seconds // 3600,
                                                   run_time.seconds % 3600 // 60,
@@ -465,17 +666,12 @@ def get_rows(commit_regex, start_date, end_date, label_regex, version_regex,
         else:
             run_time = None
 
-        crudOptions = False
-        if 'crudOptions' in record.keys():
-            crudOptions = record['crudOptions']
-
-
-
-        tmpdoc = {
+        tests = sorted(record['tests'])
+        rows.append({
             "_id": str(record["_id"]),
             "commit": record["commit"],
             "label": record["label"],
-            "version": server_version,
+            "version": record.get('version', 'pending'),
             "commit_date": {
                 "display": commit_date,
                 "timestamp": int(commit_date_timestamp)
@@ -485,22 +681,23 @@ def get_rows(commit_regex, start_date, end_date, label_regex, version_regex,
                 "timestamp": int(run_date_timestamp)
             },
             "platform": record["platform"],
-            "crudOptions": crudOptions,
+            "crudOptions": record.get('crudOptions', False),
             "run_time": run_time,
-            "test_suites": sorted(test_suites),
-            "tests": list(sorted(tests)),
-            # "threads": sorted(thread_count_set, key=int),
-            "server_storage_engine": server_storage_engine,
-            "topology": topology
-        }
+            "test_suites": sorted(set(test.split(".", 1)[0]
+                                      for test in tests)),
+            "tests": tests,
+            "server_storage_engine": record.get('server_storage_engine',
+                                                DEFAULT_STORAGE_ENGINE),
+            "topology": record.get('topology', DEFAULT_TOPOLOGY)
+        })
 
-        rows.append(tmpdoc)
-    return rows
+    if limit and len(rows) == limit:
+        return rows, catalog_page_token(record)
+    return rows, None
 
 
 @route("/")
 def new_main_page():
-    global filter_cache
     commit_regex = request.GET.get('commit')
     start_date = request.GET.get('start')
     end_date = request.GET.get('end')
@@ -519,91 +716,90 @@ def new_main_page():
     else:
         end = None
 
-    if ('last_updated' not in filter_cache
-        or time.time() > filter_cache['last_updated'] + filter_cache_timeout):
-        filter_cache['versions'] = db.raw.aggregate(
-            [{"$match": {"version": {"$exists": 1}}},
-             {"$group": {"_id": "$version"}},
-             {"$sort": {"_id": -1}},
-             {"$project": {"_id": 0, "version": "$_id"}}])['result']
-
-        filter_cache['topologies'] = db.raw.aggregate(
-            [{"$match": {"topology": {"$exists": 1}}},
-             {"$group": {"_id": "$topology"}},
-             {"$sort": {"_id": 1}},
-             {"$project": {"_id": 0, "topology": "$_id"}}])['result']
-
-        filter_cache['storage_engines'] = db.raw.aggregate(
-            [{"$match": {"server_storage_engine": {"$exists": 1}}},
-             {"$group": {"_id": "$server_storage_engine"}},
-             {"$sort": {"_id": 1}},
-             {"$project": {"_id": 0, "server_storage_engine": "$_id"}}])['result']
-
-        filter_cache['platforms']  = db.raw.aggregate(
-            [{"$match": {"platform": {"$exists": 1}}},
-             {"$group": {"_id": "$platform"}},
-             {"$sort": {"_id": 1}},
-             {"$project": {"_id": 0, "platform": "$_id"}}])['result']
-
-        singledb_tests = db.raw.aggregate(
-            [{"$unwind": "$singledb"},
-            {"$group":{"_id":"$singledb.name"}},
-            {"$sort": {"_id": 1}},
-            {"$project": {"_id": 0, "test": "$_id"}}])['result']
-        multi_tests = db.raw.aggregate(
-            [{"$unwind": "$multidb"},
-             {"$group":{"_id":"$multidb.name"}},
-             {"$sort": {"_id": 1}},
-             {"$project": {"_id": 0, "test": "$_id"}}])['result']
-
-        all_tests = set()
-        for test in singledb_tests:
-            all_tests.add(test['test'])
-        for test in multi_tests:
-            all_tests.add(test['test'])
-
-        filter_cache['tests'] = sorted(all_tests)
-        filter_cache['last_updated'] = time.time()
-
-    rows = get_rows(commit_regex, start, end, label_regex, version_regex,
-                    engine_regex)
+    # the values of the filters are maintained by ingest.py
+    facets = ingest.get_facets(db)
 
     if nohtml:
+        rows, _ = get_rows(commit_regex, start, end, label_regex,
+                           version_regex, engine_regex)
         response.content_type = 'application/json'
         return json.dumps(rows)
     else:
+        # the following pages are loaded by the page from /catalog
+        rows, next_page = get_rows(commit_regex, start, end, label_regex,
+                                   version_regex, engine_regex,
+                                   limit=CATALOG_PAGE_SIZE)
         return template('comp.tpl', allrows=rows,
-                        versions=filter_cache['versions'],
-                        storage_engines=filter_cache['storage_engines'],
-                        platforms=filter_cache['platforms'],
-                        tests=filter_cache['tests'],
+                        versions=facets['versions'],
+                        storage_engines=facets['storage_engines'],
+                        platforms=facets['platforms'],
+                        tests=facets['tests'],
                         table_data=json.dumps(rows),
-                        topologies=filter_cache['topologies'])
+                        next_page=json.dumps(next_page),
+                        topologies=facets['topologies'])
+
+
+@route("/regressions")
+def regressions_page():
+    """Handler for the page of the detected changes of performance"""
+    test_regex = request.GET.get('test')
+    direction = request.GET.get('direction')
+    nohtml = request.GET.get('nohtml')
+    try:
+        limit = int(request.GET.get('limit', 100))
+    except ValueError:
+        limit = 100
+
+    change_points = regressions.get_change_points(db, test_regex, direction,
+                                                  limit)
+    if nohtml:
+        response.content_type = 'application/json'
+        return json.dumps(change_points, default=str)
+    return template('regressions.tpl', change_points=change_points,
+                    test=test_regex or '', direction=direction or '')
 
 
 @route("/catalog")
 def get_catalog():
-    # commit_regex = request.GET.get('commit')
-    # start_date = request.GET.get('start')
-    # end_date = request.GET.get('end')
-    # label_regex = request.GET.get('label')
-    # version_regex = request.GET.get('version')
-    # engine_regex = request.GET.get('engine')
-    # # convert to appropriate type
-    # if start_date:
-    # start = datetime.strptime(start_date, '%m/%d/%Y')
-    # else:
-    # start = None
-    # if end_date:
-    # end = datetime.strptime(end_date, '%m/%d/%Y')
-    # else:
-    # end = None
-
-    rows = get_rows(None, None, None, None, None, None)
+    """Returns the catalog rows. With a length parameter, returns pages of
+    that many rows; the token of the next page is returned in 'next' and is
+    passed back in the 'after' parameter.
+    """
+    commit_regex = request.GET.get('commit')
+    start_date = request.GET.get('start')
+    end_date = request.GET.get('end')
+    label_regex = request.GET.get('label')
+    version_regex = request.GET.get('version')
+    engine_regex = request.GET.get('engine')
+    after = request.GET.get('after')
+    draw = request.GET.get('draw')
+    try:
+        limit = int(request.GET.get('length', 0)) or None
+    except ValueError:
+        limit = CATALOG_PAGE_SIZE
+
+    # convert to appropriate type
+    if start_date:
+        start = datetime.strptime(start_date, '%m/%d/%Y')
+    else:
+        start = None
+    if end_date:
+        end = datetime.strptime(end_date, '%m/%d/%Y')
+    else:
+        end = None
+
+    rows, next_page = get_rows(commit_regex, start, end, label_regex,
+                               version_regex, engine_regex, after=after,
+                               limit=limit)
     response.content_type = 'application/json'
-    return json.dumps({"data": rows})
+    return json.dumps({"draw": int(draw) if draw else None, "data": rows,
+                       "next": next_page})
 
 
 if __name__ == '__main__':
-    do_reload = '--reload' in sys.argv
-    run(host=SERVER_BIND_IP, port=SERVER_PORT, server=AutoServer, debug=True)
+    if args.server == 'auto':
+        server = AutoServer
+    else:
+        server = args.server
+    run(host=SERVER_BIND_IP, port=SERVER_PORT, server=server,
+        debug=args.mode == RUN_MODE_DEVELOPMENT, reloader=args.reload)
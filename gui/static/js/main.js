@@ -131,6 +131,22 @@ $(document).ready(function () {
         }
     });
 
+    // The page only embeds the first runs of the catalog, load the others
+    // page by page following the keyset cursor returned by /catalog.
+    function loadCatalogPage(after) {
+        if (after === null) {
+            return;
+        }
+        // keep the filters of the page
+        $.getJSON("catalog" + window.location.search,
+            {"after": after, "length": data.length},
+            function (json) {
+                table.rows.add(json.data).draw(false);
+                loadCatalogPage(json.next);
+            });
+    }
+    loadCatalogPage(nextPage);
+
     $('#selectTable tbody')
         .on('click', 'td.click-selectable', function () {
             var tr = $(this).closest('tr');
@@ -15,9 +15,11 @@ if (typeof (tests) !== "object") {
      * document.
      * @param {Object[]} indexes - A list of index specs to create on the collection.
      * @param {Object} collectionOptions - Options to use for view/collection creation.
+     * @param {Object} datasetSpec - The values that docGenerator captures from its scope, for the
+     * dataset to be cached (see DatasetCache). Not cached when unset.
      */
-    function collectionPopulator(nDocs, indexes, docGenerator, collectionOptions) {
-        return function(collection) {
+    function collectionPopulator(nDocs, indexes, docGenerator, collectionOptions, datasetSpec) {
+        var populate = function(collection) {
             Random.setRandomSeed(259);
 
             collection.drop();
@@ -27,15 +29,24 @@ if (typeof (tests) !== "object") {
             var collectionCreationSpec = { create: collection.getName() };
             assert.commandWorked(
                 db.runCommand(Object.extend(collectionCreationSpec, collectionOptions)));
-            var bulkOp = collection.initializeUnorderedBulkOp();
-            for (var i = 0; i < nDocs; i++) {
-                bulkOp.insert(docGenerator(i));
-            }
-            bulkOp.execute();
+            insertGeneratedDocs(collection, nDocs, docGenerator);
             indexes.forEach(function(indexSpec) {
                 assert.commandWorked(collection.createIndex(indexSpec));
             });
         };
+        // Describe the generated dataset so that it can be cached, see DatasetCache.
+        if (typeof datasetSpec === "object") {
+            populate.datasetSpec = {
+                nDocs: nDocs,
+                indexes: indexes,
+                docs: docGenerator.toString(),
+                documentExpression: docGenerator.documentExpression,
+                docsScope: datasetSpec,
+                collectionOptions: collectionOptions,
+                seed: 259
+            };
+        }
+        return populate;
     }
 
     /**
@@ -60,6 +71,7 @@ if (typeof (tests) !== "object") {
      * is automatically added to test cases for collections. The tags "views" and
      * "query_identityview" are added to test cases for views.
      * @param {Object} {options.collectionOptions={}} - Options to use for view/collection creation.
+     * @param {Object} {options.datasetSpec} - The values that options.docs captures from its scope.
      */
     function addTestCase(options) {
         var indexes = options.indexes || [];
@@ -69,7 +81,8 @@ if (typeof (tests) !== "object") {
             tags: ["bigcollection"].concat(tags),
             name: "BigCollection." + options.name,
             pre: collectionPopulator(
-                options.nDocs, indexes, options.docs, options.collectionOptions),
+                options.nDocs, indexes, options.docs, options.collectionOptions,
+                options.datasetSpec),
             post: function(collection) {
                 collection.drop();
             },
@@ -81,7 +94,8 @@ if (typeof (tests) !== "object") {
             tags: ["agg_bigcollection_comparison"].concat(tags),
             name: "BigCollectionAggregation." + options.name,
             pre: collectionPopulator(
-                options.nDocs, indexes, options.docs, options.collectionOptions),
+                options.nDocs, indexes, options.docs, options.collectionOptions,
+                options.datasetSpec),
             post: function(collection) {
                 collection.drop();
             },
@@ -92,17 +106,25 @@ if (typeof (tests) !== "object") {
     function testQuery(testName, nDocs, docSize, op) {
         var fullName = testName + " (nDocs: " + nDocs + ", docSize: " + docSize +
                        ", batchSize: " + (op.batchSize ? op.batchSize : "0") + ")";
+        const offsetForTheRemainderOfDoc = 37;
+        // This generates documents to be inserted into the collection, resulting in 'nDocs'
+        // documents with three fields: _id, x, and y. The exact size of each document is
+        // 'docSize' bytes.
+        var docs = function(i) {
+            return { _id: i, x: i + 1, y: 'y'.repeat(docSize - offsetForTheRemainderOfDoc) };
+        };
+        // The same documents, generated by the server.
+        docs.documentExpression = {
+            _id: "$$i",
+            x: { $add: ["$$i", 1] },
+            y: { $literal: 'y'.repeat(docSize - offsetForTheRemainderOfDoc) }
+        };
         addTestCase({
             name: fullName,
             tags: ["query", "getmore"],
-            // This generates documents to be inserted into the collection, resulting in 'nDocs'
-            // documents with three fields: _id, x, and y. The exact size of each document is
-            // 'docSize' bytes.
             nDocs: nDocs,
-            docs: function(i) {
-                const offsetForTheRemainderOfDoc = 37;
-                return { _id: i, x: i + 1, y: 'y'.repeat(docSize - offsetForTheRemainderOfDoc) };
-            },
+            docs: docs,
+            datasetSpec: {docSize: docSize, offsetForTheRemainderOfDoc: offsetForTheRemainderOfDoc},
             op: op
         });
     }
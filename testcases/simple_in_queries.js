@@ -29,6 +29,7 @@ if (typeof(tests) !== "object") {
                 docs: function (i) {
                     return {x: i.toString()};
                 },
+                datasetSpec: {},
                 op: {
                     op: "find",
                     query: {x: {$in: inArray}},
@@ -133,6 +134,7 @@ if (typeof(tests) !== "object") {
             docs: function (i) {
                 return {x: 2 * Random.randInt(largeInArray.length)};
             },
+            datasetSpec: {largeInArrayLength: largeInArray.length},
             op: {
                 op: "find",
                 query: {x: {$in: largeInArray}}
@@ -149,6 +151,7 @@ if (typeof(tests) !== "object") {
             docs: function (i) {
                 return {x: 2 * Random.randInt(largeInArray.length * 10)};
             },
+            datasetSpec: {largeInArrayLength: largeInArray.length},
             op: {
                 op: "find",
                 query: {x: {$in: largeInArray}}
@@ -164,6 +167,7 @@ if (typeof(tests) !== "object") {
             docs: function (i) {
                 return {x: 2 * Random.randInt(largeInArray.length * 10)};
             },
+            datasetSpec: {largeInArrayLength: largeInArray.length},
             op: {
                 op: "find",
                 query: {x: {$in: largeInArray}}
@@ -219,6 +223,7 @@ if (typeof(tests) !== "object") {
                 docs: function (i) {
                     return {x: 2 * Random.randInt(largeInArray.length) + 1};
                 },
+                datasetSpec: {largeInArrayLength: largeInArray.length},
                 op: {
                     op: "find",
                     query: {x: {$in: largeInArray}}
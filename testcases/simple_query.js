@@ -21,6 +21,7 @@ if (typeof(tests) !== "object") {
         docs: function(i) {
             return {};
         },
+        datasetSpec: {},
         op: {op: "find", query: {}}
     });
 
@@ -52,6 +53,7 @@ if (typeof(tests) !== "object") {
         docs: function(i) {
             return {};
         },
+        datasetSpec: {},
         op: {op: "find", query: {nonexistent: 5}}
     });
 
@@ -68,6 +70,7 @@ if (typeof(tests) !== "object") {
         docs: function(i) {
             return {_id: i};
         },
+        datasetSpec: {},
         op: {op: "findOne", query: {_id: {"#RAND_INT_PLUS_THREAD": [0, 100]}}}
     });
 
@@ -84,6 +87,7 @@ if (typeof(tests) !== "object") {
         docs: function(i) {
             return {x: i};
         },
+        datasetSpec: {},
         indexes: [{x: 1}],
         op: {op: "findOne", query: {x: {"#RAND_INT_PLUS_THREAD": [0, 100]}}}
     });
@@ -101,6 +105,7 @@ if (typeof(tests) !== "object") {
         docs: function(i) {
             return {_id: i};
         },
+        datasetSpec: {},
         op: {op: "find", query: {_id: {$gt: 50, $lt: 100}}}
     });
 
@@ -117,6 +122,7 @@ if (typeof(tests) !== "object") {
         docs: function(i) {
             return {x: i};
         },
+        datasetSpec: {},
         indexes: [{x: 1}],
         op: {op: "find", query: {x: {$gt: 50, $lt: 100}}}
     });
@@ -134,6 +140,7 @@ if (typeof(tests) !== "object") {
         docs: function(i) {
             return {x: i.toString()};
         },
+        datasetSpec: {},
         indexes: [{x: 1}],
         op: {op: "find", query: {x: /^2400/}}
     });
@@ -151,6 +158,7 @@ if (typeof(tests) !== "object") {
         docs: function(i) {
             return {x: i, y: 2 * i};
         },
+        datasetSpec: {},
         indexes: [{x: 1}, {y: 1}],
         op: {
             op: "find",
@@ -184,6 +192,7 @@ if (typeof(tests) !== "object") {
             var j = i + (1 * 1000 * 1000 * 1000);
             return {x: j.toString()};
         },
+        datasetSpec: {},
         indexes: [{x: 1}],
         op: {op: "find", query: {x: {$gte: "1000002400", $lt: "1000002404"}}}
     });
@@ -205,6 +214,7 @@ if (typeof(tests) !== "object") {
             var j = i + (1 * 1000 * 1000 * 1000);
             return {x: j.toString()};
         },
+        datasetSpec: {},
         indexes: [{x: 1}],
         op: {op: "find", query: {x: {$gte: "1000002400", $lt: "1000002404"}}}
     });
@@ -225,6 +235,7 @@ if (typeof(tests) !== "object") {
         docs: function(i) {
             return {x: i};
         },
+        datasetSpec: {},
         indexes: [{x: 1}],
         op: {
             op: "find",
@@ -247,6 +258,7 @@ if (typeof(tests) !== "object") {
         docs: function(i) {
             return {x: i};
         },
+        datasetSpec: {},
         indexes: [{x: 1}],
         op: {
             op: "find",
@@ -269,6 +281,7 @@ if (typeof(tests) !== "object") {
         docs: function(i) {
             return {x: i};
         },
+        datasetSpec: {},
         indexes: [{x: 1}],
         op: {op: "find", query: {x: {$gte: 0}}, filter: {x: 1, _id: 0}}
     });
@@ -286,6 +299,7 @@ if (typeof(tests) !== "object") {
         docs: function(i) {
             return {x: i};
         },
+        datasetSpec: {},
         indexes: [{x: 1}],
         op: {op: "find", query: {}, filter: {x: 1}}
     });
@@ -330,6 +344,7 @@ if (typeof(tests) !== "object") {
                 z: 1
             };
         },
+        datasetSpec: {},
         op: {op: "find", query: {}, filter: {x: 1}}
     });
 
@@ -348,6 +363,7 @@ if (typeof(tests) !== "object") {
         docs: function(i) {
             return {x: i, y: i, z: i};
         },
+        datasetSpec: {},
         indexes: [{x: 1, y: 1, z: 1}],
         op: {
             op: "find",
@@ -409,6 +425,7 @@ if (typeof(tests) !== "object") {
         docs: function(i) {
             return {x: {y: i}};
         },
+        datasetSpec: {},
         op: {op: "find", query: {}, filter: {"x.y": 1, _id: 0}}
     });
 
@@ -535,6 +552,7 @@ if (typeof(tests) !== "object") {
         docs: function(i) {
             return {x: {y: i}};
         },
+        datasetSpec: {},
         indexes: [{"x.y": 1}],
         op: {
             op: "find",
@@ -559,6 +577,7 @@ if (typeof(tests) !== "object") {
             }
             return {a: 1, b: i, c: i, giantField: arr};
         },
+        datasetSpec: {},
         indexes: [],
         op: {
             op: "find",
@@ -583,6 +602,7 @@ if (typeof(tests) !== "object") {
         docs: function(i) {
             return {x: bigString};
         },
+        datasetSpec: {bigStringLength: bigString.length},
         op: {op: "find", query: {}}
     });
 
@@ -27,6 +27,7 @@ if (typeof(tests) !== "object") {
             }
             return {x: arrayRandom};
         },
+        datasetSpec: {},
         op: {op: "find", query: {}, sort: {x: 1}}
     });
 
@@ -50,6 +51,7 @@ if (typeof(tests) !== "object") {
             }
             return {arr: arrayRandom};
         },
+        datasetSpec: {},
         op: {op: "find", query: {}, sort: {"arr.x": 1}}
     });
 
@@ -68,6 +70,7 @@ if (typeof(tests) !== "object") {
         docs: function (i) {
             return {x: Random.randInt(10000)};
         },
+        datasetSpec: {},
         indexes: [{x: 1}],
         op: {op: "find", query: {}, sort: {x: 1}, filter: {x: 1, _id: 0}}
     });
@@ -88,6 +91,7 @@ if (typeof(tests) !== "object") {
         docs: function (i) {
             return {x: Random.randInt(10000), y: Random.randInt(10000)};
         },
+        datasetSpec: {},
         indexes: [{x: 1, y: 1}],
         op: {
             op: "find",
@@ -111,6 +115,7 @@ if (typeof(tests) !== "object") {
         docs: function (i) {
             return {x: Random.randInt(10000), y: Random.randInt(10000)};
         },
+        datasetSpec: {},
         indexes: [{y: 1}],
         op: {
             op: "find",
@@ -135,6 +140,7 @@ if (typeof(tests) !== "object") {
         docs: function (i) {
             return {a: Random.randInt(5), b: Random.randInt(5), c: Random.randInt(10000)};
         },
+        datasetSpec: {},
         indexes: [{a: 1, b: 1, c: 1}],
         op: {
             op: "find",
@@ -159,6 +165,7 @@ if (typeof(tests) !== "object") {
         docs: function (i) {
             return {x: Random.randInt(10), y: Random.randInt(5)};
         },
+        datasetSpec: {},
         indexes: [{x: 1}],
         op: {
             op: "find",
@@ -186,6 +193,7 @@ if (typeof(tests) !== "object") {
         docs: function (i) {
             return {a: Random.randInt(5), b: Random.randInt(5), c: Random.randInt(10000)};
         },
+        datasetSpec: {},
         indexes: [{a: 1, b: 1, c: 1}, {b: 1, c: 1}],
         op: {
             op: "find",
@@ -212,6 +220,7 @@ if (typeof(tests) !== "object") {
         docs: function (i) {
             return {a: Random.randInt(30), b: Random.randInt(10000)};
         },
+        datasetSpec: {},
         indexes: [{a: 1, b: 1}],
         op: {
             op: "find",
@@ -248,6 +257,7 @@ if (typeof(tests) !== "object") {
                             k: {x: Random.randInt(10000), y: Random.randInt(10000)}
                         };
                     },
+                    datasetSpec: {},
                     op: {
                         op: "find",
                         sort: sortKey[0]
@@ -278,6 +288,7 @@ if (typeof(tests) !== "object") {
         docs: function (i) {
             return {x: Random.randInt(10000), y: Random.randInt(10000)};
         },
+        datasetSpec: {},
         indexes: [{x: 1, y: 1}],
         op: {
             op: "find",
@@ -0,0 +1,326 @@
+"""A Python driver running the mongo-perf tests with PyMongo instead of the mongo shell's benchRun()
+
+The test cases are written in JavaScript, with 'pre' functions that only the mongo shell can run.
+The driver runs the JSON config files traced from them by benchrun.py
+--generateMongoeBenchConfigFiles (see CommandTracer in util/utils.js) instead: the commands run by
+the 'pre' (and 'post') functions of a test, and its benchRun() ops with the #B_ namespaces already
+resolved. With --driver python, the tracer also records the name and tags of every test, so that
+--includeFilter and --excludeFilter select them as with the shell.
+
+The trials of every test and thread count are run as by mongoPerfRunTests() in util/utils.js: the
+commands of the test are run, then its ops in a loop by every thread, for the duration of the
+trial (see worker.py). The results have the same schema as those reported by the mongo shell.
+"""
+
+import datetime
+import glob
+import math
+import os
+import re
+
+import pymongo
+from bson import Int64, json_util
+from pymongo.errors import OperationFailure
+
+from .worker import WorkerError, WorkerPool
+
+# The codes of the errors of the commands that are ignored when setting up a test, as the mongo
+# shell helpers do (e.g. dropping a collection that does not exist).
+IGNORED_SETUP_ERRORS = {
+    'drop': (26,),          # NamespaceNotFound
+    'dropDatabase': (26,),
+    'dropIndexes': (26, 27)  # NamespaceNotFound, IndexNotFound
+}
+
+
+class ConfigError(Exception):
+    """ Raised when a JSON config file cannot be run by the driver
+    """
+
+
+def load_tests(directory):
+    """ Returns the tests of the JSON config files of a directory, as {name, tags, pre, ops}
+    documents.
+
+    Config files traced without the test names and tags are named after their file name, and have
+    no tags.
+    """
+    tests = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.json'))):
+        with open(path) as config_file:
+            try:
+                config = json_util.loads(config_file.read())
+            except ValueError as error:
+                raise ConfigError('%s is not a valid config file: %s' % (path, error))
+        if 'ops' not in config:
+            raise ConfigError('%s has no ops' % path)
+        tests.append({'name': config.get('name', os.path.splitext(os.path.basename(path))[0]),
+                      'tags': config.get('tags', []),
+                      'pre': config.get('pre', []),
+                      'ops': config['ops']})
+    return tests
+
+
+def _matches(test, filters):
+    """ Whether any of filters (tags, or regular expressions of names) matches test """
+    return any(name in test['tags'] or
+               re.match('^(?:%s)$' % name, test['name']) is not None
+               for name in filters)
+
+
+def is_selected(test, include_filter, exclude_filter):
+    """ Returns whether test is selected by the filters of benchrun.py, see doExecute() in
+    util/utils.js.
+
+    :param include_filter: '%' for all the tests, a list of filters or a list of lists of filters
+    that must all match
+    :param exclude_filter: a list of lists of filters, the tests matched by all the filters of one
+    of them are excluded
+    """
+    if include_filter != '%':
+        clauses = include_filter
+        if not clauses or not isinstance(clauses[0], list):
+            clauses = [clauses]
+        if not all(_matches(test, clause) for clause in clauses):
+            return False
+    for clause in exclude_filter or []:
+        if all(_matches(test, [name]) for name in clause):
+            return False
+    return True
+
+
+def _version(version):
+    return [int(part) if part.isdigit() else 0 for part in version.split('-')[0].split('.')]
+
+
+def is_version_excluded(test, server_version):
+    """ Returns whether the >=N.M tags of test exclude it on server_version, see
+    doVersionExclude() in util/utils.js.
+    """
+    if server_version == '0.0.0':
+        # unversioned binary
+        return False
+    for tag in test['tags']:
+        if tag.startswith('>='):
+            minimum = _version(tag[2:])
+            if _version(server_version)[:len(minimum)] < minimum:
+                print("Skipping test %s. Server does not meet minimum required version: %s < %s"
+                      % (test['name'], server_version, tag[2:]))
+                return True
+    return False
+
+
+def _now():
+    """ Returns the current date as the mongo shell prints it in JSON """
+    return datetime.datetime.utcnow().isoformat(timespec='milliseconds') + 'Z'
+
+
+def run_setup(client, test):
+    """ Runs the commands that set up the collections of a test """
+    for command in test['pre']:
+        try:
+            client[command['ns']].command(command['command'])
+        except OperationFailure as error:
+            name = next(iter(command['command']))
+            if error.code not in IGNORED_SETUP_ERRORS.get(name, ()):
+                raise
+
+
+def _mean(values):
+    return sum(values) / float(len(values)) if values else None
+
+
+def _median(values):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    middle = len(ordered) // 2
+    if len(ordered) % 2 == 0:
+        return (ordered[middle - 1] + ordered[middle]) / 2.0
+    return ordered[middle]
+
+
+def _stdev(values, mean):
+    if not values:
+        return None
+    return math.sqrt(sum((value - mean) ** 2 for value in values) / len(values))
+
+
+# Two-sided 95% quantiles of Student's t-distribution, by degrees of freedom (1 to 30).
+T_DISTRIBUTION_95 = [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+                     2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+                     2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042]
+
+
+def relative_ci(values):
+    """ Returns the half-width of the 95% confidence interval of the mean of values, relative to
+    the mean, see getRelativeCI() in util/utils.js.
+    """
+    if len(values) < 2:
+        return None
+    mean = _mean(values)
+    if mean == 0:
+        return None
+    sample_stdev = math.sqrt(sum((value - mean) ** 2 for value in values) / (len(values) - 1))
+    degrees = len(values) - 1
+    t = T_DISTRIBUTION_95[degrees - 1] if degrees <= len(T_DISTRIBUTION_95) else 1.96
+    return t * sample_stdev / math.sqrt(len(values)) / mean
+
+
+def has_enough_trials(results, trials, options):
+    """ Whether enough trials of a thread count were run, see hasEnoughTrials() in util/utils.js
+    """
+    max_trials = options['trials']
+    if options.get('target_ci'):
+        max_trials = max(options['trials'], options['max_trials'])
+    if trials >= max_trials:
+        return True
+    if options.get('target_ci') and trials >= max(options['trials'], 2):
+        ci = relative_ci([result['ops_per_sec'] for result in results if result is not None])
+        return ci is not None and ci <= options['target_ci']
+    return False
+
+
+def summarize_trials(results, trials, options):
+    """ Returns the results of the trials of a thread count, see summarizeTrials() in
+    util/utils.js.
+    """
+    values = [result['ops_per_sec'] if result else None for result in results]
+    succeeded = [value for value in values if value is not None]
+    summary = {
+        'ops_per_sec_values': values,
+        'error_values': [result['error_count'] if result else None for result in results],
+        'trial_positions': [result['position'] if result else None for result in results],
+        'ops_per_sec': _mean(succeeded),
+        'ops_per_sec_median': _median(succeeded)
+    }
+    summary['ops_per_sec_stdev'] = _stdev(succeeded, summary['ops_per_sec'])
+    if options.get('latency'):
+        # The histograms of the trials are merged by benchrun.py.
+        summary['latency_values'] = [result['latency'] if result else None
+                                     for result in results]
+    if options.get('target_ci'):
+        summary['trials'] = trials
+        summary['ops_per_sec_ci'] = relative_ci(succeeded)
+    return summary
+
+
+class Driver(object):
+    """ Runs the tests of the JSON config files with PyMongo.
+
+    :param client_options: the options of the MongoClient of the driver and of its workers
+    :param processes: the number of worker processes running the threads of the trials
+    :param options: the options of the run: trials, seconds, latency, target_ci, max_trials and
+    write_concern (the {w, j} write concern of the write ops, instead of the traced one)
+    """
+
+    def __init__(self, client_options, processes, options):
+        self.client = pymongo.MongoClient(**client_options)
+        self.pool = WorkerPool(processes, client_options)
+        self.options = options
+        self.position = 0
+        self.errors = []
+
+    def close(self):
+        self.pool.close()
+        self.client.close()
+
+    def run_trial(self, test, threads, trial):
+        """ Returns the result of a trial of a test, or None if it failed """
+        position = self.position
+        self.position += 1
+        try:
+            run_setup(self.client, test)
+            self.client.admin.command('fsync')
+            stats = self.pool.run(test['ops'], threads, self.options['seconds'],
+                                  self.options.get('latency'), self.options.get('write_concern'),
+                                  seed=position)
+        except (pymongo.errors.PyMongoError, WorkerError) as error:
+            print("Error running test %s: %s" % (test['name'], error))
+            self.errors.append({'test': {'name': test['name'], 'tags': test['tags']},
+                                'trial': trial, 'threadCount': threads,
+                                'error': {'message': str(error),
+                                          'code': getattr(error, 'code', None)}})
+            return None
+        ops_per_sec = stats['ops'] / stats['seconds'] if stats['seconds'] else 0.0
+        error_string = ""
+        if stats['errors']:
+            error_string = "There were errors: %d (%s)" % (stats['errors'],
+                                                           stats['error_messages'][0])
+        print("\t%d\t%s\t%s" % (threads, ops_per_sec, error_string))
+        result = {'ops_per_sec': ops_per_sec, 'error_count': stats['errors'],
+                  'position': position}
+        if self.options.get('latency'):
+            result['latency'] = stats['latency']
+        return result
+
+    def run_test(self, test, thread_counts, variant=""):
+        """ Returns the results of a test with every thread count, see executeOneTest() in
+        util/utils.js.
+        """
+        print(test['name'] + ("" if variant == "" else ", variant %s" % variant))
+        thread_results = {'start': _now()}
+        for threads in thread_counts:
+            results = []
+            trials = 0
+            while not has_enough_trials(results, trials, self.options):
+                results.append(self.run_trial(test, threads, trials))
+                trials += 1
+            thread_results[str(threads)] = summarize_trials(results, trials, self.options)
+        thread_results['end'] = _now()
+        return thread_results
+
+    def get_testbed(self, crud_options):
+        """ Returns the basic testbed fields of the results, see runTests() in util/utils.js """
+        build_info = self.client.admin.command('buildInfo')
+        if build_info.get('sysInfo'):
+            platform = build_info['sysInfo'].split(' ')[0]
+        elif build_info.get('buildEnvironment', {}).get('target_os'):
+            platform = build_info['buildEnvironment']['target_os']
+        else:
+            platform = "Unknown Platform"
+        return {'commit': build_info.get('gitVersion'), 'platform': platform,
+                'version': build_info.get('version'), 'crudOptions': crud_options}
+
+
+def run_tests(tests, thread_counts, client_options, processes, options, include_filter='%',
+              exclude_filter=None, variant_name=None, variants=None, crud_options=None,
+              exclude_testbed=False):
+    """ Runs the selected tests with every thread count, see mongoPerfRunTests() in
+    util/utils.js.
+
+    Yields ('result', record) for every test (and variant) as soon as it is done, and a
+    ('summary', document) tuple with the run-level fields of the run at the end.
+    """
+    driver = Driver(client_options, processes, options)
+    admin = driver.client.admin
+    old_value = None
+    if variant_name is not None:
+        old_value = admin.command({'getParameter': 1, variant_name: 1})[variant_name]
+    try:
+        summary = {}
+        if not exclude_testbed:
+            summary['basicFields'] = driver.get_testbed(crud_options)
+        summary['storageEngine'] = admin.command('serverStatus')['storageEngine']['name']
+        server_version = admin.command('buildInfo')['version']
+
+        summary['start'] = _now()
+        for test in tests:
+            if (not is_selected(test, include_filter, exclude_filter) or
+                    is_version_excluded(test, server_version)):
+                continue
+            if variant_name is None:
+                yield 'result', {'name': test['name'],
+                                 'results': driver.run_test(test, thread_counts)}
+                continue
+            for variant in variants:
+                admin.command({'setParameter': 1, variant_name: Int64(variant)})
+                yield 'result', {'name': test['name'], 'variant': variant,
+                                 'results': driver.run_test(test, thread_counts, variant)}
+        summary['end'] = _now()
+        summary['errors'] = driver.errors
+        yield 'summary', summary
+    finally:
+        if variant_name is not None:
+            admin.command({'setParameter': 1, variant_name: Int64(old_value)})
+        driver.close()
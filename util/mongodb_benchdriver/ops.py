@@ -0,0 +1,177 @@
+"""Execution of the benchRun ops with PyMongo
+
+Every op is bound once to its collection (or database, for commands) and write concern by
+bind_op(), which returns a function running the op for a thread and returning its type, as counted
+by benchRun(): 'insert', 'query', 'update', 'delete' or 'command', or None for the ops that are not
+counted ('let' and 'nop').
+
+The ops behave as with benchRun() and read/write commands: 'find' reads all the documents of its
+cursor, 'update' and 'remove' only change one document unless 'multi' is set.
+
+The fields with templates are compiled once too, and filled in place for every op (see
+TemplateFiller): the values of the fields are reused by the next op of the thread.
+"""
+
+from pymongo import WriteConcern
+
+from .templates import CompiledTemplate, has_templates
+
+
+class UnknownOpError(Exception):
+    """ Raised when an op type is not supported
+    """
+
+
+def _field(op, name, default=None, copy=False):
+    """ Returns a function returning the value of a field of op for a thread, filled with new
+    template values if it has any. With copy, every thread gets its own copy of the value.
+    """
+    value = op.get(name, default)
+    if has_templates(value) or copy:
+        template = CompiledTemplate(value)
+        return lambda context: context.fill(template)
+    return lambda context: value
+
+
+def get_write_concern(op, write_concern=None):
+    """ Returns the write concern of op, or write_concern ({w, j}) if set """
+    write_concern = write_concern if write_concern is not None else op.get('writeConcern') or {}
+    options = {}
+    if 'w' in write_concern:
+        options['w'] = write_concern['w']
+    if 'j' in write_concern:
+        j = write_concern['j']
+        options['j'] = j.lower() == 'true' if isinstance(j, str) else bool(j)
+    return WriteConcern(**options)
+
+
+def _sort(sort):
+    return list(sort.items()) if sort else None
+
+
+def _bind_insert(collection, op):
+    # The driver adds an _id to the inserted documents, which are reused by the next insert of
+    # the thread: the _ids it added are removed once the documents are sent.
+    doc = _field(op, 'doc', {}, copy=True)
+
+    def insert(context):
+        value = doc(context)
+        documents = value if isinstance(value, list) else [value]
+        generated_ids = [document for document in documents if '_id' not in document]
+        try:
+            if isinstance(value, list):
+                collection.insert_many(value, ordered=op.get('ordered', True))
+            else:
+                collection.insert_one(value)
+        finally:
+            for document in generated_ids:
+                document.pop('_id', None)
+        return 'insert'
+    return insert
+
+
+def _bind_find(collection, op):
+    query = _field(op, 'query', {})
+
+    def find(context):
+        cursor = collection.find(query(context), op.get('filter'), skip=op.get('skip', 0),
+                                 limit=op.get('limit', 0), sort=_sort(op.get('sort')),
+                                 batch_size=op.get('batchSize', 0), collation=op.get('collation'))
+        for _ in cursor:
+            pass
+        return 'query'
+    return find
+
+
+def _bind_find_one(collection, op):
+    query = _field(op, 'query', {})
+
+    def find_one(context):
+        collection.find_one(query(context), op.get('filter'), sort=_sort(op.get('sort')),
+                            collation=op.get('collation'))
+        return 'query'
+    return find_one
+
+
+def _bind_update(collection, op):
+    query = _field(op, 'query', {})
+    update = _field(op, 'update', {})
+    upsert = bool(op.get('upsert', False))
+    multi = bool(op.get('multi', False))
+
+    def run_update(context):
+        # The query is filled first, as with benchRun(), for the #SEQ_INT counters they share.
+        selector = query(context)
+        value = update(context)
+        options = {'upsert': upsert, 'collation': op.get('collation')}
+        if isinstance(value, dict) and not any(field.startswith('$') for field in value):
+            collection.replace_one(selector, value, **options)
+        elif multi:
+            collection.update_many(selector, value, array_filters=op.get('arrayFilters'), **options)
+        else:
+            collection.update_one(selector, value, array_filters=op.get('arrayFilters'), **options)
+        return 'update'
+    return run_update
+
+
+def _bind_remove(collection, op):
+    query = _field(op, 'query', {})
+    multi = bool(op.get('multi', False))
+
+    def remove(context):
+        if multi:
+            collection.delete_many(query(context), collation=op.get('collation'))
+        else:
+            collection.delete_one(query(context), collation=op.get('collation'))
+        return 'delete'
+    return remove
+
+
+def _bind_command(database, op):
+    command = _field(op, 'command')
+
+    def run_command(context):
+        database.command(command(context))
+        return 'command'
+    return run_command
+
+
+def _bind_let(op):
+    value = _field(op, 'value')
+    target = op['target']
+
+    def let(context):
+        context.variables[target] = value(context)
+    return let
+
+
+BINDERS = {
+    'insert': _bind_insert,
+    'find': _bind_find,
+    'query': _bind_find,
+    'findOne': _bind_find_one,
+    'update': _bind_update,
+    'remove': _bind_remove,
+    'delete': _bind_remove
+}
+
+
+def bind_op(client, op, write_concern=None):
+    """ Returns the function running op for a thread, with client.
+
+    :param write_concern: the {w, j} write concern of the write ops, instead of the one traced
+    with the op
+    """
+    op_type = op['op']
+    if op_type == 'nop':
+        return lambda context: None
+    if op_type == 'let':
+        return _bind_let(op)
+    if op_type == 'command':
+        return _bind_command(client.get_database(op['ns']), op)
+    if op_type not in BINDERS:
+        raise UnknownOpError('Unknown op %s' % op_type)
+    db_name, collection_name = op['ns'].split('.', 1)
+    collection = client[db_name].get_collection(
+        collection_name, write_concern=get_write_concern(op, write_concern))
+    return BINDERS[op_type](collection, op)
@@ -0,0 +1,231 @@
+"""Expansion of the benchRun templates of the ops, e.g. {"#RAND_INT": [0, 100]}
+
+A template is a document with a single field whose name starts with '#'. It is replaced by a new
+value every time the op is run, as the mongo shell's benchRun() does:
+
+    #RAND_INT: [min, max(, multiplier)]
+        a random integer in [min, max), times multiplier if any
+    #RAND_INT_PLUS_THREAD: [min, max(, multiplier)]
+        the same, plus thread * (max - min) so that every thread gets its own range
+    #RAND_STRING: [length]
+        a random alphanumeric string
+    #SEQ_INT: {seq_id, start, step(, mod)(, mult)(, unique)}
+        start + counter * step (modulo mod, then times mult, if any), counting per thread and
+        seq_id. With unique, the counters of the threads are interleaved so that no two threads
+        get the same value.
+    #CUR_DATE: offset
+        the current date, plus offset milliseconds
+    #OID: any
+        a new ObjectId
+    #VARIABLE: name
+        the value of the variable set by the last 'let' op of the thread
+
+Expanding the templates of every op in Python is the hot loop of the driver, so the fields of the
+ops are compiled once into a CompiledTemplate: a plan of the slots of their templates. Every thread
+then fills its own skeleton of the field (see TemplateFiller), with the random values of the next
+BATCH_SIZE ops generated at once with numpy. The dates, ObjectIds and variables depend on when the
+op is run, and the #SEQ_INT counters are shared by all the fields of the ops of a thread, so these
+are still generated for every op, in the order the ops are run.
+"""
+
+import datetime
+import string
+
+import numpy as np
+from bson import ObjectId
+
+RANDOM_STRING_CHARACTERS = string.ascii_uppercase + string.ascii_lowercase + string.digits
+_RANDOM_STRING_BYTES = np.frombuffer(RANDOM_STRING_CHARACTERS.encode('ascii'), dtype=np.uint8)
+# Number of ops whose template values are generated at once by a TemplateFiller.
+BATCH_SIZE = 1024
+
+
+class UnknownTemplateError(Exception):
+    """ Raised when an op uses a template that is not supported
+    """
+
+
+class ThreadContext(object):
+    """ The state of the templates of a benchRun thread: its number (from 0) out of threads, its
+    random generator, the variables set by the 'let' ops, the #SEQ_INT counters and the fillers
+    of the compiled templates.
+    """
+
+    def __init__(self, thread, threads, seed=0):
+        self.thread = thread
+        self.threads = threads
+        self.generator = np.random.default_rng([seed, thread])
+        self.variables = {}
+        self.sequences = {}
+        self.fillers = {}
+
+    def fill(self, template):
+        """ Returns the value of template for the next op of the thread, see TemplateFiller """
+        filler = self.fillers.get(template)
+        if filler is None:
+            filler = self.fillers[template] = TemplateFiller(template, self)
+        return filler.next()
+
+
+def _seq_int(args, context):
+    seq_id = args.get('seq_id', 0)
+    counter = context.sequences.get(seq_id, 0)
+    context.sequences[seq_id] = counter + 1
+    if args.get('unique'):
+        counter = counter * context.threads + context.thread
+    value = args.get('start', 0) + counter * args.get('step', 1)
+    if 'mod' in args:
+        value %= args['mod']
+    if 'mult' in args:
+        value *= args['mult']
+    return value
+
+
+def _cur_date(args, context):
+    return datetime.datetime.utcnow() + datetime.timedelta(milliseconds=args or 0)
+
+
+def _oid(args, context):
+    return ObjectId()
+
+
+def _variable(args, context):
+    return context.variables[args]
+
+
+# The templates whose values are generated for every op, from (args, context).
+TEMPLATES = {
+    '#SEQ_INT': _seq_int,
+    '#CUR_DATE': _cur_date,
+    '#OID': _oid,
+    '#VARIABLE': _variable
+}
+
+
+def _rand_int_batch(args, context, count):
+    low, high = int(args[0]), int(args[1])
+    values = context.generator.integers(low, low + max(high - low, 1), size=count)
+    if len(args) > 2:
+        values *= int(args[2])
+    return values
+
+
+def _rand_int_plus_thread_batch(args, context, count):
+    return _rand_int_batch(args, context, count) + context.thread * (int(args[1]) - int(args[0]))
+
+
+def _rand_string_batch(args, context, count):
+    length = int(args[0])
+    indexes = context.generator.integers(len(_RANDOM_STRING_BYTES), size=(count, length))
+    characters = _RANDOM_STRING_BYTES[indexes].tobytes().decode('ascii')
+    return [characters[start:start + length] for start in range(0, count * length, length)]
+
+
+# The templates whose values are generated in batches, from (args, context, count).
+BATCH_TEMPLATES = {
+    '#RAND_INT': _rand_int_batch,
+    '#RAND_INT_PLUS_THREAD': _rand_int_plus_thread_batch,
+    '#RAND_STRING': _rand_string_batch
+}
+
+
+def get_template(value):
+    """ Returns the name and arguments of value if it is a template, or None """
+    if isinstance(value, dict) and len(value) == 1:
+        name = next(iter(value))
+        if name.startswith('#'):
+            if name not in TEMPLATES and name not in BATCH_TEMPLATES:
+                raise UnknownTemplateError('Unknown template %s' % name)
+            return name, value[name]
+    return None
+
+
+def has_templates(value):
+    """ Returns whether value holds templates """
+    if get_template(value) is not None:
+        return True
+    if isinstance(value, dict):
+        return any(has_templates(item) for item in value.values())
+    if isinstance(value, list):
+        return any(has_templates(item) for item in value)
+    return False
+
+
+def _skeleton(value):
+    """ Returns a copy of value with its templates replaced by None """
+    if get_template(value) is not None:
+        return None
+    if isinstance(value, dict):
+        return dict((field, _skeleton(item)) for field, item in value.items())
+    if isinstance(value, list):
+        return [_skeleton(item) for item in value]
+    return value
+
+
+class CompiledTemplate(object):
+    """ The plan of the templates of a value: the path, name and arguments of every template """
+
+    def __init__(self, value):
+        self.value = value
+        self.slots = []
+        self._plan(value, ())
+
+    def _plan(self, value, path):
+        template = get_template(value)
+        if template is not None:
+            self.slots.append((path,) + template)
+        elif isinstance(value, dict):
+            for field, item in value.items():
+                self._plan(item, path + (field,))
+        elif isinstance(value, list):
+            for index, item in enumerate(value):
+                self._plan(item, path + (index,))
+
+
+class TemplateFiller(object):
+    """ Fills the skeleton of a compiled template for the ops of a thread.
+
+    The skeleton is allocated once and the slots of its templates are set in place for every op,
+    from values generated for batch_size ops at a time: the value returned by next() is only valid
+    until the next call.
+    """
+
+    def __init__(self, template, context, batch_size=BATCH_SIZE):
+        self.template = template
+        self.context = context
+        self.batch_size = batch_size
+        self._root = [_skeleton(template.value)]
+        self._batched = []
+        self._unbatched = []
+        for path, name, args in template.slots:
+            container, key = self._root, 0
+            for step in path:
+                container, key = container[key], step
+            if name in BATCH_TEMPLATES:
+                self._batched.append((container, key, name, args))
+            else:
+                self._unbatched.append((container, key, TEMPLATES[name], args))
+        self._values = []
+        self._position = batch_size
+
+    def _generate(self):
+        """ Generates the values of the batched slots of the next batch_size ops """
+        values = []
+        for _, _, name, args in self._batched:
+            batch = BATCH_TEMPLATES[name](args, self.context, self.batch_size)
+            # BSON only encodes Python numbers
+            values.append(batch.tolist() if isinstance(batch, np.ndarray) else batch)
+        self._values = values
+        self._position = 0
+
+    def next(self):
+        """ Returns the skeleton, filled with the template values of the next op """
+        if self._position == self.batch_size:
+            self._generate()
+        position = self._position
+        self._position += 1
+        for (container, key, _, _), values in zip(self._batched, self._values):
+            container[key] = values[position]
+        for container, key, generate, args in self._unbatched:
+            container[key] = generate(args, self.context)
+        return self._root[0]
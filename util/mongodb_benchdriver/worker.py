@@ -0,0 +1,217 @@
+"""The processes running the benchRun threads of the Python driver
+
+Python threads share one interpreter lock, so the threads of a trial are spread over a pool of
+worker processes, each with its own MongoClient (and connection pool). The workers are started
+once and run all the trials: for every trial, each worker starts its share of the threads, which
+connect to the server, and reports when they are ready; the trial then starts at the same time in
+all the workers.
+"""
+
+import multiprocessing
+import threading
+import time
+import traceback
+
+import pymongo
+from pymongo.errors import PyMongoError
+
+from mongodb_perfstats import merge_histograms, new_histogram, record_latency
+
+from .ops import bind_op
+from .templates import ThreadContext
+
+# Seconds between the start signal of a trial and its start, so that all the workers get it.
+START_DELAY = 0.1
+# Maximum number of error messages reported per trial.
+MAX_ERROR_MESSAGES = 10
+
+
+class WorkerError(Exception):
+    """ Raised when a worker process fails to run a trial
+    """
+
+
+def _run_thread(bound_ops, context, ready, start, seconds, latency, client, stats):
+    """ Runs the ops of a thread in a loop for seconds once the start event is set, counting the
+    ops of every type and, with latency, recording their latency (in microseconds).
+    """
+    try:
+        # Open the connection of the thread before the trial starts.
+        client.admin.command('ping')
+        ready.wait()
+        start.wait()
+        begin = stats['start']
+        if begin is None:
+            # the trial was aborted
+            return
+        time.sleep(max(0, begin - time.time()))
+        end = time.perf_counter() + seconds - max(0, time.time() - begin)
+        counts = stats['counts']
+        histograms = stats['latency']
+        while time.perf_counter() < end:
+            for execute in bound_ops:
+                op_start = time.perf_counter()
+                try:
+                    op_type = execute(context)
+                except PyMongoError as error:
+                    stats['errors'] += 1
+                    if len(stats['error_messages']) < MAX_ERROR_MESSAGES:
+                        stats['error_messages'].append(str(error))
+                    continue
+                if op_type is None:
+                    continue
+                counts[op_type] = counts.get(op_type, 0) + 1
+                if latency:
+                    if op_type not in histograms:
+                        histograms[op_type] = new_histogram()
+                    record_latency(histograms[op_type],
+                                   (time.perf_counter() - op_start) * 1000000)
+        stats['elapsed'] = time.time() - begin
+    except threading.BrokenBarrierError:
+        # another thread failed to connect
+        pass
+    except Exception:
+        stats['failure'] = traceback.format_exc()
+        ready.abort()
+
+
+def run_threads(client, connection, ops, threads, thread_ids, seconds, latency=False,
+                write_concern=None, seed=0):
+    """ Runs the ops with the given threads (numbers out of threads), in this process.
+
+    Reports ('ready', None) on connection once the threads are connected, waits for the start
+    time of the trial (or None if it is aborted), and returns the statistics of the threads.
+    Raises WorkerError, without reporting ready, if a thread fails to connect.
+    """
+    bound_ops = [bind_op(client, op, write_concern) for op in ops]
+    ready = threading.Barrier(len(thread_ids) + 1)
+    start = threading.Event()
+    stats = []
+    workers = []
+    for thread in thread_ids:
+        thread_stats = {'counts': {}, 'errors': 0, 'error_messages': [], 'latency': {},
+                        'elapsed': 0.0, 'start': None}
+        stats.append(thread_stats)
+        workers.append(threading.Thread(
+            target=_run_thread,
+            args=(bound_ops, ThreadContext(thread, threads, seed), ready, start, seconds,
+                  latency, client, thread_stats),
+            daemon=True))
+    for worker in workers:
+        worker.start()
+    try:
+        ready.wait()
+    except threading.BrokenBarrierError:
+        # A thread failed to connect: the trial is aborted before it starts.
+        for worker in workers:
+            worker.join()
+        raise WorkerError(next((thread_stats['failure'] for thread_stats in stats
+                                if 'failure' in thread_stats), 'A thread failed to connect'))
+    connection.send(('ready', None))
+    begin = connection.recv()
+    for thread_stats in stats:
+        thread_stats['start'] = begin
+    start.set()
+    for worker in workers:
+        worker.join()
+    return stats
+
+
+def _worker_main(connection, client_options):
+    client = pymongo.MongoClient(maxPoolSize=None, **client_options)
+    try:
+        while True:
+            message = connection.recv()
+            if message is None:
+                return
+            try:
+                connection.send(('done', run_threads(client, connection, **message)))
+            except WorkerError as error:
+                connection.send(('failed', str(error)))
+            except Exception:
+                connection.send(('failed', traceback.format_exc()))
+    finally:
+        client.close()
+
+
+def merge_stats(stats):
+    """ Merges the statistics of the threads of a trial.
+
+    :returns: the ops of every type, total number of ops, errors, first error messages, seconds
+    (of the slowest thread) and latency histograms of every op type
+    """
+    counts = {}
+    for thread_stats in stats:
+        for op_type, count in thread_stats['counts'].items():
+            counts[op_type] = counts.get(op_type, 0) + count
+    op_types = set(op_type for thread_stats in stats for op_type in thread_stats['latency'])
+    messages = [message for thread_stats in stats for message in thread_stats['error_messages']]
+    return {
+        'counts': counts,
+        'ops': sum(counts.values()),
+        'errors': sum(thread_stats['errors'] for thread_stats in stats),
+        'error_messages': messages[:MAX_ERROR_MESSAGES],
+        'seconds': max([thread_stats['elapsed'] for thread_stats in stats] or [0.0]),
+        'latency': dict((op_type, merge_histograms(thread_stats['latency'].get(op_type)
+                                                   for thread_stats in stats))
+                        for op_type in op_types)
+    }
+
+
+class WorkerPool(object):
+    """ A pool of worker processes, each with its own MongoClient created with client_options """
+
+    def __init__(self, processes, client_options):
+        context = multiprocessing.get_context('spawn')
+        self._workers = []
+        for _ in range(processes):
+            parent, child = context.Pipe()
+            process = context.Process(target=_worker_main, args=(child, client_options),
+                                      daemon=True)
+            process.start()
+            self._workers.append((process, parent))
+
+    def run(self, ops, threads, seconds, latency=False, write_concern=None, seed=0):
+        """ Runs the ops with threads threads for seconds, spread over the workers.
+
+        :returns: the merged statistics of the threads, see merge_stats()
+        """
+        workers = self._workers[:threads]
+        for index, (_, connection) in enumerate(workers):
+            connection.send({'ops': ops, 'threads': threads,
+                             'thread_ids': list(range(index, threads, len(workers))),
+                             'seconds': seconds, 'latency': latency,
+                             'write_concern': write_concern, 'seed': seed})
+        failures = []
+        ready = []
+        for _, connection in workers:
+            kind, value = connection.recv()
+            if kind == 'failed':
+                failures.append(value)
+            else:
+                ready.append(connection)
+        # The trial is aborted if a worker failed to get ready.
+        begin = None if failures else time.time() + START_DELAY
+        for connection in ready:
+            connection.send(begin)
+        stats = []
+        for connection in ready:
+            kind, value = connection.recv()
+            if kind == 'failed':
+                failures.append(value)
+            else:
+                stats.extend(value)
+        failures.extend(thread_stats['failure'] for thread_stats in stats
+                        if 'failure' in thread_stats)
+        if failures:
+            raise WorkerError(failures[0])
+        return merge_stats(stats)
+
+    def close(self):
+        for process, connection in self._workers:
+            try:
+                connection.send(None)
+            except (IOError, OSError):
+                pass
+            process.join(1)
+        self._workers = []
@@ -1,11 +1,13 @@
-import multiprocessing
 import os
 import platform
 import subprocess
 
+from .topology import get_physical_cores, get_topology, parse_cpu_list
+
 
 class NumaNotAvailableError(Exception):
-    """ Raised when a numa function is called and numactl is not available
+    """ Raised when a numa function is called on a machine with a single numa
+    node
     """
 
 
@@ -34,37 +36,20 @@ def get_numa_nodes():
         raise NumaNotAvailableError(
             'Numa control is not available on this machine')
 
-    process = subprocess.Popen(['numactl --hardware | grep cpu'], shell=True,
-                               stdout=subprocess.PIPE)
-    cpu_list = process.communicate()
-    process = subprocess.Popen(['numactl --hardware | grep size'], shell=True,
-                               stdout=subprocess.PIPE)
-    mem_list = process.communicate()
-    process = subprocess.Popen(['numactl --hardware | grep free'], shell=True,
-                               stdout=subprocess.PIPE)
-    mem_free_list = process.communicate()
-    cpu_list = str.splitlines(cpu_list[0])
-    mem_list = str.splitlines(mem_list[0])
-    mem_free_list = str.splitlines(mem_free_list[0])
     node_list = {}
-    for index in range(len(cpu_list)):
-        node_list[index] = NumaNode(str.split(cpu_list[index])[1],
-                                    str.split(cpu_list[index])[3:],
-                                    str.split(mem_list[index])[3],
-                                    str.split(mem_free_list[index])[3], 0)
+    for index, node in enumerate(sorted(get_topology().nodes.values())):
+        node_list[index] = NumaNode(node.id, list(node.cpus),
+                                    _to_megabytes(node.memory_total),
+                                    _to_megabytes(node.memory_free), 0)
     return node_list
 
 
 def is_numa_capable():
-    numa_capable = False
-    if _is_linux() and _has_required_utility('numactl'):
-        process = subprocess.Popen(['numactl --hardware | grep available'],
-                                   shell=True, stdout=subprocess.PIPE)
-        test_available = process.communicate()
-        test_available = str.splitlines(test_available[0])
-        if int(str.split(test_available[0])[1]) > 1:
-            numa_capable = True
-    return numa_capable
+    return _is_linux() and len(get_topology().nodes) > 1
+
+
+def _to_megabytes(size):
+    return None if size is None else size // (1024 * 1024)
 
 
 def is_cpu_affinity_settable():
@@ -75,13 +60,90 @@ def is_cpu_affinity_settable():
 
 def get_cores_available():
     if not is_numa_capable():
-        cpu_list = range(multiprocessing.cpu_count())
+        cpu_list = sorted(get_topology().cpus)
         cpus = {0: CPUNode(cpu_list)}
     else:
         cpus = get_numa_nodes()
     return cpus
 
 
+# The placements of the mongo shell and the server under test:
+#   none  - no pinning
+#   split - disjoint halves of the physical cores of the first numa node (or of
+#           the machine), SMT siblings staying together
+#   numa  - the shell on the first numa node, the server on the others
+PLACEMENTS = ['none', 'split', 'numa']
+
+
+def plan_placement(placement, nodes=None):
+    """ Returns the lists of cpus of the mongo shell and of the server for a
+    placement, or (None, None) for no pinning. Only the cpus this process may
+    run on (see topology.py) are used.
+
+    :param nodes: the cpu nodes to place them on, as returned by
+    get_cores_available()
+    """
+    if placement == 'none':
+        return None, None
+    if nodes is None:
+        nodes = get_cores_available()
+    allowed = get_topology().cpus
+    node_cpus = [sorted(int(cpu) for cpu in nodes[index].cpu_list
+                        if int(cpu) in allowed)
+                 for index in sorted(nodes)]
+    node_cpus = [cpus for cpus in node_cpus if cpus]
+    if placement == 'numa':
+        if len(node_cpus) < 2:
+            raise NumaNotAvailableError(
+                'The numa placement needs at least 2 numa nodes')
+        return node_cpus[0], sorted(cpu for cpus in node_cpus[1:]
+                                    for cpu in cpus)
+    if placement == 'split':
+        cores = get_physical_cores(node_cpus[0])
+        if len(cores) < 2:
+            # a single core, split its SMT siblings
+            cores = [(cpu,) for cpu in node_cpus[0]]
+        if len(cores) < 2:
+            raise CPUAffinitySetNotAvailableError(
+                'The split placement needs at least 2 cpus')
+        half = len(cores) // 2
+        return (sorted(cpu for core in cores[:half] for cpu in core),
+                sorted(cpu for core in cores[half:] for cpu in core))
+    raise ValueError('Unknown placement %s' % placement)
+
+
+def get_process_affinity(pid):
+    """ Returns the set of cpus a process may run on """
+    if hasattr(os, 'sched_getaffinity'):
+        return os.sched_getaffinity(pid)
+    if not is_cpu_affinity_settable():
+        raise CPUAffinitySetNotAvailableError(
+            'Unable to get the CPU affinity on this platform')
+    output = subprocess.check_output(['taskset', '-pc', str(pid)])
+    return set(parse_cpu_list(output.decode().split(':')[-1]))
+
+
+def set_process_affinity(pid, cpus):
+    """ Restricts all the threads of a running process to cpus """
+    cpus = sorted(cpus)
+    if hasattr(os, 'sched_setaffinity'):
+        task_dir = '/proc/%d/task' % pid
+        tasks = os.listdir(task_dir) if os.path.isdir(task_dir) else [pid]
+        for task in tasks:
+            try:
+                os.sched_setaffinity(int(task), cpus)
+            except ProcessLookupError:
+                # the thread exited
+                pass
+    elif is_cpu_affinity_settable():
+        subprocess.check_call(['taskset', '-a', '-pc',
+                               ','.join(str(cpu) for cpu in cpus), str(pid)],
+                              stdout=subprocess.PIPE)
+    else:
+        raise CPUAffinitySetNotAvailableError(
+            'Unable to set the CPU affinity on this platform')
+
+
 def _whereis(program):
     for path in os.environ.get('PATH', '').split(':'):
         if os.path.exists(os.path.join(path, program)) and \
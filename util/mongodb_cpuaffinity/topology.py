@@ -0,0 +1,159 @@
+""" The NUMA nodes, cores and caches of the machine, read from /sys.
+
+The topology is read once and cached; it is made of immutable named tuples so
+it can be shared freely. Only the cpus this process may run on are included:
+inside containers, or when /sys is not available, the cpus come from
+os.sched_getaffinity(), all in a single node.
+"""
+
+import collections
+import multiprocessing
+import os
+from types import MappingProxyType
+
+SYS_NODE_DIR = '/sys/devices/system/node'
+SYS_CPU_DIR = '/sys/devices/system/cpu'
+
+Cpu = collections.namedtuple('Cpu', [
+    'id',          # the logical cpu number
+    'node',        # the number of its numa node
+    'package',     # the physical package (socket) id
+    'core',        # the (package, core id) of its physical core
+    'siblings',    # the logical cpus of its physical core (SMT siblings)
+    'l3_group'     # the logical cpus sharing its L3 cache
+])
+
+Node = collections.namedtuple('Node', [
+    'id',            # the numa node number
+    'cpus',          # its logical cpus
+    'memory_total',  # its memory, in bytes (None if unknown)
+    'memory_free'    # its free memory when read, in bytes (None if unknown)
+])
+
+Topology = collections.namedtuple('Topology', [
+    'nodes',   # the numa nodes, by number
+    'cpus',    # the logical cpus, by number
+])
+
+
+def parse_cpu_list(cpu_list):
+    """ Parses a kernel cpu list such as '0-3,8,10-11' into a tuple of cpus
+    """
+    cpus = []
+    for part in cpu_list.strip().split(','):
+        if not part:
+            continue
+        if '-' in part:
+            first, last = part.split('-')
+            cpus.extend(range(int(first), int(last) + 1))
+        else:
+            cpus.append(int(part))
+    return tuple(sorted(cpus))
+
+
+def _read(path, default=None):
+    try:
+        with open(path) as sys_file:
+            return sys_file.read().strip()
+    except (IOError, OSError):
+        return default
+
+
+def _get_allowed_cpus():
+    if hasattr(os, 'sched_getaffinity'):
+        return frozenset(os.sched_getaffinity(0))
+    return frozenset(range(multiprocessing.cpu_count()))
+
+
+def _read_node_memory(node_dir):
+    """ Returns the total and free memory of a node, in bytes """
+    memory = {}
+    for line in (_read(os.path.join(node_dir, 'meminfo'), '')).splitlines():
+        # Node 0 MemTotal:       16318160 kB
+        fields = line.split()
+        if len(fields) >= 4 and fields[2] in ('MemTotal:', 'MemFree:'):
+            memory[fields[2]] = int(fields[3]) * 1024
+    return memory.get('MemTotal:'), memory.get('MemFree:')
+
+
+def _read_nodes(allowed):
+    """ Returns the nodes of /sys, with their allowed cpus only """
+    nodes = {}
+    if not os.path.isdir(SYS_NODE_DIR):
+        return nodes
+    for entry in os.listdir(SYS_NODE_DIR):
+        if not entry.startswith('node') or not entry[4:].isdigit():
+            continue
+        node_dir = os.path.join(SYS_NODE_DIR, entry)
+        cpus = tuple(cpu for cpu in
+                     parse_cpu_list(_read(os.path.join(node_dir, 'cpulist'), ''))
+                     if cpu in allowed)
+        if not cpus:
+            # memory only nodes, or nodes out of our cpuset
+            continue
+        memory_total, memory_free = _read_node_memory(node_dir)
+        nodes[int(entry[4:])] = Node(int(entry[4:]), cpus, memory_total,
+                                     memory_free)
+    return nodes
+
+
+def _read_l3_group(cpu_dir):
+    cache_dir = os.path.join(cpu_dir, 'cache')
+    if not os.path.isdir(cache_dir):
+        return None
+    for entry in sorted(os.listdir(cache_dir)):
+        index_dir = os.path.join(cache_dir, entry)
+        if entry.startswith('index') and \
+                _read(os.path.join(index_dir, 'level')) == '3':
+            return parse_cpu_list(
+                _read(os.path.join(index_dir, 'shared_cpu_list'), ''))
+    return None
+
+
+def _read_cpu(cpu, node, allowed):
+    cpu_dir = os.path.join(SYS_CPU_DIR, 'cpu%d' % cpu)
+    topology_dir = os.path.join(cpu_dir, 'topology')
+    package = int(_read(os.path.join(topology_dir, 'physical_package_id'), 0))
+    core_id = int(_read(os.path.join(topology_dir, 'core_id'), cpu))
+    siblings = _read(os.path.join(topology_dir, 'thread_siblings_list'))
+    siblings = parse_cpu_list(siblings) if siblings else (cpu,)
+    l3_group = _read_l3_group(cpu_dir) or siblings
+    return Cpu(cpu, node, package, (package, core_id),
+               tuple(sibling for sibling in siblings if sibling in allowed),
+               tuple(member for member in l3_group if member in allowed))
+
+
+def read_topology():
+    """ Reads the topology of the machine, see get_topology() """
+    allowed = _get_allowed_cpus()
+    nodes = _read_nodes(allowed)
+    if not nodes:
+        nodes = {0: Node(0, tuple(sorted(allowed)), None, None)}
+    cpus = {}
+    for node in nodes.values():
+        for cpu in node.cpus:
+            cpus[cpu] = _read_cpu(cpu, node.id, allowed)
+    return Topology(MappingProxyType(nodes), MappingProxyType(cpus))
+
+
+_topology = None
+
+
+def get_topology():
+    """ Returns the cached topology of the machine """
+    global _topology
+    if _topology is None:
+        _topology = read_topology()
+    return _topology
+
+
+def get_physical_cores(cpus=None):
+    """ Returns the physical cores of the topology, as tuples of their logical
+    cpus, only keeping the given cpus if any.
+    """
+    topology = get_topology()
+    cores = collections.OrderedDict()
+    for cpu in sorted(topology.cpus.values(), key=lambda cpu: cpu.id):
+        if cpus is None or cpu.id in cpus:
+            cores.setdefault(cpu.core, []).append(cpu.id)
+    return [tuple(core) for core in cores.values()]
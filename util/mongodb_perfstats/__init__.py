@@ -0,0 +1,296 @@
+"""Statistics on the results reported by the mongo-perf tests"""
+
+LATENCY_PERCENTILES = [('p50', 50.0), ('p90', 90.0), ('p99', 99.0),
+                       ('p99_9', 99.9)]
+# Same as LATENCY_SUB_BUCKET_BITS in util/utils.js
+LATENCY_SUB_BUCKET_BITS = 5
+
+
+class HistogramMismatchError(Exception):
+    """ Raised when merging latency histograms with different bucket layouts
+    """
+
+
+def _bucket_value(index, sub_bucket_bits):
+    """Returns the value in the middle of the latency histogram bucket at index.
+
+    This is the reverse of getLatencyBucketIndex() in util/utils.js.
+    """
+    sub_bucket_count = 1 << sub_bucket_bits
+    if index < sub_bucket_count:
+        return index
+    shift = index // (sub_bucket_count // 2) - 1
+    lowest = (index - shift * (sub_bucket_count // 2)) << shift
+    return lowest + ((1 << shift) - 1) / 2.0
+
+
+def new_histogram():
+    """Returns an empty latency histogram, see newLatencyHistogram() in util/utils.js"""
+    return {'sub_bucket_bits': LATENCY_SUB_BUCKET_BITS, 'count': 0, 'min': None, 'max': None,
+            'counts': {}}
+
+
+def bucket_index(micros, sub_bucket_bits):
+    """Returns the index of the latency histogram bucket of a value, in microseconds.
+
+    This is getLatencyBucketIndex() in util/utils.js.
+    """
+    value = max(0, int(round(micros)))
+    sub_bucket_count = 1 << sub_bucket_bits
+    if value < sub_bucket_count:
+        return value
+    # the bucket of a value is given by its highest bit
+    shift = value.bit_length() - sub_bucket_bits
+    return shift * sub_bucket_count // 2 + (value >> shift)
+
+
+def record_latency(histogram, micros, count=1):
+    """Records count values of micros microseconds in a latency histogram"""
+    index = str(bucket_index(micros, histogram['sub_bucket_bits']))
+    histogram['counts'][index] = histogram['counts'].get(index, 0) + count
+    histogram['count'] += count
+    histogram['min'] = micros if histogram['min'] is None else min(histogram['min'], micros)
+    histogram['max'] = micros if histogram['max'] is None else max(histogram['max'], micros)
+
+
+def merge_histograms(histograms):
+    """Merges latency histograms, skipping the missing ones (failed trials).
+
+    :returns: the merged histogram, or None if there was nothing to merge
+    """
+    merged = None
+    for histogram in histograms:
+        if not histogram:
+            continue
+        if merged is None:
+            merged = {'sub_bucket_bits': histogram['sub_bucket_bits'],
+                      'count': 0, 'min': None, 'max': None, 'counts': {}}
+        elif histogram['sub_bucket_bits'] != merged['sub_bucket_bits']:
+            raise HistogramMismatchError(
+                'Cannot merge histograms with %s and %s sub-bucket bits'
+                % (histogram['sub_bucket_bits'], merged['sub_bucket_bits']))
+        for index, count in histogram['counts'].items():
+            index = str(index)
+            merged['counts'][index] = merged['counts'].get(index, 0) + count
+        merged['count'] += histogram['count']
+        for bound, pick in (('min', min), ('max', max)):
+            if histogram[bound] is not None:
+                merged[bound] = (histogram[bound] if merged[bound] is None
+                                 else pick(merged[bound], histogram[bound]))
+    return merged
+
+
+def histogram_percentile(histogram, percentile):
+    """Returns the value at percentile (0-100) of a latency histogram"""
+    if not histogram or not histogram['count']:
+        return None
+    target = histogram['count'] * percentile / 100.0
+    seen = 0
+    for index in sorted(histogram['counts'], key=int):
+        seen += histogram['counts'][index]
+        if seen >= target:
+            value = _bucket_value(int(index), histogram['sub_bucket_bits'])
+            return min(max(value, histogram['min']), histogram['max'])
+    return histogram['max']
+
+
+def summarize_latency(histogram):
+    """Returns the percentiles, max and count of a latency histogram"""
+    summary = dict((name, histogram_percentile(histogram, percentile))
+                   for name, percentile in LATENCY_PERCENTILES)
+    summary['max'] = histogram['max']
+    summary['count'] = histogram['count']
+    return summary
+
+
+def add_latency_summaries(test_result):
+    """Merges the latency histograms of the trials of each thread count.
+
+    Thread counts run in latency mode (or throttled) have a 'latency_values'
+    list holding the histograms of each op type, for every trial. The merged
+    histogram of every op type, and its percentiles, are stored in a
+    'latency' field next to them. The trials throttled to fractions of the
+    throughput of a thread count, in its 'rate_limited' list, are summarized
+    the same way.
+    """
+    for values in test_result['results'].values():
+        if not isinstance(values, dict):
+            continue
+        for entry in [values] + values.get('rate_limited', []):
+            _add_latency_summary(entry)
+    return test_result
+
+
+def _add_latency_summary(values):
+    if not values.get('latency_values'):
+        return
+    op_types = set()
+    for trial in values['latency_values']:
+        op_types.update(trial or {})
+    latency = {}
+    for op_type in sorted(op_types):
+        merged = merge_histograms((trial or {}).get(op_type)
+                                  for trial in values['latency_values'])
+        latency[op_type] = dict(summarize_latency(merged), histogram=merged)
+    values['latency'] = latency
+
+
+def _mean_documents(documents):
+    """Returns the field by field mean of nested documents of numbers"""
+    merged = {}
+    for field in set(field for document in documents for field in document):
+        values = [document[field] for document in documents if field in document]
+        if isinstance(values[0], dict):
+            merged[field] = _mean_documents(values)
+        else:
+            merged[field] = sum(values) / float(len(values))
+    return merged
+
+
+def _merge_gauges(gauges):
+    """Merges the {min, max, mean} nested documents of the gauges of several trials"""
+    merged = {}
+    for field in set(field for document in gauges for field in document):
+        values = [document[field] for document in gauges if field in document]
+        if 'mean' in values[0] and not isinstance(values[0]['mean'], dict):
+            merged[field] = {'min': min(value['min'] for value in values),
+                             'max': max(value['max'] for value in values),
+                             'mean': sum(value['mean'] for value in values) / float(len(values))}
+        else:
+            merged[field] = _merge_gauges(values)
+    return merged
+
+
+def add_server_status_summaries(test_result):
+    """Averages the serverStatus counter changes of the trials of each thread count.
+
+    Thread counts run in serverStatus mode have a 'server_status_values' list holding the
+    serverStatus summary of every trial. The mean of the counter changes of the trials and the
+    range of their gauges are stored in a 'server_status' field next to it.
+    """
+    for values in test_result['results'].values():
+        if not isinstance(values, dict) or not values.get('server_status_values'):
+            continue
+        trials = [trial for trial in values['server_status_values'] if trial]
+        if not trials:
+            continue
+        values['server_status'] = {
+            'seconds': sum(trial['seconds'] for trial in trials) / float(len(trials)),
+            'deltas': _mean_documents([trial['deltas'] for trial in trials]),
+            'gauges': _merge_gauges([trial['gauges'] for trial in trials])
+        }
+    return test_result
+
+
+def add_warmup_summaries(test_result):
+    """Summarizes the warmups of the trials of each thread count.
+
+    Thread counts run in warmup mode have a 'warmup_values' list holding the warmup of every
+    trial: its duration, whether its throughput became steady, and the ops/sec of its discarded
+    slices. The mean and maximum warmup durations and the number of trials that never became
+    steady are stored in a 'warmup' field next to it.
+    """
+    for values in test_result['results'].values():
+        if not isinstance(values, dict) or not values.get('warmup_values'):
+            continue
+        trials = [trial for trial in values['warmup_values'] if trial]
+        if not trials:
+            continue
+        seconds = [trial['seconds'] for trial in trials]
+        values['warmup'] = {
+            'seconds': sum(seconds) / float(len(seconds)),
+            'max_seconds': max(seconds),
+            'unstable_trials': sum(1 for trial in trials if not trial['stable'])
+        }
+    return test_result
+
+
+def add_timeline_summaries(test_result):
+    """Picks the throughput timeline of each thread count.
+
+    Thread counts run in timeline mode have an 'ops_per_sec_timeline_values' list holding the
+    timeline of every trial: its source (the opcounters of the server, or the benchRun slices),
+    interval and ops/sec per interval. The timeline of the median trial (by ops_per_sec) is stored
+    in an 'ops_per_sec_timeline' field next to it, with the lowest ops/sec of any interval of any
+    trial relative to the mean of its trial ('min_relative_ops_per_sec'), so that the stalls of the
+    other trials are not lost.
+    """
+    for values in test_result['results'].values():
+        if not isinstance(values, dict) or not values.get('ops_per_sec_timeline_values'):
+            continue
+        trials = [(ops_per_sec, timeline) for ops_per_sec, timeline in
+                  zip(values['ops_per_sec_values'], values['ops_per_sec_timeline_values'])
+                  if timeline and timeline['ops_per_sec']]
+        if not trials:
+            continue
+        trials.sort(key=lambda trial: trial[0])
+        timeline = dict(trials[(len(trials) - 1) // 2][1])
+        dips = []
+        for _, trial in trials:
+            mean = sum(trial['ops_per_sec']) / float(len(trial['ops_per_sec']))
+            if mean:
+                dips.append(min(trial['ops_per_sec']) / mean)
+        timeline['min_relative_ops_per_sec'] = min(dips) if dips else None
+        values['ops_per_sec_timeline'] = timeline
+    return test_result
+
+
+def estimate_drift(groups):
+    """Returns the slope of the values over their positions, pooled over groups of (position,
+    value) pairs that may have different means (the variants), or None if it cannot be estimated.
+    """
+    covariance = 0.0
+    variance = 0.0
+    for group in groups:
+        if len(group) < 2:
+            continue
+        mean_position = sum(position for position, _ in group) / float(len(group))
+        mean_value = sum(value for _, value in group) / float(len(group))
+        for position, value in group:
+            covariance += (position - mean_position) * (value - mean_value)
+            variance += (position - mean_position) ** 2
+    if not variance:
+        return None
+    return covariance / variance
+
+
+def detrend_results(records):
+    """Removes the linear drift over the run from the ops_per_sec_values of every test and thread
+    count.
+
+    The trials of the thread counts run with trial_positions (their positions in the run) are
+    grouped by test and thread count, across variants. The drift of a group is the slope of its
+    ops/sec over the positions, assuming the variants only differ by their means. With an
+    interleaved schedule the variants are spread over the same positions, so the drift does not
+    absorb the difference between them. The values corrected to the mean position of the group
+    are stored in 'ops_per_sec_detrended_values', the slope (ops/sec per position) in
+    'ops_per_sec_drift'. The values of the trials without positions are kept as they are.
+    """
+    groups = {}
+    for record in records:
+        for thread, values in record['results'].items():
+            if not isinstance(values, dict) or 'ops_per_sec_values' not in values:
+                continue
+            if values.get('trial_positions'):
+                groups.setdefault((record['name'], thread), []).append(values)
+            else:
+                # results from before the trials were tagged with their positions
+                values['ops_per_sec_drift'] = None
+                values['ops_per_sec_detrended_values'] = list(values['ops_per_sec_values'])
+    for entries in groups.values():
+        points = [[(position, value) for position, value in
+                   zip(entry['trial_positions'], entry['ops_per_sec_values'])
+                   if position is not None and value is not None] for entry in entries]
+        positions = [position for group in points for position, _ in group]
+        slope = estimate_drift(points)
+        if slope is None:
+            slope = 0.0
+        center = sum(positions) / float(len(positions)) if positions else 0.0
+        for entry in entries:
+            entry['ops_per_sec_drift'] = slope
+            entry['ops_per_sec_detrended_values'] = [
+                None if position is None or value is None
+                else value - slope * (position - center)
+                for position, value in zip(entry['trial_positions'],
+                                           entry['ops_per_sec_values'])]
+    return records
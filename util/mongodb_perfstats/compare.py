@@ -0,0 +1,245 @@
+"""Statistical comparison of the results of two mongo-perf runs, or variants"""
+
+import json
+from math import comb, erfc, sqrt
+
+import numpy as np
+
+# Samples at most this large, without ties, get exact Mann-Whitney p-values.
+EXACT_MANN_WHITNEY_MAX_SIZE = 20
+# Maximum number of values of the bootstrap resampling arrays, per batch.
+BOOTSTRAP_BATCH_VALUES = 1 << 24
+
+
+def load_results(path):
+    """Returns the test records of a results file written with --out, in the
+    json or ndjson format.
+    """
+    with open(path) as results_file:
+        text = results_file.read()
+    try:
+        document = json.loads(text)
+    except ValueError:
+        document = None
+    # A single test record is valid json too.
+    if isinstance(document, dict) and isinstance(document.get('results'), list):
+        return document['results']
+    records = (json.loads(line) for line in text.splitlines() if line.strip())
+    return [record for record in records if 'name' in record and 'results' in record]
+
+
+def get_samples(records, variant=None, field='ops_per_sec_values'):
+    """Returns the values of the successful trials of the records by (test name, thread count,
+    group), from field (ops_per_sec_values, or ops_per_sec_detrended_values), only keeping the
+    records of the given variant if any.
+
+    The group tells apart the records of a test run with several variants or --pinning placements,
+    like the variant column of the summary table: it is made of the variant of the record (unless
+    the records are filtered by variant) and of its placement.
+
+    :raises ValueError: if several records have the same test name and group
+    """
+    samples = {}
+    for record in records:
+        if variant is not None and str(record.get('variant')) != str(variant):
+            continue
+        group = [] if variant is not None else [str(record.get('variant', ''))]
+        if 'pinning' in record:
+            group.append(record['pinning']['placement'])
+        group = ' '.join(part for part in group if part)
+        for thread, values in record['results'].items():
+            if not isinstance(values, dict):
+                continue
+            trials = [value for value in values.get(field) or [] if value is not None]
+            if trials:
+                key = (record['name'], thread, group)
+                if key in samples:
+                    raise ValueError('Several results of %s with %s threads%s'
+                                     % (record['name'], thread,
+                                        ' (%s)' % group if group else ''))
+                samples[key] = np.asarray(trials, dtype=float)
+    return samples
+
+
+def _mann_whitney_counts(m, n):
+    """Returns the number of arrangements of two samples of sizes m and n for each value of the
+    Mann-Whitney U statistic of the first one, as an array indexed by U.
+    """
+    # counts[i][j] is the distribution for sizes (i, j), only keep one row at a time.
+    previous = [np.ones(1, dtype=object) for _ in range(n + 1)]
+    for i in range(1, m + 1):
+        current = [np.ones(1, dtype=object)]
+        for j in range(1, n + 1):
+            # Either the largest value is from the first sample, which adds j to U, or not.
+            counts = np.zeros(i * j + 1, dtype=object)
+            counts[j:j + len(previous[j])] += previous[j]
+            counts[:len(current[j - 1])] += current[j - 1]
+            current.append(counts)
+        previous = current
+    return previous[n]
+
+
+def mann_whitney(a, b):
+    """Returns the two-sided p-value of the Mann-Whitney U test of the samples a and b.
+
+    The p-value is exact for small samples without ties, and uses the normal approximation with
+    tie correction otherwise.
+    """
+    m, n = len(a), len(b)
+    values = np.concatenate((a, b))
+    ranks = _average_ranks(values)
+    u = ranks[:m].sum() - m * (m + 1) / 2.0
+    has_ties = len(np.unique(values)) < len(values)
+    if not has_ties and max(m, n) <= EXACT_MANN_WHITNEY_MAX_SIZE:
+        counts = _mann_whitney_counts(m, n)
+        u = int(round(min(u, m * n - u)))
+        p_value = 2.0 * float(sum(counts[:u + 1])) / comb(m + n, m)
+        return min(1.0, p_value)
+
+    _, tie_counts = np.unique(values, return_counts=True)
+    tie_term = float((tie_counts ** 3 - tie_counts).sum()) / ((m + n) * (m + n - 1))
+    variance = m * n / 12.0 * ((m + n + 1) - tie_term)
+    if variance <= 0:
+        return 1.0
+    z = (abs(u - m * n / 2.0) - 0.5) / sqrt(variance)
+    return min(1.0, erfc(max(z, 0.0) / sqrt(2.0)))
+
+
+def _average_ranks(values):
+    """Returns the ranks (from 1) of values, ties getting their average rank"""
+    order = np.argsort(values, kind='mergesort')
+    sorted_values = values[order]
+    # the first index of every run of equal values, and its length
+    starts = np.flatnonzero(np.r_[True, sorted_values[1:] != sorted_values[:-1]])
+    lengths = np.diff(np.r_[starts, len(values)])
+    ranks = np.empty(len(values))
+    ranks[order] = np.repeat(starts + (lengths + 1) / 2.0, lengths)
+    return ranks
+
+
+def hedges_g(a, b):
+    """Returns the standardized difference of the means of b and a, with the small sample bias
+    correction, or None if the samples have no variance.
+    """
+    m, n = len(a), len(b)
+    if m + n <= 2:
+        return None
+    pooled = sqrt(((m - 1) * np.var(a, ddof=1 if m > 1 else 0) +
+                   (n - 1) * np.var(b, ddof=1 if n > 1 else 0)) / (m + n - 2))
+    if pooled == 0:
+        return None
+    correction = 1 - 3.0 / (4 * (m + n) - 9) if m + n > 2 else 1
+    return (b.mean() - a.mean()) / pooled * correction
+
+
+def bootstrap_relative_change(pairs, samples=10000, confidence=0.95, seed=0):
+    """Returns the percentile bootstrap confidence intervals of the relative change of the means,
+    (mean(b) - mean(a)) / mean(a), of every (a, b) pair of samples.
+
+    The pairs are resampled together, a batch of pairs of the same sizes at a time.
+    """
+    rng = np.random.default_rng(seed)
+    tail = (1 - confidence) / 2 * 100
+    intervals = [None] * len(pairs)
+    by_sizes = {}
+    for index, (a, b) in enumerate(pairs):
+        by_sizes.setdefault((len(a), len(b)), []).append(index)
+    for (m, n), indexes in sorted(by_sizes.items()):
+        batch = max(1, BOOTSTRAP_BATCH_VALUES // (samples * (m + n)))
+        for start in range(0, len(indexes), batch):
+            chunk = indexes[start:start + batch]
+            a = np.stack([pairs[index][0] for index in chunk])
+            b = np.stack([pairs[index][1] for index in chunk])
+            # (pairs, samples) means of the resampled samples
+            a_means = a[:, rng.integers(0, m, size=(samples, m))].mean(axis=2)
+            b_means = b[:, rng.integers(0, n, size=(samples, n))].mean(axis=2)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                changes = (b_means - a_means) / a_means
+            lows, highs = np.nanpercentile(changes, [tail, 100 - tail], axis=1)
+            for index, low, high in zip(chunk, lows, highs):
+                intervals[index] = (float(low), float(high))
+    return intervals
+
+
+def benjamini_hochberg(p_values):
+    """Returns the Benjamini-Hochberg adjusted p-values (q-values) of p_values"""
+    p_values = np.asarray(p_values, dtype=float)
+    if not len(p_values):
+        return p_values
+    order = np.argsort(p_values)
+    ranked = p_values[order] * len(p_values) / np.arange(1, len(p_values) + 1)
+    q_values = np.empty(len(p_values))
+    q_values[order] = np.minimum(1.0, np.minimum.accumulate(ranked[::-1])[::-1])
+    return q_values
+
+
+def compare_samples(baseline, contender, alpha=0.05, bootstrap_samples=10000, seed=0):
+    """Compares the ops_per_sec samples of the (test, thread, group) keys found in both baseline
+    and contender.
+
+    A change is significant when its Mann-Whitney p-value is below alpha, and the bootstrap
+    confidence interval of the relative change of the means (at 1 - alpha) does not contain 0. The
+    Benjamini-Hochberg adjusted p-values (q-values) are reported as well, as a guide to how many
+    of the significant changes are expected to be false discoveries when comparing many tests.
+
+    :returns: the comparison of every key, as dicts sorted from the largest win to the largest loss
+    """
+    keys = sorted(set(baseline) & set(contender),
+                  key=lambda key: (key[0], int(key[1]), key[2]))
+    pairs = [(baseline[key], contender[key]) for key in keys]
+    intervals = bootstrap_relative_change(pairs, bootstrap_samples, 1 - alpha, seed)
+    p_values = [mann_whitney(a, b) for a, b in pairs]
+    q_values = benjamini_hochberg(p_values)
+
+    comparisons = []
+    for key, (a, b), interval, p_value, q_value in zip(keys, pairs, intervals, p_values, q_values):
+        change = float((b.mean() - a.mean()) / a.mean()) if a.mean() else None
+        significant = bool(p_value < alpha and interval is not None and
+                           (interval[0] > 0 or interval[1] < 0))
+        if not significant:
+            verdict = ''
+        elif change > 0:
+            verdict = 'win'
+        else:
+            verdict = 'loss'
+        comparisons.append({
+            'name': key[0],
+            'variant': key[2],
+            'thread_count': key[1],
+            'baseline_ops_per_sec': float(a.mean()),
+            'ops_per_sec': float(b.mean()),
+            'change': change,
+            'change_ci': interval,
+            'effect_size': hedges_g(a, b),
+            'p_value': p_value,
+            'q_value': float(q_value),
+            'count': [len(a), len(b)],
+            'verdict': verdict
+        })
+    comparisons.sort(key=lambda comparison: -(comparison['change'] or 0))
+    return comparisons
+
+
+def comparison_rows(comparisons, significant_only=False):
+    """ Returns the table rows of comparisons, only the significant ones if significant_only
+    """
+    rows = []
+    for comparison in comparisons:
+        if significant_only and not comparison['verdict']:
+            continue
+        change_ci = comparison['change_ci'] or (None, None)
+        rows.append([comparison['name'], comparison['variant'], comparison['thread_count'],
+                     comparison['baseline_ops_per_sec'], comparison['ops_per_sec'],
+                     _percent(comparison['change']), '[%s, %s]' % tuple(_percent(bound)
+                                                                       for bound in change_ci),
+                     comparison['effect_size'], comparison['p_value'], comparison['q_value'],
+                     comparison['verdict']])
+    return rows
+
+
+COMPARISON_HEADERS = ["name", "variant", "thread_count", "baseline(mean)", "ops_per_sec(mean)",
+                      "change", "change CI", "effect size (g)", "p-value", "q-value", "verdict"]
+
+
+def _percent(value):
+    return 'n/a' if value is None else '%+.2f%%' % (value * 100)
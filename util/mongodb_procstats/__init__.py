@@ -0,0 +1,118 @@
+"""Resource usage of processes, sampled from /proc"""
+
+import os
+import threading
+import time
+
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+
+
+def is_proc_available(pid):
+    return os.path.exists('/proc/%d/stat' % pid)
+
+
+def read_process_stats(pid):
+    """ Returns the cumulative CPU seconds (user and system, of all the threads), RSS bytes,
+    thread count and context switches of a process, or None if it is gone.
+    """
+    try:
+        with open('/proc/%d/stat' % pid) as stat_file:
+            stat = stat_file.read()
+        with open('/proc/%d/status' % pid) as status_file:
+            status = dict(line.split(':', 1) for line in status_file if ':' in line)
+    except (IOError, OSError):
+        return None
+    # The command name (2nd field) is in parentheses and may contain spaces.
+    fields = stat[stat.rindex(')') + 2:].split()
+    return {
+        'time': time.time(),
+        'user_seconds': int(fields[11]) / float(CLOCK_TICKS),
+        'system_seconds': int(fields[12]) / float(CLOCK_TICKS),
+        'threads': int(fields[17]),
+        'rss_bytes': int(status.get('VmRSS', '0 kB').split()[0]) * 1024,
+        'voluntary_ctxt_switches': int(status.get('voluntary_ctxt_switches', 0)),
+        'nonvoluntary_ctxt_switches': int(status.get('nonvoluntary_ctxt_switches', 0))
+    }
+
+
+def get_cores_allowed(pid):
+    """ Returns the number of cores the process may run on """
+    try:
+        return len(os.sched_getaffinity(pid))
+    except (AttributeError, OSError):
+        return os.cpu_count() or 1
+
+
+class ProcessSampler(object):
+    """ Samples the resource usage of a process from /proc every interval seconds, in a background
+    thread, until the process exits or stop() is called.
+
+    take_usage() returns the usage since its previous call (or since the start), so that the usage
+    can be attributed to the successive tests run by the process.
+    """
+
+    def __init__(self, pid, interval=1.0):
+        self.pid = pid
+        self.interval = interval
+        self.cores = get_cores_allowed(pid)
+        self._lock = threading.Lock()
+        self._samples = []
+        self._stopped = threading.Event()
+        first = read_process_stats(pid)
+        if first is not None:
+            self._samples.append(first)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            sample = read_process_stats(self.pid)
+            if sample is None:
+                return
+            with self._lock:
+                self._samples.append(sample)
+
+    def stop(self):
+        self._stopped.set()
+
+    def take_usage(self):
+        """ Returns the usage of the process since the previous call, or None if there are not
+        enough samples.
+
+        The utilization is in cores: 1.0 is one core fully used. The peak utilization is the
+        highest one between two consecutive samples.
+        """
+        last = read_process_stats(self.pid)
+        with self._lock:
+            samples = self._samples
+            if last is not None:
+                samples.append(last)
+            # The last sample is the start of the next period.
+            self._samples = samples[-1:]
+        if len(samples) < 2:
+            return None
+
+        def cpu_seconds(sample):
+            return sample['user_seconds'] + sample['system_seconds']
+
+        first, last = samples[0], samples[-1]
+        elapsed = last['time'] - first['time']
+        peak = 0.0
+        for previous, sample in zip(samples, samples[1:]):
+            interval = sample['time'] - previous['time']
+            if interval > 0:
+                peak = max(peak, (cpu_seconds(sample) - cpu_seconds(previous)) / interval)
+        return {
+            'seconds': elapsed,
+            'user_seconds': last['user_seconds'] - first['user_seconds'],
+            'system_seconds': last['system_seconds'] - first['system_seconds'],
+            'utilization': (cpu_seconds(last) - cpu_seconds(first)) / elapsed if elapsed else 0.0,
+            'peak_utilization': peak,
+            'cores': self.cores,
+            'max_threads': max(sample['threads'] for sample in samples),
+            'max_rss_bytes': max(sample['rss_bytes'] for sample in samples),
+            'voluntary_ctxt_switches': (last['voluntary_ctxt_switches'] -
+                                        first['voluntary_ctxt_switches']),
+            'nonvoluntary_ctxt_switches': (last['nonvoluntary_ctxt_switches'] -
+                                           first['nonvoluntary_ctxt_switches'])
+        }
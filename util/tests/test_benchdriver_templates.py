@@ -0,0 +1,150 @@
+"""Tests of the compiled templates of the Python driver (util/mongodb_benchdriver/templates.py)"""
+
+import os
+import sys
+import unittest
+
+from bson import ObjectId
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from mongodb_benchdriver.ops import _bind_insert
+from mongodb_benchdriver.templates import (RANDOM_STRING_CHARACTERS, CompiledTemplate,
+                                           TemplateFiller, ThreadContext, UnknownTemplateError)
+
+# Small enough for the tests to cross several batches.
+BATCH_SIZE = 7
+OPS = 20
+
+
+class FakeCollection(object):
+    """ Records the documents inserted, adding an _id to them as PyMongo does """
+
+    def __init__(self):
+        # the documents passed to the collection, and copies of them as inserted
+        self.documents = []
+        self.inserted = []
+
+    def insert_one(self, document):
+        document.setdefault('_id', ObjectId())
+        self.documents.append(document)
+        self.inserted.append(dict(document))
+
+    def insert_many(self, documents, ordered=True):
+        for document in documents:
+            self.insert_one(document)
+
+
+class SeqIntTest(unittest.TestCase):
+
+    def fill(self, args, thread=0, threads=1):
+        """ Returns the values of two templates sharing the seq_id of args in the fields a and b of
+        an op, and of a third one in the field c of another op, as the ops of a loop fill them.
+        """
+        first = CompiledTemplate({'a': {'#SEQ_INT': args}, 'b': {'#SEQ_INT': args}})
+        second = CompiledTemplate({'c': {'#SEQ_INT': args}})
+        context = ThreadContext(thread, threads)
+        fillers = [TemplateFiller(first, context, BATCH_SIZE),
+                   TemplateFiller(second, context, BATCH_SIZE)]
+        values = []
+        for _ in range(OPS):
+            op = fillers[0].next()
+            values.extend([op['a'], op['b']])
+            values.append(fillers[1].next()['c'])
+        return values
+
+    def test_default(self):
+        values = self.fill({'seq_id': 0, 'start': 0, 'step': 1})
+        self.assertEqual(values[:9], [0, 1, 2, 3, 4, 5, 6, 7, 8])
+        self.assertEqual(values, list(range(3 * OPS)))
+
+    def test_step(self):
+        values = self.fill({'seq_id': 1, 'start': 100, 'step': -3})
+        self.assertEqual(values[:9], [100, 97, 94, 91, 88, 85, 82, 79, 76])
+        self.assertEqual(values[-1], 100 - 3 * (3 * OPS - 1))
+
+    def test_unique(self):
+        args = {'seq_id': 0, 'start': 0, 'step': 1, 'unique': True}
+        self.assertEqual(self.fill(args, thread=1, threads=3)[:9],
+                         [1, 4, 7, 10, 13, 16, 19, 22, 25])
+        self.assertEqual(self.fill(args, thread=0, threads=2)[:6], [0, 2, 4, 6, 8, 10])
+        self.assertEqual(self.fill(args, thread=1, threads=2)[:6], [1, 3, 5, 7, 9, 11])
+
+    def test_mod(self):
+        values = self.fill({'seq_id': 0, 'start': 5, 'step': 2, 'mod': 9})
+        self.assertEqual(values[:12], [5, 7, 0, 2, 4, 6, 8, 1, 3, 5, 7, 0])
+
+    def test_mult(self):
+        values = self.fill({'seq_id': 0, 'start': 0, 'step': 1, 'mod': 4, 'mult': 10,
+                            'unique': True}, thread=1, threads=3)
+        self.assertEqual(values[:8], [10, 0, 30, 20, 10, 0, 30, 20])
+
+    def test_seq_ids(self):
+        template = CompiledTemplate({'a': {'#SEQ_INT': {'seq_id': 0, 'start': 0, 'step': 1}},
+                                     'b': {'#SEQ_INT': {'seq_id': 1, 'start': 0, 'step': 1}}})
+        filler = TemplateFiller(template, ThreadContext(0, 1), BATCH_SIZE)
+        for counter in range(OPS):
+            self.assertEqual(filler.next(), {'a': counter, 'b': counter})
+
+
+class RandomTemplatesTest(unittest.TestCase):
+
+    def fill(self, value, thread=0, threads=1):
+        filler = TemplateFiller(CompiledTemplate(value), ThreadContext(thread, threads),
+                                BATCH_SIZE)
+        return [filler.next()['x'] for _ in range(OPS * BATCH_SIZE)]
+
+    def test_rand_int(self):
+        values = self.fill({'x': {'#RAND_INT': [10, 20]}})
+        self.assertTrue(all(isinstance(value, int) for value in values))
+        self.assertTrue(all(10 <= value < 20 for value in values))
+        self.assertEqual(set(values), set(range(10, 20)))
+
+    def test_rand_int_multiplier(self):
+        values = self.fill({'x': {'#RAND_INT': [0, 5, 3]}})
+        self.assertEqual(set(values), {0, 3, 6, 9, 12})
+
+    def test_rand_int_empty_range(self):
+        self.assertEqual(set(self.fill({'x': {'#RAND_INT': [7, 7]}})), {7})
+
+    def test_rand_int_plus_thread(self):
+        values = self.fill({'x': {'#RAND_INT_PLUS_THREAD': [0, 10]}}, thread=2, threads=4)
+        self.assertTrue(all(20 <= value < 30 for value in values))
+
+    def test_rand_string(self):
+        values = self.fill({'x': {'#RAND_STRING': [12]}})
+        self.assertTrue(all(isinstance(value, str) and len(value) == 12 for value in values))
+        self.assertTrue(set(''.join(values)) <= set(RANDOM_STRING_CHARACTERS))
+        self.assertGreater(len(set(values)), 1)
+
+    def test_unknown_template(self):
+        with self.assertRaises(UnknownTemplateError):
+            CompiledTemplate({'x': {'#RAND_FLOAT': [0, 1]}})
+
+
+class InsertTest(unittest.TestCase):
+
+    def test_generated_ids_do_not_leak(self):
+        collection = FakeCollection()
+        insert = _bind_insert(collection, {'doc': {'x': {'#SEQ_INT': {'seq_id': 0, 'start': 0,
+                                                                        'step': 1}}}})
+        context = ThreadContext(0, 1)
+        for _ in range(3):
+            insert(context)
+        # the skeleton of the document is reused by every insert
+        self.assertEqual(len(set(id(document) for document in collection.documents)), 1)
+        self.assertNotIn('_id', collection.documents[0])
+        self.assertEqual([document['x'] for document in collection.inserted], [0, 1, 2])
+        self.assertEqual(len(set(document['_id'] for document in collection.inserted)), 3)
+
+    def test_generated_ids_do_not_leak_from_batches(self):
+        collection = FakeCollection()
+        insert = _bind_insert(collection, {'doc': [{'x': 1}, {'_id': 5, 'x': 2}]})
+        context = ThreadContext(0, 1)
+        insert(context)
+        insert(context)
+        self.assertEqual(collection.documents[-2:], [{'x': 1}, {'_id': 5, 'x': 2}])
+        self.assertEqual(len(set(document['_id'] for document in collection.inserted)), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
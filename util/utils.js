@@ -80,10 +80,11 @@ function toInt(string_number){
     return number;
 }
 
-function checkForDroppedCollectionsTestDBs(db, multidb){
+function checkForDroppedCollectionsTestDBs(db, multidb, dbPrefix){
     // Check for any collections in 'drop-pending' state in any test
-    // database. The test databases have name testN, where N is 0 to
+    // database. The test databases have name <dbPrefix>N, where N is 0 to
     // multidb - 1;
+    if (typeof dbPrefix === "undefined") dbPrefix = "test";
 
     // The checks only matter for versions 3.5 and later.
     // The shell has some issues with the checks before 3.2
@@ -97,7 +98,7 @@ function checkForDroppedCollectionsTestDBs(db, multidb){
         return;
     }
     for (var i = 0; i < multidb; i++) {
-        var sibling_db = db.getSiblingDB('test' + i);
+        var sibling_db = db.getSiblingDB(dbPrefix + i);
         var retries = 0;
         while (checkForDroppedCollections(sibling_db) && retries < 1000) {
             print("Sleeping 1 second while waiting for collection to finish dropping")
@@ -121,8 +122,12 @@ function checkForDroppedCollectionsTestDBs(db, multidb){
  *
  * @param {Object} options
  * @param {string} options.directory - The directory of where to save the JSON config file.
+ * @param {boolean} options.testInfo - Whether to also record the name and tags of the test case
+ *                                     in the JSON config file, for util/mongodb_benchdriver.
+ *
+ * @param {Array} tags - The tags of the test case.
  */
-function CommandTracer(testName, options) {
+function CommandTracer(testName, options, tags) {
     var State = {
         init: "init",
         runningPre: "running pre() function",
@@ -223,15 +228,19 @@ function CommandTracer(testName, options) {
             // We also call Object.bsonsize() on the JavaScript object itself to see if we shouldn't
             // spend any time serializing it to JSON because the resulting BSON document would be
             // over the 16MB size limit.
-            Object.bsonsize({pre: pre, ops: ops});
+            var content = {pre: pre, ops: ops};
+            if (options.testInfo) {
+                content = {name: testName, tags: tags || [], pre: pre, ops: ops};
+            }
+            Object.bsonsize(content);
 
             var prettyPrint = true;
             try {
-                config = tostrictjson({pre: pre, ops: ops}, prettyPrint);
+                config = tostrictjson(content, prettyPrint);
                 Object.bsonsize({_: config});
             } catch (e) {
                 prettyPrint = false;
-                config = tostrictjson({pre: pre, ops: ops}, prettyPrint);
+                config = tostrictjson(content, prettyPrint);
                 Object.bsonsize({_: config});
             }
         } catch (e) {
@@ -263,10 +272,636 @@ function CommandTracer(testName, options) {
     }
 }
 
+/**
+ * Latency histograms, in microseconds. In the manner of HdrHistogram, values are counted in
+ * logarithmic buckets that are each split into linear sub-buckets, so that the relative error of
+ * the recorded values is bounded (about 3% with 5 sub-bucket bits) whatever their magnitude. Only
+ * the non-empty buckets are kept, keyed by their index.
+ *
+ * The bucket layout must be kept in sync with util/mongodb_perfstats, which merges the histograms
+ * of the different trials.
+ */
+var LATENCY_SUB_BUCKET_BITS = 5;
+
+function newLatencyHistogram() {
+    return {sub_bucket_bits: LATENCY_SUB_BUCKET_BITS, count: 0, min: null, max: null, counts: {}};
+}
+
+function getLatencyBucketIndex(micros, subBucketBits) {
+    var value = Math.max(0, Math.round(micros));
+    var subBucketCount = Math.pow(2, subBucketBits);
+    if (value < subBucketCount) {
+        return value;
+    }
+    // The bucket of a value is given by its highest bit, the sub-bucket by the next
+    // 'subBucketBits - 1' bits.
+    var shift = 0;
+    while (value >= Math.pow(2, shift + subBucketBits)) {
+        shift++;
+    }
+    return shift * subBucketCount / 2 + Math.floor(value / Math.pow(2, shift));
+}
+
+function recordLatency(histogram, micros, count) {
+    var index = getLatencyBucketIndex(micros, histogram.sub_bucket_bits);
+    histogram.counts[index] = (histogram.counts[index] || 0) + count;
+    histogram.count += count;
+    histogram.min = histogram.min === null ? micros : Math.min(histogram.min, micros);
+    histogram.max = histogram.max === null ? micros : Math.max(histogram.max, micros);
+}
+
+/**
+ * Returns the throughput reported by benchRun(), across all the op types.
+ */
+function getTotalOpsPerSec(result) {
+    if ("totalOps/s" in result) {
+        return result["totalOps/s"];
+    }
+    return result["insert"] +
+        result["query"] +
+        result["update"] +
+        result["delete"] +
+        result["getmore"] +
+        result["command"];
+}
+
+/**
+ * Returns the op latencies recorded by the server so far, as {category: {micros: count}} for every
+ * category of serverStatus opLatencies ("reads", "writes", "commands", "transactions"), keyed by
+ * the lower bound of their histogram buckets.
+ */
+function getOpLatencySnapshot() {
+    var status = db.adminCommand({serverStatus: 1, opLatencies: {histograms: true}, repl: 0,
+                                  metrics: 0});
+    var snapshot = {};
+    var opLatencies = status.opLatencies || {};
+    Object.keys(opLatencies).forEach(function(category) {
+        if (!Array.isArray(opLatencies[category].histogram)) {
+            return;
+        }
+        snapshot[category] = {};
+        opLatencies[category].histogram.forEach(function(bucket) {
+            var micros = bucket.micros;
+            var count = bucket.count;
+            snapshot[category][typeof micros.toNumber === "function" ? micros.toNumber() : micros] =
+                typeof count.toNumber === "function" ? count.toNumber() : Number(count);
+        });
+    });
+    return snapshot;
+}
+
+/**
+ * Returns the value in the middle of the serverStatus opLatencies bucket starting at micros. The
+ * buckets of the server start at 0 and at the powers of 2 up to 2048 microseconds, then at the
+ * powers of 2 and 1.5 times the powers of 2.
+ */
+function getOpLatencyBucketMiddle(micros) {
+    var upper;
+    if (micros < 2048) {
+        upper = Math.max(2, micros * 2);
+    } else if (Number.isInteger(Math.log2(micros))) {
+        upper = micros * 1.5;
+    } else {
+        upper = micros * 4 / 3;
+    }
+    return (micros + upper) / 2;
+}
+
+/**
+ * Records the ops the server ran between two getOpLatencySnapshot() snapshots into the latency
+ * histogram of their category, each one at the middle of its server bucket plus shiftMicros. With
+ * a name, all the categories are recorded into the histogram of that name instead.
+ */
+function recordOpLatencies(histograms, before, after, shiftMicros, name) {
+    Object.keys(after).forEach(function(category) {
+        Object.keys(after[category]).forEach(function(micros) {
+            var count = after[category][micros] - ((before[category] || {})[micros] || 0);
+            if (count <= 0) {
+                return;
+            }
+            var key = name || category;
+            histograms[key] = histograms[key] || newLatencyHistogram();
+            recordLatency(histograms[key], getOpLatencyBucketMiddle(Number(micros)) + shiftMicros,
+                          count);
+        });
+    });
+}
+
+/**
+ * Runs benchRun() throttled to targetOpsPerSec, as back-to-back slices of 'sliceSeconds' seconds:
+ * the ops are throttled with their 'delay' (milliseconds slept after an op), which is adjusted
+ * after every slice, see newRateLimit().
+ *
+ * The latency of the ops is the one recorded by the server (serverStatus opLatencies), read before
+ * and after every slice: every op is counted in the histogram of its category ("reads", "writes",
+ * "commands") and, from the second slice on, in the "intended" histogram with the schedule lag of
+ * its slice added, see updateRateLimit().
+ *
+ * @returns a benchRun() like result (with "totalOps/s" and "errCount") for the whole run, the
+ * latency histograms in its 'latency' field, the throughput of every slice in its 'timeline' field
+ * and the throttling of the run in its 'rate' field.
+ */
+function runBenchRunSlices(benchArgs, seconds, sliceSeconds, targetOpsPerSec) {
+    var histograms = {};
+    var timeline = [];
+    var totalOps = 0;
+    var errCount = 0;
+    var rate = newRateLimit(benchArgs, targetOpsPerSec);
+    var before = getOpLatencySnapshot();
+    for (var elapsed = 0; elapsed < seconds; elapsed += sliceSeconds) {
+        var sliceArgs = Object.extend({}, benchArgs);
+        sliceArgs.seconds = Math.min(sliceSeconds, seconds - elapsed);
+        sliceArgs.ops = throttleOps(benchArgs.ops, rate);
+        var result = benchRun(sliceArgs);
+        var after = getOpLatencySnapshot();
+        var opsPerSec = getTotalOpsPerSec(result);
+        timeline.push(opsPerSec);
+        totalOps += opsPerSec * sliceArgs.seconds;
+        errCount += result["errCount"].toNumber();
+
+        recordOpLatencies(histograms, before, after, 0);
+        var lagSeconds = updateRateLimit(rate, opsPerSec, sliceArgs.seconds, elapsed == 0);
+        if (lagSeconds !== null) {
+            recordOpLatencies(histograms, before, after, lagSeconds * 1000000, "intended");
+        }
+        before = after;
+    }
+    return {
+        "totalOps/s": totalOps / seconds,
+        errCount: NumberLong(errCount),
+        latency: histograms,
+        timeline: timeline,
+        rate: {
+            target_ops_per_sec: rate.targetOpsPerSec,
+            delay_millis: rate.delays,
+            schedule_lag_seconds: rate.maxLagSeconds
+        }
+    };
+}
+
+/**
+ * The state of the throttling of benchRun() to a target throughput (an open-model load).
+ *
+ * benchRun() threads run their ops back to back, so every thread is throttled by sleeping after
+ * each op (its 'delay' field) for the rest of the period between two ops at the target rate: the
+ * period is parallel / targetOpsPerSec, the time left is the period less the median service time of
+ * the ops over the slices so far, so that a single stalled slice does not drop the delay. The delays
+ * are whole milliseconds: a thread cannot be throttled below 1 op per millisecond plus its service
+ * time, lower the thread count for higher rates.
+ *
+ * The server only measures the service time of the ops, from when they are actually sent. When
+ * the server falls behind the target rate, the ops that should have been sent in the meantime
+ * wait for their turn: the 'intended' latency histogram adds the time the run is behind its
+ * schedule (the backlog of ops over the target rate) to the service time, so that a stall is not
+ * hidden by the ops that were never sent during it (coordinated omission). The next slice is then
+ * run faster to catch up with the backlog.
+ */
+function newRateLimit(benchArgs, targetOpsPerSec) {
+    return {
+        targetOpsPerSec: targetOpsPerSec,
+        parallel: benchArgs.parallel,
+        // Until the first slice, the service time of the ops is unknown.
+        delayMillis: benchArgs.parallel * 1000 / targetOpsPerSec,
+        delays: [],
+        serviceMillis: [],
+        backlogOps: 0,
+        maxLagSeconds: 0
+    };
+}
+
+function throttleOps(ops, rate) {
+    var delay = Math.round(rate.delayMillis);
+    rate.delays.push(delay);
+    return ops.map(function(op) {
+        var throttled = Object.extend({}, op);
+        throttled.delay = delay;
+        return throttled;
+    });
+}
+
+/**
+ * Adjusts the delay of the ops to the throughput of the last slice.
+ *
+ * @returns the schedule lag of the slice, in seconds, or null for the first slice and the slices
+ * that ran no ops
+ */
+function updateRateLimit(rate, opsPerSec, seconds, isFirstSlice) {
+    if (opsPerSec <= 0) {
+        return null;
+    }
+    var delay = rate.delays[rate.delays.length - 1];
+    var serviceMillis = Math.max(0, rate.parallel * 1000 / opsPerSec - delay);
+    rate.serviceMillis.push(serviceMillis);
+    // The first slice calibrates the delay, it is not held against the schedule.
+    var lagSeconds = null;
+    if (!isFirstSlice) {
+        rate.backlogOps =
+            Math.max(0, rate.backlogOps + (rate.targetOpsPerSec - opsPerSec) * seconds);
+        lagSeconds = rate.backlogOps / rate.targetOpsPerSec;
+        rate.maxLagSeconds = Math.max(rate.maxLagSeconds, lagSeconds);
+    }
+    var nextOpsPerSec = rate.targetOpsPerSec + rate.backlogOps / seconds;
+    rate.delayMillis =
+        Math.max(0, rate.parallel * 1000 / nextOpsPerSec - getMedian(rate.serviceMillis));
+    return lagSeconds;
+}
+
+/**
+ * The serverStatus counters whose change over every trial is recorded in serverStatus mode, by
+ * dotted path. The ones a server does not report (e.g. the WiredTiger ones with other storage
+ * engines) are skipped.
+ */
+var SERVER_STATUS_COUNTERS = [
+    "opcounters.insert",
+    "opcounters.query",
+    "opcounters.update",
+    "opcounters.delete",
+    "opcounters.getmore",
+    "opcounters.command",
+    "extra_info.page_faults",
+    "wiredTiger.cache.bytes read into cache",
+    "wiredTiger.cache.bytes written from cache",
+    "wiredTiger.cache.pages read into cache",
+    "wiredTiger.cache.pages written from cache",
+    "wiredTiger.cache.modified pages evicted",
+    "wiredTiger.cache.unmodified pages evicted",
+    "wiredTiger.cache.pages evicted by application threads",
+    "locks.Global.acquireWaitCount.r",
+    "locks.Global.acquireWaitCount.w",
+    "locks.Global.acquireWaitCount.R",
+    "locks.Global.acquireWaitCount.W",
+    "locks.Global.timeAcquiringMicros.r",
+    "locks.Global.timeAcquiringMicros.w",
+    "locks.Global.timeAcquiringMicros.R",
+    "locks.Global.timeAcquiringMicros.W"
+];
+
+/**
+ * The serverStatus gauges whose minimum, maximum and mean over every trial are recorded in
+ * serverStatus mode, by dotted path. The read/write tickets moved from
+ * wiredTiger.concurrentTransactions to queues.execution in 7.0.
+ */
+var SERVER_STATUS_GAUGES = [
+    "wiredTiger.cache.bytes currently in the cache",
+    "wiredTiger.cache.tracked dirty bytes in the cache",
+    "wiredTiger.concurrentTransactions.read.out",
+    "wiredTiger.concurrentTransactions.read.available",
+    "wiredTiger.concurrentTransactions.write.out",
+    "wiredTiger.concurrentTransactions.write.available",
+    "queues.execution.read.out",
+    "queues.execution.read.available",
+    "queues.execution.write.out",
+    "queues.execution.write.available",
+    "globalLock.currentQueue.readers",
+    "globalLock.currentQueue.writers",
+    "globalLock.activeClients.readers",
+    "globalLock.activeClients.writers"
+];
+
+/**
+ * Returns a snapshot of the SERVER_STATUS_COUNTERS and SERVER_STATUS_GAUGES of the server, as
+ * {time, values: {dotted path: number}}.
+ */
+function getServerStatusSnapshot() {
+    var status = db.adminCommand({serverStatus: 1, repl: 0, metrics: 0});
+    var values = {};
+    SERVER_STATUS_COUNTERS.concat(SERVER_STATUS_GAUGES).forEach(function(path) {
+        var value = path.split(".").reduce(
+            (doc, field) => (doc === undefined || doc === null) ? undefined : doc[field], status);
+        if (value !== undefined && value !== null) {
+            values[path] = typeof value.toNumber === "function" ? value.toNumber() : Number(value);
+        }
+    });
+    return {time: Date.now(), values: values};
+}
+
+function getServerStatusDeltas(before, after) {
+    var deltas = {};
+    SERVER_STATUS_COUNTERS.forEach(function(path) {
+        if (path in before.values && path in after.values) {
+            setDottedFieldToValue(deltas, path, after.values[path] - before.values[path]);
+        }
+    });
+    return deltas;
+}
+
+/**
+ * Returns the changes of the serverStatus counters between the first and last snapshots of a
+ * trial, the minimum, maximum and mean of the gauges over all its snapshots and, when there are
+ * snapshots in between, the counter changes and gauges of every interval in 'samples'.
+ */
+function summarizeServerStatus(snapshots) {
+    var first = snapshots[0];
+    var last = snapshots[snapshots.length - 1];
+    var summary = {
+        seconds: (last.time - first.time) / 1000,
+        deltas: getServerStatusDeltas(first, last),
+        gauges: {}
+    };
+    SERVER_STATUS_GAUGES.forEach(function(path) {
+        var values = snapshots.filter((snapshot) => path in snapshot.values)
+                              .map((snapshot) => snapshot.values[path]);
+        if (values.length > 0) {
+            setDottedFieldToValue(summary.gauges, path, {
+                min: Math.min.apply(null, values),
+                max: Math.max.apply(null, values),
+                mean: getMean(values)
+            });
+        }
+    });
+    if (snapshots.length > 2) {
+        summary.samples = [];
+        for (var i = 1; i < snapshots.length; i++) {
+            var gauges = {};
+            SERVER_STATUS_GAUGES.forEach(function(path) {
+                if (path in snapshots[i].values) {
+                    setDottedFieldToValue(gauges, path, snapshots[i].values[path]);
+                }
+            });
+            summary.samples.push({
+                elapsed_seconds: (snapshots[i].time - first.time) / 1000,
+                deltas: getServerStatusDeltas(snapshots[i - 1], snapshots[i]),
+                gauges: gauges
+            });
+        }
+    }
+    return summary;
+}
+
+/**
+ * Returns the throughput of the server between every two consecutive serverStatus snapshots, as
+ * the sum of the changes of its opcounters per second.
+ *
+ * The opcounters count the operations of the server rather than the ops of benchRun (e.g. a batch
+ * insert counts its documents), so the timeline shows the shape of the throughput over a trial
+ * (checkpoint stalls, eviction storms) more than its level.
+ */
+function getOpcountersTimeline(snapshots) {
+    var timeline = [];
+    for (var i = 1; i < snapshots.length; i++) {
+        var seconds = (snapshots[i].time - snapshots[i - 1].time) / 1000;
+        var ops = 0;
+        SERVER_STATUS_COUNTERS.forEach(function(path) {
+            if (path.startsWith("opcounters.") && path in snapshots[i].values &&
+                path in snapshots[i - 1].values) {
+                ops += snapshots[i].values[path] - snapshots[i - 1].values[path];
+            }
+        });
+        timeline.push(seconds > 0 ? ops / seconds : 0);
+    }
+    return timeline;
+}
+
+/**
+ * Runs benchRun for seconds with benchStart()/benchFinish(), calling onInterval with the elapsed
+ * seconds every intervalSeconds while it runs.
+ *
+ * @returns the benchRun() result
+ */
+function runBenchTimed(benchArgs, seconds, intervalSeconds, onInterval) {
+    var handle = benchStart(benchArgs);
+    var start = Date.now();
+    var end = start + seconds * 1000;
+    var next = start + intervalSeconds * 1000;
+    while (Date.now() < end) {
+        sleep(Math.max(0, Math.min(next, end) - Date.now()));
+        if (Date.now() < end) {
+            onInterval((Date.now() - start) / 1000);
+            next += intervalSeconds * 1000;
+        }
+    }
+    return benchFinish(handle);
+}
+
+/**
+ * Runs benchRun() as back-to-back slices of warmup.sliceSeconds (defaults to 1) before the measured
+ * window of a trial, until its throughput is steady: the coefficient of variation (stdev / mean) of
+ * the last warmup.windowSlices (defaults to 5) slices is at most warmup.maxCV (defaults to 0.05).
+ * After warmup.maxSeconds (defaults to 60) the trial is measured anyway, and its warmup is reported
+ * as not stable.
+ *
+ * @returns {seconds, stable, ops_per_sec_values}: the duration of the warmup, whether it reached a
+ * steady state and the throughput of every discarded slice
+ */
+function runWarmup(benchArgs, warmup) {
+    var sliceSeconds = warmup.sliceSeconds || 1;
+    var windowSlices = warmup.windowSlices || 5;
+    var maxCV = warmup.maxCV || 0.05;
+    var maxSeconds = warmup.maxSeconds || 60;
+    var values = [];
+    var stable = false;
+    var start = Date.now();
+    while (!stable && values.length * sliceSeconds < maxSeconds) {
+        var sliceArgs = Object.extend({}, benchArgs);
+        sliceArgs.seconds = sliceSeconds;
+        values.push(getTotalOpsPerSec(benchRun(sliceArgs)));
+        if (values.length >= windowSlices) {
+            var window = values.slice(-windowSlices);
+            var mean = getMean(window);
+            stable = mean > 0 && getStdev(window, mean) / mean <= maxCV;
+        }
+    }
+    return {seconds: (Date.now() - start) / 1000, stable: stable, ops_per_sec_values: values};
+}
+
+// Seconds after which the lock of a shell on the dataset cache is considered abandoned.
+var DATASET_CACHE_LOCK_SECONDS = 10 * 60;
+
+/**
+ * A cache of the datasets generated by the tests' 'pre'/'generateData' functions, so that the
+ * following trials and thread counts of a test restore the dataset with a server-side copy instead
+ * of generating and inserting it again from the shell.
+ *
+ * Only the functions returned by collectionPopulator() with a datasetSpec are cached: they describe
+ * the dataset they generate in their 'datasetSpec' property, including the source of their document
+ * generator and every value it captures, and always generate the same documents. Each dataset is
+ * keyed by a fingerprint of the test name, its 'datasetSpec' and the multidb/multicoll settings;
+ * its documents are copied into the cache database along with the collection options and index
+ * specs. The least recently used datasets are evicted once the cached datasets exceed maxBytes.
+ *
+ * The generators may draw from the shell's Random, which the test may keep using afterwards: the
+ * number of draws made while generating a dataset is cached with it, and a restored dataset leaves
+ * Random in the same state as generating it would.
+ *
+ * The cache database lives on the server under test and keeps its data between runs. It is shared
+ * by the shells of --parallelSuites, which take turns with a lock document to read and change it.
+ *
+ * @param {Number} maxBytes - The maximum total size of the cached datasets.
+ * @param {Object} fingerprintFields - Additional fields of the fingerprint of every dataset.
+ */
+function DatasetCache(maxBytes, fingerprintFields) {
+    var cacheDB = db.getSiblingDB("mongoperf_dataset_cache");
+    var catalog = cacheDB.getCollection("catalog");
+    var locks = cacheDB.getCollection("locks");
+    var owner = ObjectId().str;
+
+    /**
+     * Runs fn() while holding the lock of the cache. A lock left by a shell that died is taken
+     * over once it expires.
+     */
+    function withLock(fn) {
+        var waiting = false;
+        while (true) {
+            var now = new Date();
+            var result = locks.insert({
+                _id: "cache",
+                owner: owner,
+                expiresAt: new Date(now.getTime() + DATASET_CACHE_LOCK_SECONDS * 1000)
+            });
+            if (!result.hasWriteError()) {
+                break;
+            }
+            assert.eq(result.getWriteError().code, ErrorCodes.DuplicateKey, tojson(result));
+            locks.remove({_id: "cache", expiresAt: {$lt: now}});
+            if (!waiting) {
+                print("Waiting for the lock of the dataset cache");
+                waiting = true;
+            }
+            sleep(100);
+        }
+        try {
+            return fn();
+        } finally {
+            locks.remove({_id: "cache", owner: owner});
+        }
+    }
+
+    /**
+     * Calls init(collection, env), and returns the number of values drawn from Random meanwhile.
+     */
+    function countRandomDraws(init, collection, env) {
+        var rand = Random.rand;
+        var draws = 0;
+        Random.rand = function() {
+            draws++;
+            return rand.apply(this, arguments);
+        };
+        try {
+            init(collection, env);
+        } finally {
+            Random.rand = rand;
+        }
+        return draws;
+    }
+
+    /**
+     * Leaves Random in the state generating the dataset of entry would have left it in.
+     */
+    function replayRandomDraws(init, entry) {
+        Random.setRandomSeed(init.datasetSpec.seed);
+        for (var i = 0; i < entry.randomDraws; i++) {
+            Random.rand();
+        }
+    }
+
+    function getFingerprint(testName, init) {
+        return hex_md5(tojson(Object.extend(
+            {test: testName, spec: init.datasetSpec}, fingerprintFields)));
+    }
+
+    function copyCollection(source, targetDB, targetName) {
+        source.aggregate([{$out: {db: targetDB, coll: targetName}}]).itcount();
+    }
+
+    function snapshot(fingerprint, testName, collection, randomDraws) {
+        var infos = collection.getDB().getCollectionInfos({name: collection.getName()});
+        if (infos.length != 1 || infos[0].type !== "collection" ||
+            "timeseries" in infos[0].options) {
+            return null;
+        }
+        var bytes = collection.dataSize();
+        if (bytes > maxBytes) {
+            return null;
+        }
+        var indexes = collection.getIndexes().filter((index) => index.name !== "_id_")
+                                             .map(function(index) {
+                                                 delete index.v;
+                                                 delete index.ns;
+                                                 return index;
+                                             });
+        copyCollection(collection, cacheDB.getName(), fingerprint);
+        var entry = {
+            _id: fingerprint,
+            test: testName,
+            options: infos[0].options,
+            indexes: indexes,
+            bytes: bytes,
+            randomDraws: randomDraws,
+            lastUsed: new Date()
+        };
+        assert.writeOK(catalog.insert(entry));
+        evict();
+        return entry;
+    }
+
+    function restore(entry, collection) {
+        var targetDB = collection.getDB();
+        collection.drop();
+        assert.commandWorked(targetDB.createCollection(collection.getName(), entry.options));
+        if (entry.indexes.length > 0) {
+            assert.commandWorked(collection.createIndexes(entry.indexes));
+        }
+        copyCollection(cacheDB.getCollection(entry._id), targetDB.getName(), collection.getName());
+        catalog.update({_id: entry._id}, {$set: {lastUsed: new Date()}});
+    }
+
+    function evict() {
+        var totalBytes = 0;
+        catalog.find().sort({lastUsed: -1}).forEach(function(entry) {
+            totalBytes += entry.bytes;
+            if (totalBytes > maxBytes) {
+                print("Evicting the cached dataset of " + entry.test);
+                cacheDB.getCollection(entry._id).drop();
+                catalog.remove({_id: entry._id});
+            }
+        });
+    }
+
+    this.isCacheable = function isCacheable(init) {
+        return typeof init === "function" && typeof init.datasetSpec === "object";
+    };
+
+    /**
+     * Populates the collections like calling init() on each of them would.
+     */
+    this.populate = function populate(collections, env, testName, init) {
+        var fingerprint = getFingerprint(testName, init);
+        // The dataset is restored while holding the lock, so that no other shell evicts it
+        // meanwhile. It is generated without the lock, and only snapshot with it.
+        var restored = withLock(function() {
+            var entry = catalog.findOne({_id: fingerprint});
+            if (entry !== null) {
+                collections.forEach((collection) => restore(entry, collection));
+                replayRandomDraws(init, entry);
+            }
+            return entry !== null;
+        });
+        if (restored) {
+            return;
+        }
+        // Random is left in the state of a cold run by the generation of the first collection.
+        var randomDraws = countRandomDraws(init, collections[0], env);
+        var cached = withLock(function() {
+            // Another shell may have cached the same dataset in the meantime.
+            var entry = catalog.findOne({_id: fingerprint}) ||
+                snapshot(fingerprint, testName, collections[0], randomDraws);
+            if (entry !== null) {
+                collections.slice(1).forEach((collection) => restore(entry, collection));
+            }
+            return entry !== null;
+        });
+        if (!cached) {
+            collections.slice(1).forEach((collection) => init(collection, env));
+        }
+    };
+}
+
 var sharedCollections = [];
-function initCollections(collections, env, testName, init, multidb, multicoll, shard) {
+function initCollections(collections, env, testName, init, multidb, multicoll, shard, dbPrefix,
+                         datasetCache) {
+    if (typeof dbPrefix === "undefined") dbPrefix = "test";
     for (var i = 0; i < multidb; i++) {
-        var sibling_db = db.getSiblingDB('test' + i);
+        var sibling_db = db.getSiblingDB(dbPrefix + i);
         var foo = testName.replace(/\./g, "_");
         for (var j = 0; j < multicoll; j++) {
             var coll = sibling_db.getCollection(foo + j);
@@ -275,7 +910,9 @@ function initCollections(collections, env, testName, init, multidb, multicoll, s
         }
     }
 
-    if (init) {
+    if (init && datasetCache && datasetCache.isCacheable(init)) {
+        datasetCache.populate(collections, env, testName, init);
+    } else if (init) {
         for (var i = 0; i < (multidb * multicoll); i++) {
             init(collections[i], env);
         }
@@ -285,7 +922,7 @@ function initCollections(collections, env, testName, init, multidb, multicoll, s
     // explicitly do so now. We want the collections to be pre-allocated so that allocation time is
     // not incorporated into the benchmark.
     for (var i = 0; i < multidb; i++) {
-        var theDb = db.getSiblingDB('test' + i);
+        var theDb = db.getSiblingDB(dbPrefix + i);
         // This will silently fail and with no side-effects if the collection
         // already exists.
         for (var j = 0; j < multicoll; j++) {
@@ -298,23 +935,23 @@ function initCollections(collections, env, testName, init, multidb, multicoll, s
                 collections[(multicoll * i) + j].createIndex({ _id: "hashed" });
             }
 
-            sh.enableSharding("test" + i);
+            sh.enableSharding(dbPrefix + i);
             for (var j = 0; j < multicoll; j++) {
-                var t = sh.shardCollection("test" + i + "." +
+                var t = sh.shardCollection(dbPrefix + i + "." +
                     collections[(multicoll * i) + j].getName(), { _id: "hashed" });
             }
 
         } else if (shard == 2) {
-            sh.enableSharding("test" + i);
+            sh.enableSharding(dbPrefix + i);
             for (var j = 0; j < multicoll; j++) {
-                var t = sh.shardCollection("test" + i + "." +
+                var t = sh.shardCollection(dbPrefix + i + "." +
                     collections[(multicoll * i) + j].getName(), { _id: 1 });
             }
         }
     }
 }
 
-function cleanupCollections(collections, multidb, multicoll) {
+function cleanupCollections(collections, multidb, multicoll, dbPrefix) {
     for (var i = 0; i < multidb; i++) {
         for (var j = 0; j < multicoll; j++) {
             collections[(multicoll * i) + j].drop();
@@ -322,7 +959,7 @@ function cleanupCollections(collections, multidb, multicoll) {
     }
 
     // Make sure all collections have been dropped
-    checkForDroppedCollectionsTestDBs(db, multidb)
+    checkForDroppedCollectionsTestDBs(db, multidb, dbPrefix)
 }
 
 function runTest(test, {
@@ -336,14 +973,23 @@ function runTest(test, {
     shareDataset,
     mongoeBenchOptions,
     username,
-    password
+    password,
+    dbPrefix,
+    latency,
+    latencySliceSeconds,
+    serverStatus,
+    serverStatusIntervalSeconds,
+    timelineIntervalSeconds,
+    targetOpsPerSec,
+    warmup,
+    datasetCache
 }) {
     if (typeof crudOptions === "undefined") crudOptions = getDefaultCrudOptions();
     if (typeof shard === "undefined") shard = 0;
     if (typeof includeFilter === "undefined") includeFilter = "sanity";
     if (typeof printArgs === "undefined") printArgs = false;
 
-    var realTracer = new CommandTracer(test.name, mongoeBenchOptions);
+    var realTracer = new CommandTracer(test.name, mongoeBenchOptions, test.tags);
     var fakeTracer = {};
     Object.keys(realTracer).forEach(function(methodName) {
         // We copy all the properties defined on 'realTracer' as no-op functions.
@@ -368,7 +1014,8 @@ function runTest(test, {
     // without sharing the dataset.
     if ("generateData" in test) {
         if (!shareDataset || collections.length == 0) {
-            initCollections(collections, env, test.name, test.generateData, multidb, multicoll, shard);
+            initCollections(collections, env, test.name, test.generateData, multidb, multicoll,
+                            shard, dbPrefix, datasetCache);
         }
         if ("pre" in test) {
             for (var i = 0; i < (multidb * multicoll); i++) {
@@ -378,7 +1025,8 @@ function runTest(test, {
     }
     else {
         assert(!shareDataset);
-        initCollections(collections, env, test.name, test.pre, multidb, multicoll, shard);
+        initCollections(collections, env, test.name, test.pre, multidb, multicoll, shard, dbPrefix,
+                        datasetCache);
     }
 
     var new_ops = [];
@@ -427,26 +1075,50 @@ function runTest(test, {
 
     // Make sure the system is queisced
     // Check for dropped collections
-    checkForDroppedCollectionsTestDBs(db, multidb)
+    checkForDroppedCollectionsTestDBs(db, multidb, dbPrefix)
     db.adminCommand({fsync: 1});
 
+    // Discard the cold start of the trial (empty caches, first allocations) until the throughput
+    // is steady, so that the measured window only holds the steady state.
+    var warmupResult;
+    if (warmup) {
+        warmupResult = runWarmup(benchArgs, warmup);
+        print("\t" + thread + "\twarmup: " + warmupResult.seconds + "s" +
+              (warmupResult.stable ? "" : " (not stable)"));
+    }
 
     // invoke the built-in mongo shell function
-    var result = benchRun(benchArgs);
-
-    var total;
-    if ("totalOps/s" in result) {
-        total = result["totalOps/s"];
+    var result;
+    var snapshots = [];
+    // The throttled runs are run in slices, to adjust their delay.
+    var sliced = !!targetOpsPerSec;
+    var sampleServerStatus = serverStatus || (timelineIntervalSeconds && !sliced);
+    if (sampleServerStatus) {
+        snapshots.push(getServerStatusSnapshot());
     }
-    else {
-        total =
-            result["insert"] +
-            result["query"] +
-            result["update"] +
-            result["delete"] +
-            result["getmore"] +
-            result["command"];
+    // The latency of every op is recorded by the server, the measured window stays a single
+    // benchRun.
+    var opLatencies = latency && !sliced ? [getOpLatencySnapshot()] : null;
+    if (sliced) {
+        // The timeline is made of the throughput of the slices.
+        result = runBenchRunSlices(benchArgs, seconds, latencySliceSeconds || 1, targetOpsPerSec);
+    } else if (timelineIntervalSeconds || (serverStatus && serverStatusIntervalSeconds)) {
+        // The timeline interval takes precedence over the serverStatus one.
+        var intervalSeconds = timelineIntervalSeconds || serverStatusIntervalSeconds;
+        result = runBenchTimed(benchArgs, seconds, intervalSeconds, function() {
+            snapshots.push(getServerStatusSnapshot());
+        });
+    } else {
+        result = benchRun(benchArgs);
     }
+    if (opLatencies) {
+        opLatencies.push(getOpLatencySnapshot());
+    }
+    if (sampleServerStatus) {
+        snapshots.push(getServerStatusSnapshot());
+    }
+
+    var total = getTotalOpsPerSec(result);
     error_string = "";
     if (result["errCount"] != 0)
         error_string = "There were errors: " + result["errCount"];
@@ -469,7 +1141,33 @@ function runTest(test, {
         cleanupCollections(collections);
     }
 
-    return { ops_per_sec: total, error_count : result["errCount"]};
+    var testResult = { ops_per_sec: total, error_count : result["errCount"]};
+    if (opLatencies) {
+        testResult.latency = {};
+        recordOpLatencies(testResult.latency, opLatencies[0], opLatencies[1], 0);
+    }
+    if (sliced) {
+        testResult.latency = result.latency;
+        testResult.rate = result.rate;
+    }
+    if (serverStatus) {
+        testResult.server_status = summarizeServerStatus(snapshots);
+    }
+    if (timelineIntervalSeconds) {
+        testResult.timeline = sliced ? {
+            source: "benchRun",
+            interval_seconds: latencySliceSeconds || 1,
+            ops_per_sec: result.timeline
+        } : {
+            source: "opcounters",
+            interval_seconds: timelineIntervalSeconds,
+            ops_per_sec: getOpcountersTimeline(snapshots)
+        };
+    }
+    if (warmup) {
+        testResult.warmup = warmupResult;
+    }
+    return testResult;
 }
 
 function getMean(values) {
@@ -501,6 +1199,30 @@ function getStdev(values, mean) {
     return Math.sqrt(sum / arr.length)
 }
 
+// Two-sided 95% quantiles of Student's t-distribution, by degrees of freedom (1 to 30).
+var T_DISTRIBUTION_95 = [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+                         2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+                         2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042];
+
+/**
+ * Returns the half-width of the 95% confidence interval of the mean of values, relative to the
+ * mean, or null if there are not enough values to compute it.
+ */
+function getRelativeCI(values) {
+    if (values.length < 2) {
+        return null;
+    }
+    var mean = getMean(values);
+    if (mean == 0) {
+        return null;
+    }
+    var sum = values.reduce((acc, value) => acc + (value - mean) ** 2, 0);
+    var sampleStdev = Math.sqrt(sum / (values.length - 1));
+    var degrees = values.length - 1;
+    var t = degrees <= T_DISTRIBUTION_95.length ? T_DISTRIBUTION_95[degrees - 1] : 1.96;
+    return t * sampleStdev / Math.sqrt(values.length) / mean;
+}
+
 function getNFieldNames(numFields) {
     var fieldNames = [];
     for (var i = 0; i < numFields; i++) {
@@ -675,9 +1397,160 @@ function doExecute(test, includeFilter, excludeFilter) {
     return true;
 }
 
+/**
+ * Returns a pseudo-random number generator (mulberry32) seeded with seed, as a function returning
+ * numbers in [0, 1). Unlike Random, it leaves the sequences of the document generators untouched.
+ */
+function newSeededRandom(seed) {
+    var state = seed >>> 0;
+    return function() {
+        state = (state + 0x6D2B79F5) >>> 0;
+        var t = state;
+        t = Math.imul(t ^ (t >>> 15), t | 1);
+        t ^= t + Math.imul(t ^ (t >>> 7), t | 61);
+        return ((t ^ (t >>> 14)) >>> 0) / 4294967296;
+    };
+}
+
+/**
+ * Shuffles array in place (Fisher-Yates) with the numbers of random.
+ */
+function shuffle(array, random) {
+    for (var i = array.length - 1; i > 0; i--) {
+        var j = Math.floor(random() * (i + 1));
+        var swap = array[i];
+        array[i] = array[j];
+        array[j] = swap;
+    }
+    return array;
+}
+
+/**
+ * Returns true when a test has been run for enough trials with a thread count: testArgs.trials
+ * of them or, when testArgs.targetCI is set, until the relative 95% confidence interval of the
+ * throughput is no wider than testArgs.targetCI, up to testArgs.maxTrials.
+ *
+ * @param results - the results of the trials run so far, undefined for the failed ones
+ * @param trials - the number of trials run so far
+ * @param testArgs - the test arguments
+ */
+function hasEnoughTrials(results, trials, testArgs) {
+    var maxTrials = testArgs.trials;
+    if (testArgs.targetCI) {
+        maxTrials = Math.max(testArgs.trials, testArgs.maxTrials);
+    }
+    if (trials >= maxTrials) {
+        return true;
+    }
+    if (testArgs.targetCI && trials >= Math.max(testArgs.trials, 2)) {
+        var relativeCI = getRelativeCI(results.filter((result) => result !== undefined)
+                                           .map((result) => result.ops_per_sec));
+        return relativeCI !== null && relativeCI <= testArgs.targetCI;
+    }
+    return false;
+}
+
+/**
+ * Run a single trial of a test with a thread count. Every trial of the run gets the next position,
+ * so that the drift of the machine over the run can be estimated from the results.
+ *
+ * @returns the result of runTest() with its position, or undefined if the trial failed
+ */
+function runTrial(test, testArgs, threadCount, trial, errorsOutput) {
+    testArgs.thread = threadCount;
+    var position = testArgs.trialPosition++;
+    try {
+        var result = runTest(test, testArgs);
+        result.position = position;
+        return result;
+    } catch (err) {
+        // Error handling to catch exceptions thrown in/by js for error
+        // Not all errors from the mongo shell are put up as js exceptions
+        print("Error running test " + test.name + ": " + err.message + ":\n" + err.stack);
+        errorsOutput.push({
+            test: test,
+            trial: trial,
+            threadCount: threadCount,
+            multidb: testArgs.multidb,
+            multicoll: testArgs.multicoll,
+            shard: testArgs.shard,
+            crudOptions: testArgs.crudOptions,
+            username: testArgs.username,
+            password: testArgs.password,
+            error: {message: err.message, code: err.code}
+        });
+    }
+}
+
+/**
+ * Returns the results of the trials of a test with a thread count.
+ *
+ * @param results - the results of the trials, undefined for the failed ones
+ * @param trials - the number of trials run
+ * @param testArgs - the test arguments
+ */
+function summarizeTrials(results, trials, testArgs) {
+    var newResults = {};
+    var values = [];
+    var errors = [];
+    var latencies = [];
+    var positions = [];
+    var serverStatuses = [];
+    var warmups = [];
+    var timelines = [];
+    var rates = [];
+    for (var j = 0; j < trials; j++) {
+        if (results[j] !== undefined) {
+            values[j] = results[j].ops_per_sec;
+            errors[j] = results[j].error_count.toNumber()
+            latencies[j] = results[j].latency;
+            positions[j] = results[j].position;
+            serverStatuses[j] = results[j].server_status;
+            warmups[j] = results[j].warmup;
+            timelines[j] = results[j].timeline;
+            rates[j] = results[j].rate;
+        }
+    }
+    // uncomment if one needs to save the trial values that comprise the mean
+    newResults.ops_per_sec_values = values;
+    newResults.error_values = errors;
+    // The position of every trial in the run, see mongodb_perfstats.detrend_results().
+    newResults.trial_positions = positions;
+    if (testArgs.latency || testArgs.targetOpsPerSec) {
+        // The histograms of the trials are merged by benchrun.py.
+        newResults.latency_values = latencies;
+    }
+    if (testArgs.targetOpsPerSec) {
+        newResults.target_ops_per_sec = testArgs.targetOpsPerSec;
+        newResults.rate_values = rates;
+    }
+    if (testArgs.serverStatus) {
+        // The deltas of the trials are averaged by benchrun.py.
+        newResults.server_status_values = serverStatuses;
+    }
+    if (testArgs.timelineIntervalSeconds) {
+        // The timeline of the median trial is picked by benchrun.py.
+        newResults.ops_per_sec_timeline_values = timelines;
+    }
+    if (testArgs.warmup) {
+        // The warmup of every trial, its ops/sec are not part of ops_per_sec_values.
+        newResults.warmup_values = warmups;
+    }
+    newResults.ops_per_sec = getMean(values);
+    newResults.ops_per_sec_median = getMedian(values);
+    newResults.ops_per_sec_stdev = getStdev(values, newResults.ops_per_sec);
+    if (testArgs.targetCI) {
+        newResults.trials = trials;
+        newResults.ops_per_sec_ci = getRelativeCI(values.filter((value) => value !== undefined));
+    }
+    return newResults;
+}
+
 /**
  * Run a single test with different threads config one or more times and measure the performance.
  *
+ * The trials of a thread count are run back to back, see hasEnoughTrials() for their number.
+ *
  * @param test - the test to be ran
  * @param testArgs - the test arguments
  * @param variant - the current variant value
@@ -690,57 +1563,227 @@ function executeOneTest(test,
     print(test.name + (variant === "" ? "" : ", variant " + variant))
     var threadResults = {};
     threadResults['start'] = new Date();
+    if (testArgs.autoThreads) {
+        threadResults['auto_threads'] = findThreadsKnee(test, testArgs, threadResults, errorsOutput);
+        threadResults['end'] = new Date();
+        return threadResults;
+    }
     for (var t = 0; t < testArgs.threadCounts.length; t++) {
         var threadCount = testArgs.threadCounts[t];
-        testArgs.thread = threadCount;
         var results = [];
-        var newResults = {};
-        for (var j = 0; j < testArgs.trials; j++) {
-            try {
-                results[j] = runTest(test, testArgs);
-            } catch (err) {
-                // Error handling to catch exceptions thrown in/by js for error
-                // Not all errors from the mongo shell are put up as js exceptions
-                print("Error running test " + test.name + ": " + err.message + ":\n" + err.stack);
-                errorsOutput.push({
-                    test: test,
-                    trial: j,
-                    threadCount: threadCount,
-                    multidb: testArgs.multidb,
-                    multicoll: testArgs.multicoll,
-                    shard: testArgs.shard,
-                    crudOptions: testArgs.crudOptions,
-                    username: testArgs.username,
-                    password: testArgs.password,
-                    error: {message: err.message, code: err.code}
-                });
+        var trials = 0;
+        while (!hasEnoughTrials(results, trials, testArgs)) {
+            results[trials] = runTrial(test, testArgs, threadCount, trials, errorsOutput);
+            trials++;
+        }
+        threadResults[threadCount] = summarizeTrials(results, trials, testArgs);
+        if (testArgs.targetRateFractions) {
+            threadResults[threadCount].rate_limited = runRateLimitedTrials(
+                test, testArgs, threadCount, threadResults[threadCount].ops_per_sec, errorsOutput);
+        }
+    }
+    threadResults['end'] = new Date();
+    return threadResults;
+}
+
+/**
+ * Runs the trials of a test with a thread count throttled to each of the targetRateFractions of
+ * its peak throughput, for latency-vs-load curves.
+ *
+ * @param peakOpsPerSec - the throughput of the thread count without throttling
+ * @returns the results of the trials of every fraction, with their target throughput
+ */
+function runRateLimitedTrials(test, testArgs, threadCount, peakOpsPerSec, errorsOutput) {
+    var rateResults = [];
+    if (!peakOpsPerSec) {
+        return rateResults;
+    }
+    var previousTarget = testArgs.targetOpsPerSec;
+    try {
+        for (var fraction of testArgs.targetRateFractions) {
+            testArgs.targetOpsPerSec = fraction * peakOpsPerSec;
+            var results = [];
+            var trials = 0;
+            while (!hasEnoughTrials(results, trials, testArgs)) {
+                results[trials] = runTrial(test, testArgs, threadCount, trials, errorsOutput);
+                trials++;
+            }
+            var rateResult = summarizeTrials(results, trials, testArgs);
+            rateResult.fraction = fraction;
+            rateResults.push(rateResult);
+        }
+    } finally {
+        testArgs.targetOpsPerSec = previousTarget;
+    }
+    return rateResults;
+}
+
+// The knee of the throughput is searched until the bisected thread counts are this close, relative
+// to the thread count.
+var AUTO_THREADS_RESOLUTION = 0.25;
+
+/**
+ * Finds the thread count where the throughput of a test stops improving (the knee), with as few
+ * thread counts as possible.
+ *
+ * The thread count is doubled, starting at 1, as long as it improves the throughput by more than
+ * testArgs.autoThreads.tolerance (relative), up to testArgs.autoThreads.max threads. Doubling also
+ * stops when the mean latency (threads / throughput, by Little's law) goes over
+ * testArgs.autoThreads.maxLatencyMicros, when set. The knee, the smallest thread count with a
+ * throughput within the tolerance of the peak, is then bisected between the last two doubled thread
+ * counts, down to AUTO_THREADS_RESOLUTION. The results of every thread count run are stored in
+ * threadResults, like with fixed thread counts.
+ *
+ * @returns {{knee, peak_threads, peak_ops_per_sec, saturated, thread_counts}} where saturated is
+ * false if the throughput was still improving at the maximum thread count, and thread_counts the
+ * thread counts run, in order
+ */
+function findThreadsKnee(test, testArgs, threadResults, errorsOutput) {
+    var options = testArgs.autoThreads;
+    var threadCounts = [];
+    var peakThreads = null;
+
+    function measure(threadCount) {
+        if (!(threadCount in threadResults)) {
+            var results = [];
+            var trials = 0;
+            while (!hasEnoughTrials(results, trials, testArgs)) {
+                results[trials] = runTrial(test, testArgs, threadCount, trials, errorsOutput);
+                trials++;
+            }
+            threadResults[threadCount] = summarizeTrials(results, trials, testArgs);
+            threadCounts.push(threadCount);
+            if (peakThreads === null ||
+                threadResults[threadCount].ops_per_sec > threadResults[peakThreads].ops_per_sec) {
+                peakThreads = threadCount;
             }
         }
-        var values = [];
-        var errors = [];
-        for (var j = 0; j < testArgs.trials; j++) {
-            if (results[j] !== undefined) {
-                values[j] = results[j].ops_per_sec;
-                errors[j] = results[j].error_count.toNumber()
+        return threadResults[threadCount].ops_per_sec;
+    }
+
+    function isLatencyExceeded(threadCount, opsPerSec) {
+        return options.maxLatencyMicros && opsPerSec > 0 &&
+            threadCount * 1000000 / opsPerSec > options.maxLatencyMicros;
+    }
+
+    var previous = 1;
+    var previousOps = measure(previous);
+    var lower = null;
+    var saturated = false;
+    for (var current = 2; current <= options.max; current *= 2) {
+        var ops = measure(current);
+        if (ops <= previousOps * (1 + options.tolerance) || isLatencyExceeded(current, ops)) {
+            saturated = true;
+            break;
+        }
+        lower = previous;
+        previous = current;
+        previousOps = ops;
+    }
+
+    // The throughput at lower is below the knee, the one at previous is within the tolerance of
+    // the peak unless it was the latency that stopped the doubling.
+    var knee = previous;
+    if (saturated && lower !== null) {
+        var high = previous;
+        var low = lower;
+        while (high - low > Math.max(1, Math.floor(low * AUTO_THREADS_RESOLUTION))) {
+            var middle = Math.floor((low + high) / 2);
+            var middleOps = measure(middle);
+            if (middleOps * (1 + options.tolerance) >= threadResults[peakThreads].ops_per_sec &&
+                !isLatencyExceeded(middle, middleOps)) {
+                high = middle;
+            } else {
+                low = middle;
             }
         }
-        // uncomment if one needs to save the trial values that comprise the mean
-        newResults.ops_per_sec_values = values;
-        newResults.error_values = errors;
-        newResults.ops_per_sec = getMean(values);
-        newResults.ops_per_sec_median = getMedian(values);
-        newResults.ops_per_sec_stdev = getStdev(values, newResults.ops_per_sec);
-        threadResults[threadCount] = newResults;
+        knee = high;
     }
-    threadResults['end'] = new Date();
+    print("\tknee at " + knee + " threads, peak " + threadResults[peakThreads].ops_per_sec +
+          " ops/sec at " + peakThreads + " threads" + (saturated ? "" : " (not saturated)"));
+    return {
+        knee: knee,
+        peak_threads: peakThreads,
+        peak_ops_per_sec: threadResults[peakThreads].ops_per_sec,
+        saturated: saturated,
+        thread_counts: threadCounts
+    };
+}
+
+/**
+ * Run a single test with every thread count and variant, interleaving their trials so that the
+ * drift of the machine over time (thermal throttling, cache warmth, background work) is spread
+ * evenly across them instead of biasing the ones run last.
+ *
+ * The trials are run in blocks, each block running one more trial of every thread count and variant
+ * that needs more trials (see hasEnoughTrials()). With testArgs.schedule "abab" the variants of a
+ * thread count alternate in a fixed order, with "random" the order of every block is shuffled with
+ * testArgs.scheduleRandom. The variant is set in mongod whenever it changes.
+ *
+ * @param test - the test to be ran
+ * @param testArgs - the test arguments
+ * @param variants - the variant values, or [""] without variants
+ * @returns [{}] the results of the test for every variant, in the order of variants
+ */
+function executeInterleavedTest(test,
+                                testArgs,
+                                variants,
+                                errorsOutput) {
+    print(test.name + (variants[0] === "" ? "" : ", variants " + variants.join(" ")) + ", " +
+          testArgs.schedule + " schedule");
+    var units = [];
+    testArgs.threadCounts.forEach(function(threadCount) {
+        variants.forEach(function(variant, index) {
+            units.push({threadCount: threadCount, variantIndex: index, results: [], trials: 0});
+        });
+    });
+    var threadResults = variants.map(() => ({start: new Date()}));
+    var currentVariant = null;
+    while (true) {
+        var block = units.filter((unit) => !hasEnoughTrials(unit.results, unit.trials, testArgs));
+        if (block.length == 0) {
+            break;
+        }
+        if (testArgs.schedule == "random") {
+            shuffle(block, testArgs.scheduleRandom);
+        }
+        block.forEach(function(unit) {
+            var variant = variants[unit.variantIndex];
+            if (variant !== "" && variant !== currentVariant) {
+                db.adminCommand({setParameter: 1, [testArgs.variantName]: NumberLong(variant)});
+                currentVariant = variant;
+            }
+            unit.results[unit.trials] =
+                runTrial(test, testArgs, unit.threadCount, unit.trials, errorsOutput);
+            unit.trials++;
+        });
+    }
+    units.forEach(function(unit) {
+        threadResults[unit.variantIndex][unit.threadCount] =
+            summarizeTrials(unit.results, unit.trials, testArgs);
+    });
+    threadResults.forEach((results) => results['end'] = new Date());
     return threadResults;
 }
 
+/**
+ * Print the results of a single finished test as one framed line, so that benchrun.py can consume
+ * (and save) the results as they arrive instead of waiting for the whole suite to finish.
+ *
+ * @param testResult - the {name, variant, results} entry of a test
+ */
+function emitTestResult(testResult) {
+    print("@@@RESULT@@@" + JSON.stringify(testResult));
+}
+
 /**
  * Run tests defined in a tests array (outside of the function)
  *
+ * The results of every test are printed by emitTestResult() as soon as it finishes, and not kept,
+ * so that the memory of the shell does not grow with the number of tests.
+ *
  * @param testArgs - the test arguments
- * @returns {{}} the results of a run set of tests
+ * @returns {{}} the run-level fields of the results (testbed info, errors, start and end dates)
  */
 function runTests(testArgs) {
     if (typeof testArgs.shard === "undefined")
@@ -753,9 +1796,27 @@ function runTests(testArgs) {
         testArgs.excludeTestbed = false;
     if (typeof testArgs.printArgs === "undefined")
         testArgs.printArgs = false;
+    if (typeof testArgs.dbPrefix === "undefined")
+        testArgs.dbPrefix = "test";
+    if (typeof testArgs.suiteCount === "undefined") {
+        testArgs.suiteCount = 1;
+        testArgs.suiteIndex = 0;
+    }
+    if (typeof testArgs.schedule === "undefined")
+        testArgs.schedule = "sequential";
+    testArgs.scheduleRandom = newSeededRandom(testArgs.scheduleSeed || 0);
+    testArgs.trialPosition = 0;
+    // The generated config files must hold the commands that generate the datasets, with no
+    // dependency on the server version.
+    serverDocGenerationEnabled =
+        !testArgs.mongoeBenchOptions.traceOnly && isServerVersionAtLeast(5, 1);
+    if (testArgs.datasetCacheMaxBytes && !testArgs.mongoeBenchOptions.traceOnly) {
+        testArgs.datasetCache = new DatasetCache(
+            testArgs.datasetCacheMaxBytes,
+            {multidb: testArgs.multidb, multicoll: testArgs.multicoll, shard: testArgs.shard});
+    }
 
     var testResults = {};
-    testResults.results = [];
     testResults.errors = [];
 
     // Save basic testbed info if not running in evergreen
@@ -783,20 +1844,37 @@ function runTests(testArgs) {
     testResults['start'] = new Date();
 
     // Run all tests in the test file.
+    var matchingTests = 0;
     for (var i = 0; i < tests.length; i++) {
         var test = tests[i];
         // Execute if it has a matching tag to the suite that was passed in
         if (doExecute(test, testArgs.includeFilter, testArgs.excludeFilter)) {
-            if (testArgs.variantName === null) {
+            // When the tests are split across several shells, only run this shell's share of them.
+            if (matchingTests++ % testArgs.suiteCount != testArgs.suiteIndex) {
+                continue;
+            }
+            if (testArgs.schedule != "sequential") {
+                var variants = testArgs.variantName === null ? [""] : testArgs.variants;
+                var variantResults =
+                    executeInterleavedTest(test, testArgs, variants, testResults.errors);
+                for (var v = 0; v < variants.length; v++) {
+                    var testResult = {name: test.name, results: variantResults[v]};
+                    if (testArgs.variantName !== null) {
+                        testResult.variant = variants[v];
+                    }
+                    emitTestResult(testResult);
+                }
+            } else if (testArgs.variantName === null) {
                 var threadResults = executeOneTest(test, testArgs, "", testResults.errors);
-                testResults['results'].push({name: test.name, results: threadResults});
+                var testResult = {name: test.name, results: threadResults};
+                emitTestResult(testResult);
             } else {
                 for (var variant of testArgs.variants) {
                     db.adminCommand({setParameter: 1, [testArgs.variantName]: NumberLong(variant)});
                     var threadResults =
                         executeOneTest(test, testArgs, variant.toString(), testResults.errors);
-                    testResults['results'].push(
-                        {name: test.name, variant: variant, results: threadResults});
+                    var testResult = {name: test.name, variant: variant, results: threadResults};
+                    emitTestResult(testResult);
                 }
             }
         }
@@ -823,6 +1901,40 @@ function runTests(testArgs) {
  * @param excludeTestbed - Exclude testbed information from results
  * @param variantName - the variant name to be set in mongod
  * @param variants - the variant values
+ * @param mongoeBenchOptions - options for generating mongoebench config files
+ * @param username - username to use for authentication
+ * @param password - password to use for authentication
+ * @param runOptions - additional test arguments, e.g.
+ *                     {suiteIndex, suiteCount}: run only every suiteCount-th matching test,
+ *                         starting at suiteIndex
+ *                     {dbPrefix}: name prefix of the test databases (defaults to "test")
+ *                     {latency}: record the latency histograms of the ops of every trial, from
+ *                         the serverStatus opLatencies of the server
+ *                     {latencySliceSeconds}: length of the slices of the throttled trials
+ *                         (defaults to 1), see runBenchRunSlices()
+ *                     {targetCI, maxTrials}: keep running trials, up to maxTrials, until the
+ *                         relative confidence interval of the throughput is below targetCI
+ *                     {datasetCacheMaxBytes}: cache the generated datasets, see DatasetCache
+ *                     {serverStatus, serverStatusIntervalSeconds}: record the serverStatus
+ *                         counter changes and gauges of every trial, and of every interval of
+ *                         serverStatusIntervalSeconds when set
+ *                     {timelineIntervalSeconds}: record the throughput of every trial over time,
+ *                         from the opcounters every timelineIntervalSeconds, or from the slices
+ *                         of the throttled trials
+ *                     {targetOpsPerSec}: throttle every trial to this throughput, see
+ *                         newRateLimit()
+ *                     {targetRateFractions}: after the trials of every thread count, run them
+ *                         again throttled to each of these fractions of their throughput, see
+ *                         runRateLimitedTrials()
+ *                     {warmup}: warm every trial up until its throughput is steady before
+ *                         measuring it, as {sliceSeconds, windowSlices, maxCV, maxSeconds}, see
+ *                         runWarmup()
+ *                     {autoThreads}: search the knee of the throughput of every test over
+ *                         the thread count instead of running threadCounts, as
+ *                         {max, tolerance, maxLatencyMicros}, see findThreadsKnee()
+ *                     {schedule, scheduleSeed}: "sequential" (default) runs the trials of every
+ *                         thread count and variant back to back, "abab" and "random" interleave
+ *                         them, see executeInterleavedTest()
  * @returns {{}} the results of a run set of tests
  */
 function mongoPerfRunTests(threadCounts,
@@ -841,11 +1953,12 @@ function mongoPerfRunTests(threadCounts,
                            variants,
                            mongoeBenchOptions,
                            username,
-                           password) {
+                           password,
+                           runOptions) {
     var testResults = "";
     var oldValue = variantName === null ? null : db.adminCommand({getParameter: 1, [variantName]: 1});
     try {
-        testResults = runTests(
+        testResults = runTests(Object.extend(
             {
                 threadCounts,
                 multidb,
@@ -865,12 +1978,14 @@ function mongoPerfRunTests(threadCounts,
                 variantName,
                 variants,
             },
-        );
+            runOptions || {}));
     } finally {
         if (variantName !== null) {
             db.adminCommand({setParameter: 1, [variantName]: NumberLong(oldValue[variantName])});
         }
     }
+    // The per-test results have already been printed by emitTestResult(), only the run-level
+    // fields are left to report.
     print("@@@RESULTS_START@@@");
     print(JSON.stringify(testResults));
     print("@@@RESULTS_END@@@");
@@ -878,6 +1993,112 @@ function mongoPerfRunTests(threadCounts,
 
 // Document generation functions
 
+// Insert commands are filled up to the maximum size of a command, less some room for the command
+// fields and the array indexes of the documents.
+var MAX_INSERT_BATCH_BYTES = 16 * 1024 * 1024 - 64 * 1024;
+var MAX_INSERT_BATCH_DOCS = 100000;
+var INSERT_BATCH_DOC_OVERHEAD_BYTES = 8;
+
+// The documents generated on the server are built in batches of about this size.
+var MAX_SERVER_GENERATED_BATCH_BYTES = 32 * 1024 * 1024;
+// Larger expressions would not fit in the aggregate command.
+var MAX_DOCUMENT_EXPRESSION_BYTES = 1024 * 1024;
+// Whether the server supports generating documents with $documents. Set by runTests(), which
+// disables it when tracing the commands for mongoebench.
+var serverDocGenerationEnabled = null;
+
+/*
+ * Returns true if the server version is at least major.minor. Unversioned binaries are considered
+ * to be the latest version.
+ */
+function isServerVersionAtLeast(major, minor) {
+    if (db.version() === "0.0.0") {
+        return true;
+    }
+    var serverVersion = db.version().split(".");
+    return toInt(serverVersion[0]) > major ||
+        (toInt(serverVersion[0]) == major && toInt(serverVersion[1]) >= minor);
+}
+
+/**
+ * Returns true if the documents of docGenerator can be generated by the server: the generator
+ * describes its documents with an aggregation expression of the document number "$$i" in its
+ * 'documentExpression' property, and the server supports the $documents stage.
+ */
+function canGenerateDocsOnServer(docGenerator) {
+    if (serverDocGenerationEnabled === null) {
+        serverDocGenerationEnabled = isServerVersionAtLeast(5, 1);
+    }
+    return serverDocGenerationEnabled && typeof docGenerator.documentExpression === "object" &&
+        Object.bsonsize({expression: docGenerator.documentExpression}) <=
+            MAX_DOCUMENT_EXPRESSION_BYTES;
+}
+
+function generateDocsOnServer(collection, nDocs, expression) {
+    var docsPerBatch = Math.floor(
+        MAX_SERVER_GENERATED_BATCH_BYTES / Object.bsonsize({expression: expression}));
+    docsPerBatch = Math.max(1, Math.min(docsPerBatch, MAX_INSERT_BATCH_DOCS));
+    for (var first = 0; first < nDocs; first += docsPerBatch) {
+        var last = Math.min(nDocs, first + docsPerBatch);
+        assert.commandWorked(collection.getDB().runCommand({
+            aggregate: 1,
+            pipeline: [
+                {
+                    $documents: {
+                        $map: {
+                            input: {$range: [first, last]},
+                            as: "n",
+                            // The shell inserts document numbers as doubles.
+                            in: {$let: {vars: {i: {$toDouble: "$$n"}}, in: expression}}
+                        }
+                    }
+                },
+                {$merge: {into: collection.getName(), whenMatched: "fail"}}
+            ],
+            cursor: {}
+        }));
+    }
+}
+
+/**
+ * Inserts the documents 0 to nDocs - 1 returned by docGenerator into collection.
+ *
+ * The documents are sent in unordered insert commands filled up to the maximum command size,
+ * rather than through the shell's bulk API. Generators that have a 'documentExpression' (see
+ * canGenerateDocsOnServer()) have their documents generated by the server instead, without
+ * going through the shell at all. Either way, the documents are generated in the same order, so
+ * they only depend on the state of the generator and of the random seed.
+ */
+function insertGeneratedDocs(collection, nDocs, docGenerator) {
+    if (canGenerateDocsOnServer(docGenerator)) {
+        generateDocsOnServer(collection, nDocs, docGenerator.documentExpression);
+        return;
+    }
+
+    var batch = [];
+    var batchBytes = 0;
+    function flush() {
+        assert.commandWorked(collection.getDB().runCommand(
+            {insert: collection.getName(), documents: batch, ordered: false}));
+        batch = [];
+        batchBytes = 0;
+    }
+
+    for (var i = 0; i < nDocs; i++) {
+        var doc = docGenerator(i);
+        var docBytes = Object.bsonsize(doc) + INSERT_BATCH_DOC_OVERHEAD_BYTES;
+        if (batch.length > 0 && (batchBytes + docBytes > MAX_INSERT_BATCH_BYTES ||
+                                 batch.length >= MAX_INSERT_BATCH_DOCS)) {
+            flush();
+        }
+        batch.push(doc);
+        batchBytes += docBytes;
+    }
+    if (batch.length > 0) {
+        flush();
+    }
+}
+
 /**
  * Helper function to generate documents in the collection using the
  * generator function to generate the documents
@@ -885,11 +2106,7 @@ function mongoPerfRunTests(threadCounts,
 function generateDocs(nDocs, generator) {
     return function(collection) {
         collection.drop();
-        docs = [];
-        for (var i = 0; i < nDocs; i++) {
-          docs.push(generator(i));
-        }
-        collection.insert(docs, {'ordered': false});
+        insertGeneratedDocs(collection, nDocs, generator);
     };
  }
 
@@ -1030,12 +2247,16 @@ function rewriteQueryOpAsAgg(op) {
  * @param {Boolean} isView - True if 'collectionOrView' is a view; false otherwise.
  * @param {Number} nDocs - The number of documents to insert into the collection.
  * @param {function} docGenerator - A function that takes a document number and returns a
- * document.
+ * document. See insertGeneratedDocs() for how to have the documents generated by the server.
  * @param {Object[]} indexes - A list of index specs to create on the collection.
  * @param {Object} collectionOptions - Options to use for view/collection creation.
+ * @param {Object} datasetSpec - The values that docGenerator captures from its scope ({} if it
+ * captures none), for the dataset to be cached by DatasetCache. The datasets of the generators
+ * without a datasetSpec are not cached.
  */
-function collectionPopulator(isView, nDocs, indexes, docGenerator, collectionOptions) {
-    return function(collectionOrView) {
+function collectionPopulator(isView, nDocs, indexes, docGenerator, collectionOptions,
+                             datasetSpec) {
+    var populate = function(collectionOrView) {
         Random.setRandomSeed(258);
 
         collectionOrView.drop();
@@ -1060,15 +2281,25 @@ function collectionPopulator(isView, nDocs, indexes, docGenerator, collectionOpt
         var collectionCreationSpec = {create: collection.getName()};
         assert.commandWorked(
             db.runCommand(Object.extend(collectionCreationSpec, collectionOptions)));
-        var bulkOp = collection.initializeUnorderedBulkOp();
-        for (var i = 0; i < nDocs; i++) {
-            bulkOp.insert(docGenerator(i));
-        }
-        bulkOp.execute();
+        insertGeneratedDocs(collection, nDocs, docGenerator);
         indexes.forEach(function(indexSpec) {
             assert.commandWorked(collection.createIndex(indexSpec));
         });
     };
+    // Describe the generated dataset so that it can be cached, see DatasetCache. Views are not
+    // cached.
+    if (!isView && typeof datasetSpec === "object") {
+        populate.datasetSpec = {
+            nDocs: nDocs,
+            indexes: indexes,
+            docs: docGenerator.toString(),
+            documentExpression: docGenerator.documentExpression,
+            docsScope: datasetSpec,
+            collectionOptions: collectionOptions,
+            seed: 258
+        };
+    }
+    return populate;
 }
 
 /**
@@ -1095,6 +2326,8 @@ function collectionPopulator(isView, nDocs, indexes, docGenerator, collectionOpt
  * is automatically added to test cases for collections. The tags "views" and
  * "query_identityview" are added to test cases for views.
  * @param {Object} {options.collectionOptions={}} - Options to use for view/collection creation.
+ * @param {Object} {options.datasetSpec} - The values that options.docs captures from its scope ({}
+ * if it captures none). The dataset is only cached by DatasetCache when it is set.
  */
 function addQueryTestCase(options) {
     var isView = true;
@@ -1105,7 +2338,8 @@ function addQueryTestCase(options) {
         tags: ["query"].concat(tags),
         name: "Queries." + options.name,
         pre: collectionPopulator(
-            !isView, options.nDocs, indexes, options.docs, options.collectionOptions),
+            !isView, options.nDocs, indexes, options.docs, options.collectionOptions,
+            options.datasetSpec),
         post: function(collection) {
             collection.drop();
         },
@@ -1117,7 +2351,8 @@ function addQueryTestCase(options) {
             tags: ["views", "query_identityview"].concat(tags),
             name: "Queries.IdentityView." + options.name,
             pre: collectionPopulator(
-                isView, options.nDocs, indexes, options.docs, options.collectionOptions),
+                isView, options.nDocs, indexes, options.docs, options.collectionOptions,
+                options.datasetSpec),
             post: function(view) {
                 view.drop();
                 var collName = view.getName() + "_BackingCollection";
@@ -1133,7 +2368,8 @@ function addQueryTestCase(options) {
             tags: ["agg_query_comparison"].concat(tags),
             name: "Aggregation." + options.name,
             pre: collectionPopulator(
-                !isView, options.nDocs, indexes, options.docs, options.collectionOptions),
+                !isView, options.nDocs, indexes, options.docs, options.collectionOptions,
+            options.datasetSpec),
             post: function(collection) {
                 collection.drop();
             },